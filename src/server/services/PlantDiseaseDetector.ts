@@ -1,4 +1,4 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 
@@ -10,50 +10,250 @@ export interface DetectionResult {
   success: boolean;
 }
 
+export interface DetectorPoolOptions {
+  /** Number of long-lived Python workers */
+  workers: number;
+  /** A request taking longer than this kills its worker (which is then restarted) */
+  requestTimeoutMs: number;
+  /** How often idle workers are pinged; a worker that misses a ping is restarted */
+  healthCheckIntervalMs: number;
+  /** How long a request waits for a worker to finish loading before it is rejected */
+  readyTimeoutMs: number;
+}
+
+const DEFAULT_OPTIONS: DetectorPoolOptions = {
+  workers: Number(process.env.DISEASE_WORKERS) || 2,
+  requestTimeoutMs: Number(process.env.DISEASE_WORKER_TIMEOUT_MS) || 30000,
+  healthCheckIntervalMs: Number(process.env.DISEASE_WORKER_HEALTH_MS) || 15000,
+  readyTimeoutMs: Number(process.env.DISEASE_WORKER_READY_TIMEOUT_MS) || 60000,
+};
+
+// Frames are a 4-byte big-endian length followed by UTF-8 JSON (see plant_disease_detector.py)
+const HEADER_BYTES = 4;
+
+interface Pending {
+  resolve: (message: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+class DetectorWorker {
+  private process: ChildProcessWithoutNullStreams | null = null;
+  private buffer = Buffer.alloc(0);
+  private pending = new Map<number, Pending>();
+  private nextId = 1;
+  private stderr = '';
+  private lastRestart = 0;
+  private stopped = false;
+  ready = false;
+
+  constructor(
+    private readonly pythonPath: string,
+    private readonly scriptPath: string,
+    private readonly options: DetectorPoolOptions,
+    private readonly onReady: (worker: DetectorWorker) => void,
+  ) {}
+
+  get inFlight(): number {
+    return this.pending.size;
+  }
+
+  start(): void {
+    this.ready = false;
+    this.buffer = Buffer.alloc(0);
+    this.stderr = '';
+    this.lastRestart = Date.now();
+    // Each worker sizes its torch thread pool to its share of the cores
+    const env = {
+      ...process.env,
+      INFERENCE_CONCURRENCY: process.env.INFERENCE_CONCURRENCY ?? String(this.options.workers),
+    };
+    const child = spawn(this.pythonPath, [this.scriptPath, '--worker'], { env });
+    this.process = child;
+
+    child.stdin.on('error', (error) => {
+      // EPIPE from a write to a worker that was killed or crashed; without a
+      // listener it would be an uncaught exception in the server
+      this.onExit(child, `Worker stdin failed: ${error.message}`);
+      child.kill('SIGKILL');
+    });
+    child.stdout.on('data', (data: Buffer) => this.onData(data));
+    child.stderr.on('data', (data: Buffer) => {
+      // Keep the tail for crash reports
+      this.stderr = (this.stderr + data.toString()).slice(-4000);
+    });
+    child.on('error', (error) => this.onExit(child, error.message));
+    child.on('close', (code) => this.onExit(child, `Worker exited with code ${code}\n${this.stderr}`));
+  }
+
+  stop(): void {
+    this.stopped = true;
+    this.process?.kill();
+  }
+
+  request(message: Record<string, unknown>, timeoutMs = this.options.requestTimeoutMs): Promise<any> {
+    const child = this.process;
+    if (!child || !child.stdin.writable) {
+      return Promise.reject(new Error('Worker is not running'));
+    }
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Worker did not answer within ${timeoutMs} ms`));
+        // A stuck worker is replaced rather than left holding later requests
+        child.kill('SIGKILL');
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      const payload = Buffer.from(JSON.stringify({ ...message, id }));
+      const header = Buffer.alloc(HEADER_BYTES);
+      header.writeUInt32BE(payload.length, 0);
+      child.stdin.write(Buffer.concat([header, payload]));
+    });
+  }
+
+  async healthCheck(): Promise<void> {
+    if (!this.ready || this.inFlight > 0) {
+      return;
+    }
+    try {
+      await this.request({ op: 'ping' }, Math.min(this.options.requestTimeoutMs, 5000));
+    } catch (error) {
+      console.warn('Plant disease worker failed its health check; restarting', error);
+    }
+  }
+
+  private onData(data: Buffer): void {
+    this.buffer = Buffer.concat([this.buffer, data]);
+    while (this.buffer.length >= HEADER_BYTES) {
+      const length = this.buffer.readUInt32BE(0);
+      if (this.buffer.length < HEADER_BYTES + length) {
+        break;
+      }
+      const payload = this.buffer.subarray(HEADER_BYTES, HEADER_BYTES + length).toString();
+      this.buffer = this.buffer.subarray(HEADER_BYTES + length);
+      this.onMessage(JSON.parse(payload));
+    }
+  }
+
+  private onMessage(message: any): void {
+    if (message.op === 'ready') {
+      this.ready = true;
+      this.onReady(this);
+      return;
+    }
+    const pending = this.pending.get(message.id);
+    if (!pending) {
+      return;
+    }
+    this.pending.delete(message.id);
+    clearTimeout(pending.timer);
+    delete message.id;
+    pending.resolve(message);
+  }
+
+  private onExit(child: ChildProcessWithoutNullStreams, reason: string): void {
+    if (this.process !== child) {
+      return;
+    }
+    this.process = null;
+    this.ready = false;
+    for (const { reject, timer } of this.pending.values()) {
+      clearTimeout(timer);
+      reject(new Error(reason));
+    }
+    this.pending.clear();
+    if (this.stopped) {
+      return;
+    }
+    // Restart at most once a second so a worker that cannot start does not spin
+    const delay = Math.max(0, 1000 - (Date.now() - this.lastRestart));
+    setTimeout(() => {
+      if (!this.stopped) {
+        this.start();
+      }
+    }, delay);
+  }
+}
+
 export class PlantDiseaseDetector {
   private pythonPath: string;
   private scriptPath: string;
+  private options: DetectorPoolOptions;
+  private workers: DetectorWorker[] = [];
+  private healthTimer: NodeJS.Timeout | null = null;
+  // Requests that arrived while no worker was ready
+  private waiting = new Set<(worker: DetectorWorker) => void>();
 
-  constructor(pythonPath = 'python') {
+  constructor(pythonPath = 'python', options: Partial<DetectorPoolOptions> = {}) {
     this.pythonPath = pythonPath;
     this.scriptPath = path.join(__dirname, 'plant_disease_detector.py');
+    this.options = { ...DEFAULT_OPTIONS, ...options };
   }
 
-  async detectDisease(imagePath: string): Promise<DetectionResult> {
+  /** Start the worker pool; called on the first detection if not called earlier. */
+  start(): void {
+    if (this.workers.length > 0) {
+      return;
+    }
+    for (let i = 0; i < Math.max(1, this.options.workers); i++) {
+      const worker = new DetectorWorker(this.pythonPath, this.scriptPath, this.options, (ready) =>
+        this.onWorkerReady(ready),
+      );
+      worker.start();
+      this.workers.push(worker);
+    }
+    this.healthTimer = setInterval(() => {
+      this.workers.forEach((worker) => void worker.healthCheck());
+    }, this.options.healthCheckIntervalMs);
+    this.healthTimer.unref();
+  }
+
+  close(): void {
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+      this.healthTimer = null;
+    }
+    this.workers.forEach((worker) => worker.stop());
+    this.workers = [];
+  }
+
+  private onWorkerReady(worker: DetectorWorker): void {
+    const waiting = [...this.waiting];
+    this.waiting.clear();
+    waiting.forEach((resolve) => resolve(worker));
+  }
+
+  /** The ready worker with the fewest requests in flight, waiting up to readyTimeoutMs for one to load */
+  private acquire(): Promise<DetectorWorker> {
+    const ready = this.workers.filter((worker) => worker.ready);
+    if (ready.length > 0) {
+      const idlest = ready.reduce((best, candidate) => (candidate.inFlight < best.inFlight ? candidate : best));
+      return Promise.resolve(idlest);
+    }
     return new Promise((resolve, reject) => {
-      const pythonProcess = spawn(this.pythonPath, [
-        this.scriptPath,
-        imagePath
-      ]);
-
-      let result = '';
-      let error = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        result += data.toString();
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        error += data.toString();
-      });
-
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          reject(new Error(`Process exited with code ${code}\n${error}`));
-          return;
-        }
-
-        try {
-          const prediction = JSON.parse(result);
-          if (prediction.error) {
-            reject(new Error(prediction.error));
-          } else {
-            resolve(prediction);
-          }
-        } catch (e) {
-          reject(new Error(`Failed to parse result: ${e.message}`));
-        }
-      });
+      const onReady = (worker: DetectorWorker) => {
+        clearTimeout(timer);
+        resolve(worker);
+      };
+      const timer = setTimeout(() => {
+        this.waiting.delete(onReady);
+        reject(new Error(`No plant disease worker became ready within ${this.options.readyTimeoutMs} ms`));
+      }, this.options.readyTimeoutMs);
+      this.waiting.add(onReady);
     });
   }
-}
\ No newline at end of file
+
+  async detectDisease(imagePath: string): Promise<DetectionResult> {
+    this.start();
+    const worker = await this.acquire();
+    const prediction = await worker.request({ op: 'detect', path: path.resolve(imagePath) });
+    if (prediction.error) {
+      throw new Error(prediction.error);
+    }
+    return prediction;
+  }
+}
+
+// One pool per server process; every route shares its workers
+export const plantDiseaseDetector = new PlantDiseaseDetector();
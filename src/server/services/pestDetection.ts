@@ -1,11 +1,9 @@
-import { PlantDiseaseDetector } from './PlantDiseaseDetector.js';
-
-const detector = new PlantDiseaseDetector();
+import { plantDiseaseDetector } from './PlantDiseaseDetector.js';
 
 export const analyzePlantImage = async (imagePath: string) => {
   try {
-    return await detector.detectDisease(imagePath);
+    return await plantDiseaseDetector.detectDisease(imagePath);
   } catch (error) {
-    throw new Error(`Failed to analyze image: ${error.message}`);
+    throw new Error(`Failed to analyze image: ${error instanceof Error ? error.message : String(error)}`);
   }
 };
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Plant disease detection for the Node server.
+
+    python plant_disease_detector.py IMAGE      # one image, one JSON result on stdout
+    python plant_disease_detector.py --worker   # long-lived worker (PlantDiseaseDetector.ts)
+
+The worker loads the ResNet9 model once and answers requests until stdin
+closes. Every message in both directions is a frame: a 4-byte big-endian
+length followed by that many bytes of UTF-8 JSON.
+
+  -> {"id": 1, "op": "detect", "path": "/uploads/leaf.jpg"}
+  <- {"id": 1, "prediction": "...", "confidence": 0.97, "success": true}
+  -> {"id": 2, "op": "ping"}
+  <- {"id": 2, "op": "pong", "pid": 4242, "served": 17}
+
+A {"op": "ready"} frame is sent once the model is loaded; failed requests
+get {"id", "error", "success": false}. Logging goes to stderr, and anything
+else printed to stdout is redirected there so it cannot corrupt the frames.
+"""
+
+import json
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'services'))
+
+from cpu_threads import apply_affinity, configure_torch  # noqa: E402
+from disease_cascade import CASCADE_SIZE, Cascade, top1  # noqa: E402
+from disease_model import detection_result, load_model  # noqa: E402
+from disease_preprocess import preprocess_bytes  # noqa: E402
+
+HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def read_frame(stream):
+    """Decoded JSON of the next frame, or None at end of input."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f'frame of {length} bytes exceeds {MAX_FRAME}')
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return json.loads(payload)
+
+
+def write_frame(stream, message):
+    payload = json.dumps(message).encode()
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+class Detector:
+    def __init__(self):
+        # The pool starts workers with INFERENCE_CONCURRENCY set to its size, so
+        # each one takes its share of the cores
+        apply_affinity()
+        configure_torch()
+        self.model = load_model()
+        self.cascade = Cascade(self.model) if CASCADE_SIZE else None
+        self.served = 0
+
+    def detect(self, path):
+        with open(path, 'rb') as f:
+            input_tensor = preprocess_bytes(f.read())
+        if self.cascade is not None:
+            confidence, preds, _ = self.cascade(input_tensor)
+        else:
+            confidence, preds = top1(self.model(input_tensor))
+        self.served += 1
+        return detection_result(confidence[0].item(), preds[0].item())
+
+
+def handle(detector, request):
+    op = request.get('op', 'detect')
+    if op == 'ping':
+        return {'op': 'pong', 'pid': os.getpid(), 'served': detector.served}
+    if op == 'detect':
+        return detector.detect(request['path'])
+    raise ValueError(f'unknown op: {op}')
+
+
+def serve(stdin, stdout):
+    detector = Detector()
+    write_frame(stdout, {'op': 'ready', 'pid': os.getpid(), 'variant': detector.model.variant})
+    while True:
+        request = read_frame(stdin)
+        if request is None:
+            return
+        try:
+            response = handle(detector, request)
+        except Exception as e:
+            response = {'error': str(e), 'success': False}
+        response['id'] = request.get('id')
+        write_frame(stdout, response)
+
+
+def main():
+    if sys.argv[1:] == ['--worker']:
+        stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+        sys.stdout = sys.stderr
+        serve(stdin, stdout)
+        return
+    if len(sys.argv) != 2:
+        sys.exit('usage: plant_disease_detector.py IMAGE | --worker')
+    try:
+        result = Detector().detect(sys.argv[1])
+    except Exception as e:
+        result = {'error': str(e), 'success': False}
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Forecasts computed at the same time; the rest wait in a bounded queue
+DEFAULT_MAX_CONCURRENT = int(os.environ.get('PRICE_MAX_CONCURRENT', str(os.cpu_count() or 1)))
+DEFAULT_MAX_QUEUE = int(os.environ.get('PRICE_MAX_QUEUE', '32'))
+DEFAULT_QUEUE_TIMEOUT = float(os.environ.get('PRICE_QUEUE_TIMEOUT', '10'))
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the service is saturated; maps to HTTP 503."""
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+    def stats(self):
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+
+class AdmissionController:
+    """At most ``max_concurrent`` holders, at most ``max_queue`` waiters; everyone else is shed."""
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queue=DEFAULT_MAX_QUEUE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, window=1024):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.max_queued = 0
+        self.wait_seconds_total = 0.0
+        self._waits = collections.deque(maxlen=window)
+
+    @contextmanager
+    def slot(self):
+        started = time.perf_counter()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded(f'{self.queued} requests already queued')
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+                try:
+                    deadline = started + self.queue_timeout
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise Overloaded(f'no capacity within {self.queue_timeout}s')
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.active += 1
+            self.admitted += 1
+            waited = time.perf_counter() - started
+            self.wait_seconds_total += waited
+            self._waits.append(waited)
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            waits = np.array(self._waits) * 1000 if self._waits else np.zeros(1)
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self.active,
+                'queued': self.queued,
+                'max_queued': self.max_queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_ms_p50': float(np.percentile(waits, 50)),
+                'wait_ms_p95': float(np.percentile(waits, 95)),
+                'wait_ms_max': float(waits.max()),
+            }
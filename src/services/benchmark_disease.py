@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the ResNet9 disease classifier behind m.py.
+
+Runs against a folder of sample images or seeded synthetic JPEGs, one fresh
+process per model variant so load time and peak RSS are not shared between
+them, and writes a single JSON document:
+
+  preprocess - per-image JPEG decode/resize and tensor conversion time at
+               each input resolution, measured apart from the model
+  forward    - forward-pass latency for every (threads, batch size,
+               resolution), as p50/p99 per batch and per image plus
+               images/second
+  load       - model load time and RSS right after loading
+  peak_rss   - maximum resident set size of the variant's process
+
+Variants needing an exported file (scripted, int8, onnx) are exported from
+the checkpoint into a temporary directory first; without a checkpoint the
+untrained weights are timed, which costs the same.
+
+    python benchmark_disease.py --out bench.json
+    python benchmark_disease.py --images leaves/val --variants eager int8 --threads 1 2 4 --batch-sizes 1 8
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_synthetic_images(folder, count, width, height, seed=0):
+    """``count`` smooth random-colour JPEGs, roughly the size and entropy of phone photos of leaves."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        coarse = rng.integers(0, 256, (height // 32, width // 32, 3), dtype=np.uint8)
+        image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+        noise = rng.normal(0, 8, (height, width, 3))
+        pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+        Image.fromarray(pixels).save(os.path.join(folder, f'synthetic-{i:03d}.jpg'), quality=90)
+
+
+def _summary(samples, per=1):
+    """Latency percentiles in ms for ``samples`` (seconds), each covering ``per`` images."""
+    samples = np.asarray(samples) * 1000
+    return {
+        'n': int(len(samples)),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'min_ms': round(float(samples.min()), 3),
+        'p50_ms_per_image': round(float(np.percentile(samples, 50)) / per, 3),
+        'images_per_second': round(per * len(samples) / (samples.sum() / 1000), 2),
+    }
+
+
+def rss_kb(field='VmRSS'):
+    """Current (VmRSS) or peak (VmHWM) resident memory of this process in kB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure_preprocess(blobs, size):
+    """Decode/resize and tensor conversion timed separately; returns the stacked inputs too."""
+    import torch
+
+    from disease_preprocess import open_image, to_tensor
+
+    inputs = torch.empty((len(blobs), 3, size, size), dtype=torch.float32)
+    decode, convert = [], []
+    for i, data in enumerate(blobs):
+        t = time.perf_counter()
+        image = open_image(data, size)
+        decode.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        to_tensor(image, inputs[i])
+        convert.append(time.perf_counter() - t)
+    return inputs, {'decode': _summary(decode), 'to_tensor': _summary(convert),
+                    'total': _summary(np.add(decode, convert))}
+
+
+def measure_forward(model, inputs, batch_size, repeats, warmup):
+    index = np.arange(batch_size) % len(inputs)
+    batch = inputs[index].contiguous()
+    for _ in range(warmup):
+        model(batch)
+    samples = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model(batch)
+        samples.append(time.perf_counter() - t)
+    return _summary(samples, per=batch_size)
+
+
+def run_child(args):
+    """Measurements inside one fresh process for ``args.variant``."""
+    import torch
+
+    from cpu_threads import configure_torch
+    from disease_model import load_model
+    from disease_preprocess import list_images
+
+    paths = [path for path, _ in list_images(args.images)][:args.limit]
+    blobs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            blobs.append(f.read())
+
+    inputs, preprocess = {}, {}
+    for size in args.resolutions:
+        inputs[size], preprocess[size] = measure_preprocess(blobs, size)
+
+    forward, load = [], {}
+    for threads in args.threads:
+        configure_torch(intra=threads)
+        # Reloaded per thread count: onnxruntime sizes its pool when the session is created
+        t = time.perf_counter()
+        model = load_model(args.variant, args.model_path, args.export_dir, fallback=False)
+        load[threads] = {'seconds': round(time.perf_counter() - t, 3), 'rss_kb': rss_kb()}
+        for size in args.resolutions:
+            for batch_size in args.batch_sizes:
+                entry = {'threads': torch.get_num_threads(), 'batch_size': batch_size, 'resolution': size}
+                try:
+                    entry.update(measure_forward(model, inputs[size], batch_size, args.repeats, args.warmup))
+                except Exception as e:
+                    # e.g. an export traced at 256 px given another resolution
+                    entry['error'] = str(e).splitlines()[0] if str(e) else type(e).__name__
+                forward.append(entry)
+        del model
+
+    return {
+        'variant': args.variant,
+        'images': len(blobs),
+        'mean_image_bytes': int(np.mean([len(data) for data in blobs])),
+        'load': load,
+        'preprocess': preprocess,
+        'forward': forward,
+        # ru_maxrss can carry over the parent's peak across fork/exec (here, the export step)
+        'peak_rss_kb': rss_kb('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_variant(variant, args, workdir):
+    out_path = os.path.join(workdir, f'{variant}.json')
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--variant', variant, '--child-out', out_path,
+               '--images', args.images, '--limit', str(args.limit), '--model-path', args.model_path,
+               '--export-dir', args.export_dir, '--repeats', str(args.repeats), '--warmup', str(args.warmup),
+               '--threads', *map(str, args.threads), '--batch-sizes', *map(str, args.batch_sizes),
+               '--resolutions', *map(str, args.resolutions)]
+    env = dict(os.environ, PYTHONWARNINGS='ignore')
+    started = time.perf_counter()
+    completed = subprocess.run(command, env=env, cwd=SERVICES_DIR, stdout=None if args.verbose else subprocess.DEVNULL,
+                               stderr=None if args.verbose else subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        lines = (completed.stderr or '').strip().splitlines()
+        return {'variant': variant, 'error': lines[-1] if lines else f'exited with {completed.returncode}'}
+    with open(out_path) as f:
+        result = json.load(f)
+    result['process_seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SERVICES_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    from disease_model import EXPORT_FILES, MODEL_PATH, VARIANTS
+
+    parser = argparse.ArgumentParser(description='Benchmark the plant disease classifier.')
+    parser.add_argument('--images', help='folder of sample images (default: synthetic JPEGs)')
+    parser.add_argument('--limit', type=int, default=32, help='images used from the folder')
+    parser.add_argument('--synthetic-size', default='1600x1200', help='WxH of the synthetic JPEGs')
+    parser.add_argument('--model-path', default=MODEL_PATH)
+    parser.add_argument('--variants', nargs='+', default=['eager', 'scripted', 'int8'], choices=VARIANTS)
+    parser.add_argument('--threads', nargs='+', type=int, default=[1])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--resolutions', nargs='+', type=int, default=[256])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--out', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help="show the model's own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--variant', help=argparse.SUPPRESS)
+    parser.add_argument('--export-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--child-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args)
+        with open(args.child_out, 'w') as f:
+            json.dump(result, f)
+        return
+
+    import torch
+
+    from cpu_threads import available_cpus
+
+    report = {
+        'commit': git_commit(),
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': len(available_cpus()),
+        'checkpoint': args.model_path if os.path.exists(args.model_path) else None,
+        'results': {},
+    }
+    workdir = tempfile.mkdtemp(prefix='disease-bench-')
+    try:
+        if args.images is None:
+            width, height = map(int, args.synthetic_size.lower().split('x'))
+            args.images = os.path.join(workdir, 'images')
+            write_synthetic_images(args.images, args.limit, width, height)
+            report['synthetic_images'] = {'count': args.limit, 'width': width, 'height': height}
+        else:
+            report['images_dir'] = os.path.abspath(args.images)
+        args.export_dir = os.path.join(workdir, 'export')
+        exported = [variant for variant in args.variants if variant in EXPORT_FILES]
+        if exported:
+            from export_disease_model import export
+
+            print(f"Exporting {', '.join(exported)}", file=sys.stderr)
+            with contextlib.redirect_stdout(sys.stderr):
+                export(args.model_path, args.export_dir, exported, calibration_dir=args.images)
+        for variant in args.variants:
+            print(f"Benchmarking {variant} variant", file=sys.stderr)
+            report['results'][variant] = run_variant(variant, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
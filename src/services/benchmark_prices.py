@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for CommodityPricePredictor.
+
+Runs against the bundled saved_models and a seeded synthetic price history,
+one fresh process per backend so cold-start numbers and peak RSS are not
+shared between them, and writes a single JSON document:
+
+  startup   - interpreter + ``import pricePredict`` (manifest, scaler table,
+              predictor construction) and the first price store ingest
+  cold      - single-pair forecast latency with the model not yet loaded
+  warm      - single-pair forecast latency with the model resident
+  per_step  - rollout cost per forecast day (slope over several horizons)
+  batch     - predict_many over every pair, cold and warm, in pairs/second
+  peak_rss  - maximum resident set size of the benchmark process
+
+Forecast caches and the precomputed table are disabled so every call does
+the full computation.
+
+    python benchmark_prices.py --out bench.json
+    python benchmark_prices.py --backends numpy packed keras --repeats 20
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_synthetic_history(path, pairs, days, seed=0):
+    """Random-walk modal prices for every pair, one row per pair per day."""
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64('2022-01-01') + np.arange(days)
+    with open(path, 'w') as f:
+        f.write('date,district_id,commodity_id,modal_price\n')
+        for district_id, commodity_id in pairs:
+            start = rng.uniform(1000, 10000)
+            walk = start * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+            for date, price in zip(dates, walk):
+                f.write(f'{date},{district_id},{commodity_id},{price:.2f}\n')
+
+
+def _summary(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'n': int(len(samples)),
+        'median_ms': round(float(np.median(samples)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'min_ms': round(float(samples.min()), 3),
+    }
+
+
+def run_child(args):
+    """Measurements inside one fresh process for ``args.backend``."""
+    started = time.perf_counter()
+    import pricePredict
+    import_seconds = time.perf_counter() - started
+
+    from price_store import PriceStore
+    from rollout import rollout
+
+    store = PriceStore(os.environ['PRICE_STORE_DIR'], source_file=os.environ['PRICE_HISTORICAL_FILE'])
+    started = time.perf_counter()
+    store.available()
+    ingest_seconds = time.perf_counter() - started
+
+    def fresh_predictor():
+        return pricePredict.CommodityPricePredictor(backend=args.backend, price_store=store,
+                                                    manifest=pricePredict.predictor.manifest,
+                                                    scaler_table=pricePredict.predictor.scalers,
+                                                    packed_models=pricePredict.predictor.packed_models)
+
+    predictor = fresh_predictor()
+    pairs = predictor.manifest.pairs()
+    rng = np.random.default_rng(0)
+    sample = [pairs[i] for i in rng.choice(len(pairs), min(args.cold_pairs, len(pairs)), replace=False)]
+
+    cold = []
+    for district_id, commodity_id in sample:
+        t = time.perf_counter()
+        predictor.forecast(district_id, commodity_id, args.horizon)
+        cold.append(time.perf_counter() - t)
+
+    warm = []
+    district_id, commodity_id = sample[0]
+    for _ in range(args.repeats):
+        t = time.perf_counter()
+        predictor.forecast(district_id, commodity_id, args.horizon)
+        warm.append(time.perf_counter() - t)
+
+    model_data = predictor.get_model(district_id, commodity_id)
+    sequence = predictor.prepare_sequence(store.get_recent(district_id, commodity_id, predictor.sequence_length),
+                                          model_data['scaler'])
+    horizons = [1, 10, 50, 100, 200]
+    rollout_ms = []
+    for horizon in horizons:
+        samples = []
+        for _ in range(args.repeats):
+            t = time.perf_counter()
+            rollout(model_data, sequence, horizon)
+            samples.append(time.perf_counter() - t)
+        rollout_ms.append(float(np.median(samples)) * 1000)
+    slope, intercept = np.polyfit(horizons, rollout_ms, 1)
+
+    batch = fresh_predictor()
+    t = time.perf_counter()
+    results = batch.predict_many(pairs, args.horizon)
+    batch_cold = time.perf_counter() - t
+    t = time.perf_counter()
+    batch.predict_many(pairs, args.horizon)
+    batch_warm = time.perf_counter() - t
+    served = sum(1 for value in results.values() if value is not None)
+
+    return {
+        'backend': args.backend,
+        'horizon': args.horizon,
+        'startup': {
+            'import_seconds': round(import_seconds, 4),
+            'store_ingest_seconds': round(ingest_seconds, 4),
+        },
+        'cold': _summary(cold),
+        'warm': _summary(warm),
+        'per_step': {
+            'horizons': horizons,
+            'rollout_median_ms': [round(v, 3) for v in rollout_ms],
+            'ms_per_step': round(float(slope), 4),
+            'fixed_ms': round(float(intercept), 3),
+        },
+        'batch': {
+            'pairs': len(pairs),
+            'served': served,
+            'cold_seconds': round(batch_cold, 3),
+            'warm_seconds': round(batch_warm, 3),
+            'cold_pairs_per_second': round(len(pairs) / batch_cold, 2),
+            'warm_pairs_per_second': round(len(pairs) / batch_warm, 2),
+        },
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_backend(backend, args, workdir):
+    env = dict(os.environ)
+    env.update({
+        'PRICE_MODEL_BACKEND': backend,
+        'PRICE_HISTORICAL_FILE': os.path.join(workdir, 'history.csv'),
+        'PRICE_STORE_DIR': os.path.join(workdir, f'store-{backend}'),
+        'PRICE_FORECAST_TABLE': os.path.join(workdir, 'no-table.npz'),
+        'PRICE_PACKED_MODELS_DIR': os.path.join(workdir, 'packed'),
+        'PRICE_MODELS_DIR': args.models_dir,
+        'PYTHONWARNINGS': 'ignore',
+    })
+    env.pop('PRICE_WARM_PAIRS', None)
+    env.pop('PRICE_MODEL_PINNED', None)
+    out_path = os.path.join(workdir, f'{backend}.json')
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--backend', backend, '--child-out', out_path,
+               '--horizon', str(args.horizon), '--repeats', str(args.repeats), '--cold-pairs', str(args.cold_pairs)]
+    started = time.perf_counter()
+    subprocess.run(command, env=env, cwd=SERVICES_DIR, check=True,
+                   stdout=None if args.verbose else subprocess.DEVNULL)
+    wall = time.perf_counter() - started
+    with open(out_path) as f:
+        result = json.load(f)
+    result['process_seconds'] = round(wall, 3)
+
+    # Interpreter start plus import, measured on its own
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import pricePredict'], env=env, cwd=SERVICES_DIR, check=True,
+                   stdout=subprocess.DEVNULL)
+    result['startup']['process_start_and_import_seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SERVICES_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the price forecasting service.')
+    parser.add_argument('--models-dir', default=os.path.join(SERVICES_DIR, 'saved_models'))
+    parser.add_argument('--backends', nargs='+', default=['numpy', 'packed'], choices=('keras', 'numpy', 'packed'))
+    parser.add_argument('--days', type=int, default=365, help='days of synthetic history per pair')
+    parser.add_argument('--horizon', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--cold-pairs', type=int, default=5)
+    parser.add_argument('--out', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help="show the predictor's own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--child-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args)
+        with open(args.child_out, 'w') as f:
+            json.dump(result, f)
+        return
+
+    from model_manifest import ModelManifest
+
+    manifest = ModelManifest.load(args.models_dir)
+    report = {
+        'commit': git_commit(),
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'models': len(manifest.pairs()),
+        'history_days': args.days,
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='price-bench-') as workdir:
+        write_synthetic_history(os.path.join(workdir, 'history.csv'), manifest.pairs(), args.days)
+        if 'packed' in args.backends:
+            from packed_models import convert
+
+            convert(args.models_dir, os.path.join(workdir, 'packed'))
+        for backend in args.backends:
+            print(f"Benchmarking {backend} backend", file=sys.stderr)
+            report['results'][backend] = run_backend(backend, args, workdir)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
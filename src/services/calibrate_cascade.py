@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Pick a resolution and confidence threshold for the disease model cascade.
+
+Runs the full 256 px pass and each low-resolution pass once over an image
+folder (one subfolder per class for accuracy), then for every
+(size, threshold) reports:
+  accuracy           - top-1 accuracy of the cascade (labelled images)
+  agreement          - share of images where the cascade matches the full pass
+  escalation_rate    - share of images sent on to the 256 px pass
+  ms_per_image       - low pass time plus escalation_rate x full pass time,
+                       from the measured per-image cost of each pass
+
+and recommends the cheapest setting within --tolerance of the full pass
+(accuracy when labels exist, agreement otherwise).
+
+    python calibrate_cascade.py --images leaves/val --out cascade.json
+    DISEASE_CASCADE_SIZE=128 DISEASE_CASCADE_THRESHOLD=0.9 python m.py
+"""
+
+import argparse
+import json
+import time
+
+import torch
+
+from disease_cascade import downscale, top1
+from disease_model import VARIANT, VARIANTS, load_model
+from export_disease_model import load_batches
+
+
+def timed_pass(model, batches, size, repeats):
+    """(confidence, class index, ms per image) over all batches at ``size`` px."""
+    inputs = [downscale(batch, size) for batch in batches]
+    model(inputs[0])
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        outputs = [top1(model(batch)) for batch in inputs]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    confidence = torch.cat([c for c, _ in outputs])
+    preds = torch.cat([p for _, p in outputs])
+    return confidence, preds, best / len(confidence) * 1000
+
+
+def calibrate(images, variant, sizes, thresholds, batch_size, tolerance, repeats):
+    batches, labels = load_batches(images, batch_size)
+    if not batches:
+        raise SystemExit(f"No images under {images}")
+    model = load_model(variant, fallback=False)
+    labelled = torch.tensor([label is not None for label in labels])
+    targets = torch.tensor([-1 if label is None else label for label in labels])
+
+    def accuracy(preds):
+        return float((preds[labelled] == targets[labelled]).float().mean()) if labelled.any() else None
+
+    _, full_preds, full_ms = timed_pass(model, batches, 256, repeats)
+    report = {'images': len(labels), 'labelled': int(labelled.sum()), 'variant': model.variant,
+              'tolerance': tolerance,
+              'full': {'ms_per_image': round(full_ms, 3), 'accuracy': accuracy(full_preds)}, 'cascade': [],
+              'unsupported': []}
+    for size in sizes:
+        try:
+            low_confidence, low_preds, low_ms = timed_pass(model, batches, size, repeats)
+        except Exception as e:
+            # Fixed-size exports (ONNX files made before dynamic height/width) reject other resolutions
+            message = str(e).splitlines()[0] if str(e) else type(e).__name__
+            report['unsupported'].append({'size': size, 'error': message})
+            continue
+        for threshold in thresholds:
+            escalate = low_confidence < threshold
+            preds = torch.where(escalate, full_preds, low_preds)
+            rate = float(escalate.float().mean())
+            report['cascade'].append({
+                'size': size,
+                'threshold': threshold,
+                'accuracy': accuracy(preds),
+                'agreement': float((preds == full_preds).float().mean()),
+                'escalation_rate': rate,
+                'low_pass_ms': round(low_ms, 3),
+                'ms_per_image': round(low_ms + rate * full_ms, 3),
+            })
+
+    def acceptable(entry):
+        if report['full']['accuracy'] is not None:
+            return entry['accuracy'] >= report['full']['accuracy'] - tolerance
+        return entry['agreement'] >= 1 - tolerance
+
+    candidates = [entry for entry in report['cascade'] if acceptable(entry) and entry['ms_per_image'] < full_ms]
+    best = min(candidates, key=lambda entry: entry['ms_per_image']) if candidates else None
+    report['recommended'] = {'size': best['size'], 'threshold': best['threshold']} if best else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate the low-resolution cascade of the disease model.')
+    parser.add_argument('--images', required=True, help='image folder, ideally one subfolder per class')
+    parser.add_argument('--variant', default=VARIANT, choices=VARIANTS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[64, 96, 128])
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[0.5, 0.7, 0.8, 0.9, 0.95, 0.99])
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='allowed accuracy drop (or disagreement without labels) against the full pass')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--out', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    report = calibrate(args.images, args.variant, args.sizes, args.thresholds, args.batch_size, args.tolerance,
+                       args.repeats)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
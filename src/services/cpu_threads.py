@@ -0,0 +1,186 @@
+"""
+Thread and core scheduling for CPU inference in the price and disease services.
+
+torch, TensorFlow and the BLAS under numpy each size their thread pools to
+every core by default, so concurrent Flask requests oversubscribe the
+machine. These settings fix the pool sizes:
+
+  INFERENCE_INTRA_THREADS   threads inside one op (default: usable cores / INFERENCE_CONCURRENCY)
+  INFERENCE_INTER_THREADS   independent ops run in parallel (default 1)
+  INFERENCE_CONCURRENCY     requests expected to run at once (default 1)
+  INFERENCE_CPU_AFFINITY    CPUs this process may use, e.g. "0-3,8"
+  INFERENCE_AUTOTUNE=1      at startup, time a few intra-op thread counts
+                            against the loaded model and keep the best one
+
+BLAS limits are set through the environment when ``configure_blas`` runs
+before numpy is imported, and through threadpoolctl (if installed) after.
+TensorFlow accepts thread settings only before it first runs an op.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INTRA_THREADS = os.environ.get('INFERENCE_INTRA_THREADS')
+INTER_THREADS = int(os.environ.get('INFERENCE_INTER_THREADS', '1'))
+CONCURRENCY = int(os.environ.get('INFERENCE_CONCURRENCY', '1'))
+CPU_AFFINITY = os.environ.get('INFERENCE_CPU_AFFINITY')
+AUTOTUNE = os.environ.get('INFERENCE_AUTOTUNE', '0') == '1'
+# Autotune keeps the highest-throughput setting whose median latency is within this factor of the lowest
+AUTOTUNE_SLACK = float(os.environ.get('INFERENCE_AUTOTUNE_SLACK', '0.5'))
+BLAS_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def parse_cpus(spec):
+    """Sorted CPU ids of a list like "0-3,8"."""
+    cpus = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.update(range(int(start), int(end or start) + 1))
+    return sorted(cpus)
+
+
+def available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def set_affinity(cpus):
+    """Restrict this process (and threads started later) to ``cpus``; returns the CPUs in effect."""
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError) as e:
+        logger.warning("Cannot set CPU affinity", extra={'cpus': list(cpus), 'error': str(e)})
+    return available_cpus()
+
+
+def apply_affinity(spec=CPU_AFFINITY):
+    if spec:
+        return set_affinity(parse_cpus(spec))
+    return available_cpus()
+
+
+def worker_share(cpus, index, workers):
+    """CPUs for worker ``index`` of ``workers`` when ``cpus`` are split into contiguous blocks."""
+    if workers >= len(cpus):
+        return [cpus[index % len(cpus)]]
+    size, extra = divmod(len(cpus), workers)
+    start = index * size + min(index, extra)
+    return cpus[start:start + size + (index < extra)]
+
+
+def thread_settings():
+    """{'intra', 'inter'} from the environment, sized so concurrent requests do not oversubscribe."""
+    if INTRA_THREADS:
+        intra = int(INTRA_THREADS)
+    else:
+        intra = len(available_cpus()) // max(1, CONCURRENCY)
+    return {'intra': max(1, intra), 'inter': max(1, INTER_THREADS)}
+
+
+def configure_blas(threads=None):
+    threads = threads or thread_settings()['intra']
+    if 'numpy' not in sys.modules:
+        # Explicit per-library variables still win
+        for var in BLAS_ENV:
+            os.environ.setdefault(var, str(threads))
+        return threads
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.warning("numpy already imported and threadpoolctl missing; BLAS threads unchanged")
+        return None
+    threadpool_limits(threads, user_api='blas')
+    return threads
+
+
+def configure_torch(intra=None, inter=None):
+    import torch
+
+    settings = thread_settings()
+    torch.set_num_threads(intra or settings['intra'])
+    try:
+        torch.set_num_interop_threads(inter or settings['inter'])
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work
+        pass
+    return {'intra': torch.get_num_threads(), 'inter': torch.get_num_interop_threads()}
+
+
+def configure_tensorflow(intra=None, inter=None):
+    import tensorflow as tf
+
+    settings = thread_settings()
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra or settings['intra'])
+        tf.config.threading.set_inter_op_parallelism_threads(inter or settings['inter'])
+    except RuntimeError as e:
+        logger.warning("TensorFlow already initialized; thread settings unchanged", extra={'error': str(e)})
+    return {'intra': tf.config.threading.get_intra_op_parallelism_threads(),
+            'inter': tf.config.threading.get_inter_op_parallelism_threads()}
+
+
+def _probe(run, concurrency, calls):
+    latencies = []
+    lock = threading.Lock()
+    remaining = [calls]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3), 'per_second': round(calls / wall, 3)}
+
+
+def autotune(run, set_threads, candidates=None, calls=None, slack=AUTOTUNE_SLACK):
+    """Pick an intra-op thread count for ``run`` (one inference call).
+
+    Each candidate ``t`` is applied with ``set_threads(t)`` and measured with
+    usable cores // t concurrent callers, i.e. the request parallelism the
+    setting leaves room for. The highest-throughput candidate whose median
+    latency is within ``1 + slack`` of the best median is applied and the
+    full report returned.
+    """
+    cores = len(available_cpus())
+    if candidates is None:
+        candidates = sorted({1, cores} | {2 ** i for i in range(1, cores.bit_length()) if 2 ** i < cores})
+    results = []
+    for threads in candidates:
+        set_threads(threads)
+        run()
+        concurrency = max(1, cores // threads)
+        result = _probe(run, concurrency, calls or max(4, 2 * concurrency))
+        results.append({'threads': threads, 'concurrency': concurrency, **result})
+    fastest = min(result['p50_ms'] for result in results)
+    eligible = [result for result in results if result['p50_ms'] <= fastest * (1 + slack)]
+    best = max(eligible, key=lambda result: result['per_second'])
+    set_threads(best['threads'])
+    logger.info("Autotuned inference threads", extra={'threads': best['threads'],
+                                                       'concurrency': best['concurrency'],
+                                                       'per_second': best['per_second'], 'p50_ms': best['p50_ms']})
+    return {'cores': cores, 'slack': slack, 'candidates': results, 'chosen': best}
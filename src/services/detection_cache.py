@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('DISEASE_CACHE_SIZE', '4096'))
+DEFAULT_DISK_DIR = os.environ.get('DISEASE_CACHE_DIR') or None
+DEFAULT_DISK_MAX_ENTRIES = int(os.environ.get('DISEASE_CACHE_DISK_ENTRIES', '65536'))
+DEFAULT_DISK_MAX_BYTES = int(os.environ.get('DISEASE_CACHE_DISK_BYTES', str(64 * 1024 * 1024)))
+DEFAULT_KEY_MODE = os.environ.get('DISEASE_CACHE_KEY', 'content')
+KEY_MODES = ('content', 'perceptual')
+# Perceptual hashes this many bits apart (of 256) still count as the same photo
+DEFAULT_MAX_DISTANCE = int(os.environ.get('DISEASE_CACHE_MAX_DISTANCE', '8'))
+
+
+def upload_digest(data):
+    """Digest of the encoded upload; matches byte-identical resends before any decoding."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def content_digest(tensor):
+    """Digest of the decoded, resized model input."""
+    return hashlib.blake2b(tensor.contiguous().numpy().tobytes(), digest_size=16).hexdigest()
+
+
+def perceptual_digest(tensor, hash_size=16):
+    """Difference hash of the model input: the sign of horizontal brightness steps on a
+    ``hash_size`` x ``hash_size`` grid, so re-encodes and small resizes of a photo collide."""
+    gray = tensor.reshape(-1, *tensor.shape[-3:]).mean(dim=1, keepdim=True)
+    grid = torch.nn.functional.adaptive_avg_pool2d(gray, (hash_size, hash_size + 1))[0, 0]
+    bits = (grid[:, 1:] > grid[:, :-1]).flatten().tolist()
+    return f'{int("".join("1" if bit else "0" for bit in bits), 2):0{hash_size * hash_size // 4}x}'
+
+
+class DetectionCache:
+    """Two-tier cache of (confidence, class index) results.
+
+    Keys are ``(kind, model_fingerprint, digest)``: ``upload`` digests of the
+    raw bytes answer exact resends without decoding, ``content`` or
+    ``perceptual`` digests of the decoded input (``key_mode``) catch
+    re-encodes of the same photo. Perceptual lookups also match the nearest
+    in-memory hash within ``max_distance`` bits, since recompression flips a
+    few bits of the hash; hashes are indexed by ``max_distance + 1`` bit
+    bands, one of which such a neighbour must share exactly, so only those
+    candidates are compared. The memory tier is an LRU of ``max_entries``.
+
+    When ``disk_dir`` is set, entries are also written there as small JSON
+    files, one directory per model fingerprint, and survive restarts. The
+    disk tier is an LRU of at most ``disk_max_entries`` files and
+    ``disk_max_bytes``; files of a replaced model are never read again and
+    are the first to go. Each process evicts among the files it knows of
+    and rescans ``disk_dir`` every ``disk_max_entries // 16`` writes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_dir=DEFAULT_DISK_DIR, key_mode=DEFAULT_KEY_MODE,
+                 max_distance=DEFAULT_MAX_DISTANCE, disk_max_entries=DEFAULT_DISK_MAX_ENTRIES,
+                 disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        if key_mode not in KEY_MODES:
+            raise ValueError(f"Unknown cache key mode: {key_mode}")
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.key_mode = key_mode
+        self.max_distance = max_distance
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bands = {}  # (fingerprint, band, bits) -> perceptual keys holding those bits
+        self._disk = OrderedDict()  # path -> size in bytes, least recently used first
+        self._disk_bytes = 0
+        self._writes_since_scan = 0
+        self._lock = threading.Lock()
+        self.hits = {'upload': 0, 'content': 0, 'perceptual': 0}
+        self.disk_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def input_digest(self, tensor):
+        if self.key_mode == 'perceptual':
+            return perceptual_digest(tensor)
+        return content_digest(tensor)
+
+    def _disk_path(self, key):
+        model_dir = hashlib.blake2b(str(key[1]).encode(), digest_size=8).hexdigest()
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, model_dir, f'{key[0]}_{digest}.json')
+
+    def _scan_disk(self):
+        """Rebuild the disk index from ``disk_dir``, oldest modification first."""
+        found = []
+        with os.scandir(self.disk_dir) as model_dirs:
+            for model_dir in model_dirs:
+                if not model_dir.is_dir():
+                    # Files from the layout before per-model directories are never read again
+                    if model_dir.name.endswith('.json'):
+                        _remove(model_dir.path)
+                    continue
+                try:
+                    with os.scandir(model_dir.path) as files:
+                        for entry in files:
+                            if entry.name.endswith('.json'):
+                                try:
+                                    st = entry.stat()
+                                except FileNotFoundError:
+                                    continue
+                                found.append((st.st_mtime_ns, entry.path, st.st_size))
+                except FileNotFoundError:
+                    continue
+        found.sort()
+        with self._lock:
+            self._disk = OrderedDict((path, size) for _, path, size in found)
+            self._disk_bytes = sum(size for _, _, size in found)
+            self._writes_since_scan = 0
+        self._evict_disk()
+
+    def _evict_disk(self):
+        evicted = []
+        with self._lock:
+            while self._disk and (len(self._disk) > self.disk_max_entries or self._disk_bytes > self.disk_max_bytes):
+                path, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(path)
+            self.disk_evictions += len(evicted)
+        for path in evicted:
+            _remove(path)
+
+    def _band_keys(self, key):
+        _, fingerprint, digest = key
+        value = int(digest, 16)
+        count = self.max_distance + 1
+        width = -(-len(digest) * 4 // count)
+        mask = (1 << width) - 1
+        return [(fingerprint, band, (value >> (band * width)) & mask) for band in range(count)]
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+            if key[0] == 'perceptual' and self.max_distance > 0:
+                value = self._nearest(key)
+                if value is not None:
+                    return value
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path) as f:
+                    value = tuple(json.load(f))
+            except (OSError, ValueError):
+                return None
+            self._remember(key, value)
+            with self._lock:
+                self.disk_hits += 1
+                if path in self._disk:
+                    self._disk.move_to_end(path)
+            return value
+        return None
+
+    def _nearest(self, key):
+        target = int(key[2], 16)
+        candidates = set()
+        for band_key in self._band_keys(key):
+            candidates.update(self._bands.get(band_key, ()))
+        best, best_distance = None, self.max_distance + 1
+        for other in candidates:
+            distance = (int(other[2], 16) ^ target).bit_count()
+            if distance < best_distance:
+                best, best_distance = other, distance
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        self.near_hits += 1
+        return self._entries[best]
+
+    def get(self, key, count_miss=True):
+        """Cached result or None; pass ``count_miss=False`` for a lookup a later tier will retry."""
+        value = self._lookup(key)
+        with self._lock:
+            if value is None:
+                self.misses += count_miss
+            else:
+                self.hits[key[0]] += 1
+        return value
+
+    def _index(self, key, add):
+        if key[0] != 'perceptual' or self.max_distance <= 0:
+            return
+        for band_key in self._band_keys(key):
+            if add:
+                self._bands.setdefault(band_key, set()).add(key)
+            else:
+                keys = self._bands.get(band_key)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._bands[band_key]
+
+    def _remember(self, key, value):
+        with self._lock:
+            if key not in self._entries:
+                self._index(key, add=True)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._index(evicted, add=False)
+
+    def put(self, key, value):
+        value = (float(value[0]), int(value[1]))
+        self._remember(key, value)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:  # evicted by another process meanwhile
+                return
+            with self._lock:
+                self._disk_bytes += size - self._disk.pop(path, 0)
+                self._disk[path] = size
+                self._writes_since_scan += 1
+                rescan = self._writes_since_scan >= max(1, self.disk_max_entries // 16)
+            if rescan:
+                self._scan_disk()
+            else:
+                self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                'key_mode': self.key_mode,
+                'hits': hits,
+                'upload_hits': self.hits['upload'],
+                'input_hits': self.hits['content'] + self.hits['perceptual'],
+                'disk_hits': self.disk_hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'disk_evictions': self.disk_evictions,
+            }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,84 @@
+"""
+Confidence-gated low-resolution cascade for the disease classifier.
+
+Every image is first classified at ``size`` px (the 256 px input average-pooled
+down, about (size/256)^2 of the full pass's work); only images whose top
+softmax probability is below ``threshold`` are run again at 256 px. Enabled
+with DISEASE_CASCADE_SIZE (e.g. 128; 0 = off), gated by
+DISEASE_CASCADE_THRESHOLD (default 0.9). A model that rejects the low
+resolution leaves the cascade disabled. ``calibrate_cascade.py`` measures
+accuracy, escalation rate and latency per threshold on a labelled folder.
+"""
+
+import logging
+import os
+import threading
+
+import torch
+import torch.nn.functional as F
+
+from disease_preprocess import INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+CASCADE_SIZE = int(os.environ.get('DISEASE_CASCADE_SIZE', '0'))
+CASCADE_THRESHOLD = float(os.environ.get('DISEASE_CASCADE_THRESHOLD', '0.9'))
+
+
+def downscale(batch, size):
+    """(N, 3, size, size) version of a (N, 3, 256, 256) input batch."""
+    if batch.shape[-1] == size:
+        return batch
+    if batch.shape[-1] % size == 0:
+        return F.avg_pool2d(batch, batch.shape[-1] // size)
+    return F.interpolate(batch, size=(size, size), mode='bilinear', antialias=True, align_corners=False)
+
+
+def top1(logits):
+    """(confidence, class index) tensors from a batch of logits."""
+    return torch.max(F.softmax(logits.float(), dim=1), dim=1)
+
+
+class Cascade:
+    def __init__(self, model, size=CASCADE_SIZE, threshold=CASCADE_THRESHOLD):
+        if not 0 < size < INPUT_SIZE:
+            raise ValueError(f"cascade size must be between 1 and {INPUT_SIZE - 1}")
+        self.model = model
+        self.threshold = threshold
+        try:
+            # Exports with a fixed input size (e.g. older ONNX files) reject the low pass
+            model(torch.zeros(1, 3, size, size))
+        except Exception as e:
+            logger.warning("Model variant cannot run the cascade size; cascade disabled",
+                           extra={'variant': getattr(model, 'variant', None), 'size': size, 'error': str(e)})
+            size = 0
+        self.size = size
+        self.fingerprint = f'{model.fingerprint}:cascade{size}@{threshold}' if size else model.fingerprint
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+
+    def __call__(self, batch):
+        """(confidence, class index, escalated) tensors for a (N, 3, 256, 256) batch."""
+        if not self.size:
+            confidence, preds = top1(self.model(batch))
+            return confidence, preds, torch.zeros(len(batch), dtype=torch.bool)
+        confidence, preds = top1(self.model(downscale(batch, self.size)))
+        escalate = confidence < self.threshold
+        if escalate.any():
+            confidence[escalate], preds[escalate] = top1(self.model(batch[escalate]))
+        with self._lock:
+            self.images += len(batch)
+            self.escalated += int(escalate.sum())
+        return confidence, preds, escalate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': bool(self.size),
+                'size': self.size,
+                'threshold': self.threshold,
+                'images': self.images,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.images if self.images else 0.0,
+            }
@@ -0,0 +1,231 @@
+"""
+ResNet9 plant disease classifier: architecture, class names and runtime loading.
+
+``load_model`` returns a callable taking a (N, 3, H, W) float batch to logits
+for one of these variants (DISEASE_MODEL_VARIANT, default eager):
+
+  eager     - the checkpoint as trained
+  folded    - batch-norm folded into the preceding convolutions, channels-last
+  scripted  - folded, traced and frozen TorchScript, channels-last
+  int8      - statically quantized TorchScript (x86/fbgemm kernels)
+  onnx      - ONNX graph run by onnxruntime
+
+int8 and onnx need the files written by ``export_disease_model.py export``;
+scripted uses its exported file when present and traces at load otherwise.
+Exports made from a different checkpoint are ignored, and a variant that
+cannot be loaded falls back to eager.
+"""
+
+import copy
+import json
+import logging
+import os
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.environ.get('DISEASE_MODEL_PATH', os.path.join(SERVICES_DIR, 'plant-disease-model.pth'))
+EXPORT_DIR = os.environ.get('DISEASE_EXPORT_DIR', os.path.join(SERVICES_DIR, 'saved_models', 'disease'))
+VARIANT = os.environ.get('DISEASE_MODEL_VARIANT', 'eager')
+VARIANTS = ('eager', 'folded', 'scripted', 'int8', 'onnx')
+EXPORT_FILES = {'scripted': 'resnet9-scripted.pt', 'int8': 'resnet9-int8.pt', 'onnx': 'resnet9.onnx'}
+QUANTIZED_ENGINE = 'x86'
+# Below this top-1 probability the upload is reported as not a plant image
+MIN_CONFIDENCE = float(os.environ.get('DISEASE_MIN_CONFIDENCE', '0.75'))
+
+
+# Model definition
+def ConvBlock(in_channels, out_channels, pool=False):
+    layers = [
+        nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
+        nn.BatchNorm2d(out_channels),
+        nn.ReLU(inplace=True)
+    ]
+    if pool:
+        layers.append(nn.MaxPool2d(4))
+    return nn.Sequential(*layers)
+
+class ResNet9(nn.Module):
+    def __init__(self, in_channels, num_diseases):
+        super(ResNet9, self).__init__()
+        self.conv1 = ConvBlock(in_channels, 64)
+        self.conv2 = ConvBlock(64, 128, pool=True)
+        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
+        self.conv3 = ConvBlock(128, 256, pool=True)
+        self.conv4 = ConvBlock(256, 512, pool=True)
+        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
+        # Global max pool: the same as MaxPool2d(4) on the 4x4 map of a 256 px
+        # input, and also defined for the smaller inputs of the cascade
+        self.classifier = nn.Sequential(
+            nn.AdaptiveMaxPool2d(1),
+            nn.Flatten(),
+            nn.Linear(512, num_diseases)
+        )
+
+    def forward(self, xb):
+        out = self.conv1(xb)
+        out = self.conv2(out)
+        out = self.res1(out) + out
+        out = self.conv3(out)
+        out = self.conv4(out)
+        out = self.res2(out) + out
+        out = self.classifier(out)
+        return out
+
+# Define classes
+CLASSES = ['Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 'Apple___healthy',
+           'Blueberry___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Cherry_(including_sour)___healthy',
+           'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Corn_(maize)___Common_rust_',
+           'Corn_(maize)___Northern_Leaf_Blight', 'Corn_(maize)___healthy', 'Grape___Black_rot',
+           'Grape___Esca_(Black_Measles)', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Grape___healthy',
+           'Orange___Haunglongbing_(Citrus_greening)', 'Peach___Bacterial_spot', 'Peach___healthy',
+           'Pepper,_bell___Bacterial_spot', 'Pepper,_bell___healthy', 'Potato___Early_blight',
+           'Potato___Late_blight', 'Potato___healthy', 'Raspberry___healthy', 'Soybean___healthy',
+           'Squash___Powdery_mildew', 'Strawberry___Leaf_scorch', 'Strawberry___healthy',
+           'Tomato___Bacterial_spot', 'Tomato___Early_blight', 'Tomato___Late_blight',
+           'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot', 'Tomato___Spider_mites Two-spotted_spider_mite',
+           'Tomato___Target_Spot', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Tomato___Tomato_mosaic_virus',
+           'Tomato___healthy']
+
+
+def detection_result(confidence, pred):
+    """Response for a top-1 softmax probability (0-1) and class index."""
+    if confidence < MIN_CONFIDENCE:
+        return {
+        "prediction": "Non - Plant Image",
+        "confidence": 0,
+        "success": True
+        }
+    return {
+        "prediction": CLASSES[pred],
+        "confidence": float(confidence),
+        "success": True
+    }
+
+
+def load_eager(path=MODEL_PATH):
+    model = ResNet9(3, len(CLASSES))
+    if os.path.exists(path):
+        model.load_state_dict(torch.load(path, map_location=torch.device('cpu')))
+    else:
+        logger.warning("Disease model checkpoint not found; using untrained weights", extra={'path': path})
+    return model.eval()
+
+
+def fold_batchnorm(model):
+    """Copy of ``model`` with each ConvBlock's BatchNorm2d merged into its Conv2d."""
+    model = copy.deepcopy(model).eval()
+    for module in model.modules():
+        if not isinstance(module, nn.Sequential):
+            continue
+        for i in range(len(module) - 1):
+            if isinstance(module[i], nn.Conv2d) and isinstance(module[i + 1], nn.BatchNorm2d):
+                module[i] = torch.nn.utils.fuse_conv_bn_eval(module[i], module[i + 1])
+                module[i + 1] = nn.Identity()
+    return model
+
+
+def trace(model, size=256, channels_last=True):
+    """Frozen TorchScript of ``model``; the traced graph accepts any batch size.
+
+    ``optimize_for_inference`` is applied after loading, since its
+    pre-packed weights do not survive ``torch.jit.save``.
+    """
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    example = torch.rand(2, 3, size, size)
+    if channels_last:
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        scripted = torch.jit.trace(model, example)
+        return torch.jit.freeze(scripted.eval())
+
+
+def checkpoint_fingerprint(path=MODEL_PATH):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def export_path(variant, export_dir=EXPORT_DIR, model_path=MODEL_PATH):
+    """Exported file for ``variant`` if it was made from the current checkpoint, else None."""
+    path = os.path.join(export_dir, EXPORT_FILES[variant])
+    try:
+        with open(os.path.join(export_dir, 'export.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(path) or meta.get('source') != checkpoint_fingerprint(model_path):
+        return None
+    return path
+
+
+class DiseaseModel:
+    """Callable mapping a (N, 3, H, W) float32 batch to (N, classes) logits."""
+
+    def __init__(self, fn, variant, channels_last=False, fingerprint=None):
+        self.fn = fn
+        self.variant = variant
+        self.channels_last = channels_last
+        # Identifies the variant and checkpoint, for keying cached results
+        self.fingerprint = fingerprint or variant
+
+    def __call__(self, batch):
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            return self.fn(batch)
+
+
+def _onnx_runner(path):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+    name = session.get_inputs()[0].name
+
+    def run(batch):
+        return torch.from_numpy(session.run(None, {name: batch.contiguous().numpy()})[0])
+    return run
+
+
+def _load_variant(variant, model_path, export_dir):
+    if variant == 'eager':
+        return DiseaseModel(load_eager(model_path), variant)
+    if variant == 'folded':
+        return DiseaseModel(fold_batchnorm(load_eager(model_path)).to(memory_format=torch.channels_last),
+                            variant, channels_last=True)
+    path = export_path(variant, export_dir, model_path)
+    if variant == 'scripted':
+        scripted = torch.jit.load(path) if path else trace(fold_batchnorm(load_eager(model_path)))
+        return DiseaseModel(torch.jit.optimize_for_inference(scripted), variant, channels_last=True)
+    if path is None:
+        raise FileNotFoundError(f"no current {variant} export in {export_dir}; run export_disease_model.py export")
+    if variant == 'int8':
+        torch.backends.quantized.engine = QUANTIZED_ENGINE
+        return DiseaseModel(torch.jit.load(path), variant)
+    if variant == 'onnx':
+        return DiseaseModel(_onnx_runner(path), variant)
+    raise ValueError(f"Unknown model variant: {variant}")
+
+
+def load_model(variant=VARIANT, model_path=MODEL_PATH, export_dir=EXPORT_DIR, fallback=True):
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown model variant: {variant}")
+    try:
+        model = _load_variant(variant, model_path, export_dir)
+    except (OSError, ImportError, RuntimeError) as e:
+        if variant == 'eager' or not fallback:
+            raise
+        logger.warning("Falling back to the eager model", extra={'variant': variant, 'error': str(e)})
+        model = _load_variant('eager', model_path, export_dir)
+    source = checkpoint_fingerprint(model_path) or {}
+    model.fingerprint = f"{model.variant}:{source.get('mtime_ns')}:{source.get('size')}"
+    logger.info("Loaded disease model", extra={'variant': model.variant})
+    return model
@@ -0,0 +1,77 @@
+"""
+In-memory image decoding for the plant disease model.
+
+Uploads are decoded straight from the request bytes. JPEGs are opened in
+draft mode, which lets libjpeg decode at 1/2, 1/4 or 1/8 scale (never below
+the model's input size), so a 12 MP phone photo is decoded at roughly 1/8 of
+the cost before the final bilinear resize. Pixels are written in one pass into
+a preallocated float32 tensor scaled to [0, 1], the same layout as
+``transforms.ToTensor()``.
+
+DISEASE_JPEG_DRAFT=0 turns draft decoding off (full-resolution decode, as
+``transforms.Resize`` on the original file).
+"""
+
+import io
+import os
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+INPUT_SIZE = 256
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+JPEG_DRAFT = os.environ.get('DISEASE_JPEG_DRAFT', '1') != '0'
+
+_local = threading.local()
+
+
+def open_image(data, size=INPUT_SIZE, draft=JPEG_DRAFT):
+    """RGB PIL image of ``size`` x ``size`` decoded from encoded image bytes."""
+    image = Image.open(io.BytesIO(data))
+    if draft and image.format == 'JPEG':
+        image.draft('RGB', (size, size))
+    image = image.convert('RGB')
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.BILINEAR)
+    return image
+
+
+def to_tensor(image, out):
+    """Write an RGB image into ``out`` (a (3, H, W) float32 CPU tensor) scaled to [0, 1]."""
+    pixels = np.asarray(image).transpose(2, 0, 1)
+    np.multiply(pixels, np.float32(1 / 255), out=out.numpy(), casting='unsafe')
+    return out
+
+
+def input_buffer(size=INPUT_SIZE):
+    """This thread's reusable (1, 3, size, size) input tensor."""
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    if size not in buffers:
+        buffers[size] = torch.empty((1, 3, size, size), dtype=torch.float32)
+    return buffers[size]
+
+
+def preprocess_bytes(data, size=INPUT_SIZE, out=None):
+    """Model input for one encoded image: a (1, 3, size, size) tensor.
+
+    Without ``out`` the calling thread's buffer is reused, so the tensor is
+    only valid until the thread preprocesses its next image.
+    """
+    if out is None:
+        out = input_buffer(size)
+    to_tensor(open_image(data, size), out[0])
+    return out
+
+
+def list_images(folder):
+    """(path, parent folder name) for every image under ``folder``, sorted by path."""
+    found = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                found.append((os.path.join(root, name), os.path.basename(root)))
+    return sorted(found)
@@ -0,0 +1,97 @@
+"""
+Multi-image uploads for the disease detector's batch endpoint.
+
+``upload_items`` expands the request's files (plain images and .zip archives)
+into (name, bytes) pairs, with limits on image count and on the size of each
+image, plain or (uncompressed) inside an archive. ``decode_chunks`` decodes them on a thread pool
+straight into preallocated (N, 3, 256, 256) batch tensors; the next chunk is
+decoded while the caller runs the model on the current one.
+"""
+
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from disease_preprocess import IMAGE_EXTENSIONS, INPUT_SIZE, preprocess_bytes
+
+MAX_IMAGES = int(os.environ.get('DISEASE_BATCH_MAX_IMAGES', '500'))
+MAX_IMAGE_BYTES = int(os.environ.get('DISEASE_BATCH_MAX_IMAGE_MB', '25')) * 1024 * 1024
+DECODE_THREADS = int(os.environ.get('DISEASE_DECODE_THREADS', str(os.cpu_count() or 1)))
+
+_executor = ThreadPoolExecutor(max_workers=max(1, DECODE_THREADS), thread_name_prefix='disease-decode')
+
+
+class UploadError(ValueError):
+    """The upload as a whole is unusable; maps to HTTP 400."""
+
+
+def _is_zip(storage):
+    return (storage.filename or '').lower().endswith('.zip') or storage.mimetype in (
+        'application/zip', 'application/x-zip-compressed')
+
+
+def upload_items(files, max_images=MAX_IMAGES, max_bytes=MAX_IMAGE_BYTES):
+    """(name, bytes or an error string) for each uploaded image, zip archives expanded in member order."""
+    items = []
+    for storage in files:
+        if not _is_zip(storage):
+            name = storage.filename or f'image-{len(items)}'
+            data = storage.read(max_bytes + 1)
+            items.append((name, data if len(data) <= max_bytes else _too_large(max_bytes)))
+            if len(items) > max_images:
+                break
+            continue
+        try:
+            archive = zipfile.ZipFile(storage.stream)
+        except zipfile.BadZipFile:
+            raise UploadError(f'{storage.filename} is not a valid zip archive')
+        with archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if member.file_size > max_bytes:
+                    items.append((member.filename, _too_large(max_bytes)))
+                else:
+                    items.append((member.filename, archive.read(member)))
+                if len(items) > max_images:
+                    break
+        if len(items) > max_images:
+            break
+    if len(items) > max_images:
+        raise UploadError(f'at most {max_images} images per request')
+    return items
+
+
+def _too_large(max_bytes):
+    return f'image exceeds {max_bytes // (1024 * 1024)} MB'
+
+
+def _decode(data, out):
+    if isinstance(data, str):
+        return data
+    try:
+        preprocess_bytes(data, out=out)
+    except Exception as e:
+        return f'unsupported or corrupt image ({e.__class__.__name__})'
+    return None
+
+
+def _submit(chunk):
+    batch = torch.empty((len(chunk), 3, INPUT_SIZE, INPUT_SIZE))
+    futures = [_executor.submit(_decode, data, batch[i:i + 1]) for i, (_, data) in enumerate(chunk)]
+    return chunk, batch, futures
+
+
+def decode_chunks(items, batch_size):
+    """Yield (items, batch of the decodable ones, {position in chunk: error}) per ``batch_size`` items."""
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    pending = _submit(chunks[0]) if chunks else None
+    for index in range(len(chunks)):
+        chunk, batch, futures = pending
+        errors = {i: error for i, error in enumerate(f.result() for f in futures) if error}
+        pending = _submit(chunks[index + 1]) if index + 1 < len(chunks) else None
+        if errors:
+            batch = batch[[i for i in range(len(chunk)) if i not in errors]]
+        yield chunk, batch, errors
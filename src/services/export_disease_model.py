@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+CPU-optimized exports of the plant disease model, and an accuracy harness.
+
+``export`` writes to saved_models/disease/:
+  resnet9-scripted.pt  - batch-norm folded, traced and frozen TorchScript (channels-last)
+  resnet9-int8.pt      - static post-training int8 TorchScript, calibrated on
+                         --calibration-dir images (random inputs otherwise)
+  resnet9.onnx         - folded graph with a dynamic batch dimension
+  export.json          - fingerprint of the checkpoint they were made from
+
+``compare`` runs each variant over a held-out image folder and reports top-1
+agreement with eager, the largest softmax difference, accuracy when images
+sit in folders named after their class, and milliseconds per image; the
+fastest variant within --tolerance of eager is recommended.
+
+    python export_disease_model.py export --calibration-dir leaves/val
+    python export_disease_model.py compare --images leaves/test --out compare.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+
+import torch
+
+from disease_model import (CLASSES, EXPORT_DIR, EXPORT_FILES, MODEL_PATH, QUANTIZED_ENGINE, VARIANTS,
+                           checkpoint_fingerprint, fold_batchnorm, load_eager, load_model, trace)
+from disease_preprocess import INPUT_SIZE, list_images, preprocess_bytes
+
+
+def load_batches(folder, batch_size, limit=None):
+    """([(N, 3, 256, 256) tensors], [class index or None per image]) for the images under ``folder``."""
+    images = list_images(folder)[:limit]
+    tensors, labels = [], []
+    for path, parent in images:
+        with open(path, 'rb') as f:
+            tensors.append(preprocess_bytes(f.read(), out=torch.empty((1, 3, INPUT_SIZE, INPUT_SIZE)))[0])
+        labels.append(CLASSES.index(parent) if parent in CLASSES else None)
+    batches = [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+    return batches, labels
+
+
+def quantize_int8(model, calibration):
+    """Static int8 copy of ``model`` (conv+bn+relu fused), observers calibrated on ``calibration`` batches."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(QUANTIZED_ENGINE),
+                          (calibration[0],))
+    with torch.no_grad():
+        for batch in calibration:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def export(model_path, out_dir, variants, calibration_dir=None, calibration_images=64):
+    os.makedirs(out_dir, exist_ok=True)
+    eager = load_eager(model_path)
+    folded = fold_batchnorm(eager)
+    written = {}
+    for variant in variants:
+        path = os.path.join(out_dir, EXPORT_FILES[variant])
+        started = time.perf_counter()
+        if variant == 'scripted':
+            torch.jit.save(trace(folded), path)
+        elif variant == 'int8':
+            if calibration_dir:
+                calibration, _ = load_batches(calibration_dir, 8, calibration_images)
+            else:
+                print("No --calibration-dir; calibrating int8 ranges on random images")
+                calibration = [torch.rand(8, 3, INPUT_SIZE, INPUT_SIZE) for _ in range(max(1, calibration_images // 8))]
+            quantized = quantize_int8(eager, calibration)
+            with torch.no_grad():
+                torch.jit.save(torch.jit.freeze(torch.jit.trace(quantized, calibration[0]).eval()), path)
+        elif variant == 'onnx':
+            example = torch.rand(1, 3, INPUT_SIZE, INPUT_SIZE)
+            # Any batch size and resolution, so the cascade's low pass runs on it too
+            torch.onnx.export(folded, (example,), path, input_names=['input'], output_names=['logits'],
+                              dynamic_axes={'input': {0: 'batch', 2: 'height', 3: 'width'},
+                                            'logits': {0: 'batch'}}, dynamo=False)
+        else:
+            raise ValueError(f"Nothing to export for variant {variant}")
+        written[variant] = {'file': EXPORT_FILES[variant], 'bytes': os.path.getsize(path),
+                            'seconds': round(time.perf_counter() - started, 2)}
+        print(f"Wrote {path} ({written[variant]['bytes'] / 1e6:.1f} MB)")
+    meta_path = os.path.join(out_dir, 'export.json')
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    if meta.get('source') != checkpoint_fingerprint(model_path):
+        meta = {}
+    meta.update({'source': checkpoint_fingerprint(model_path), 'torch': torch.__version__})
+    meta.setdefault('variants', {}).update(written)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def compare(images, variants, model_path, export_dir, batch_size, tolerance, repeats):
+    batches, labels = load_batches(images, batch_size)
+    if not batches:
+        raise SystemExit(f"No images under {images}")
+    labelled = [i for i, label in enumerate(labels) if label is not None]
+    report = {'images': len(labels), 'labelled': len(labelled), 'batch_size': batch_size,
+              'tolerance': tolerance, 'variants': {}}
+    reference = None
+    for variant in ['eager'] + [v for v in variants if v != 'eager']:
+        try:
+            model = load_model(variant, model_path, export_dir, fallback=False)
+        except (OSError, ImportError, RuntimeError) as e:
+            report['variants'][variant] = {'error': str(e)}
+            continue
+        seconds = []
+        try:
+            model(batches[0])
+            for _ in range(repeats):
+                started = time.perf_counter()
+                probabilities = torch.cat([torch.softmax(model(batch).float(), dim=1) for batch in batches])
+                seconds.append(time.perf_counter() - started)
+        except Exception as e:
+            # e.g. an export that rejects this batch size
+            report['variants'][variant] = {'error': str(e).splitlines()[0] if str(e) else type(e).__name__}
+            continue
+        predictions = probabilities.argmax(dim=1)
+        if variant == 'eager':
+            reference = (probabilities, predictions)
+        entry = {'ms_per_image': round(min(seconds) / len(labels) * 1000, 3)}
+        if reference is not None:
+            entry['top1_agreement'] = float((predictions == reference[1]).float().mean())
+            entry['max_prob_diff'] = float((probabilities - reference[0]).abs().max())
+        if labelled:
+            entry['accuracy'] = sum(int(predictions[i]) == labels[i] for i in labelled) / len(labelled)
+        report['variants'][variant] = entry
+
+    eager = report['variants']['eager']
+    if reference is None:
+        report['recommended'] = None
+        report['recommendation_note'] = f"no eager baseline to compare against: {eager['error']}"
+        return report
+    eligible = [
+        (entry['ms_per_image'], variant) for variant, entry in report['variants'].items()
+        if 'error' not in entry and entry['top1_agreement'] >= 1 - tolerance
+        and entry.get('accuracy', 0) >= eager.get('accuracy', 0) - tolerance
+    ]
+    if eligible:
+        report['recommended'] = min(eligible)[1]
+    else:
+        report['recommended'] = 'eager'
+        report['recommendation_note'] = f'no variant within tolerance {tolerance} of eager'
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export and compare CPU variants of the plant disease model.')
+    parser.add_argument('--model-path', default=MODEL_PATH)
+    parser.add_argument('--export-dir', default=EXPORT_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    write = commands.add_parser('export', help='write TorchScript, int8 and ONNX variants')
+    write.add_argument('--variants', nargs='+', default=list(EXPORT_FILES), choices=list(EXPORT_FILES))
+    write.add_argument('--calibration-dir', help='representative images for int8 calibration')
+    write.add_argument('--calibration-images', type=int, default=64)
+    check = commands.add_parser('compare', help='accuracy and speed of each variant on held-out images')
+    check.add_argument('--images', required=True, help='image folder, optionally one subfolder per class')
+    check.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    check.add_argument('--batch-size', type=int, default=8)
+    check.add_argument('--tolerance', type=float, default=0.01,
+                       help='allowed top-1 disagreement with eager (and accuracy drop)')
+    check.add_argument('--repeats', type=int, default=3)
+    check.add_argument('--out', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export(args.model_path, args.export_dir, args.variants, args.calibration_dir, args.calibration_images)
+        return
+    report = compare(args.images, args.variants, args.model_path, args.export_dir, args.batch_size,
+                     args.tolerance, args.repeats)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('PRICE_FORECAST_CACHE_SIZE', '4096'))
+DEFAULT_DISK_MAX_ENTRIES = int(os.environ.get('PRICE_FORECAST_CACHE_DISK_ENTRIES', '65536'))
+DEFAULT_DISK_MAX_BYTES = int(os.environ.get('PRICE_FORECAST_CACHE_DISK_BYTES', str(256 * 1024 * 1024)))
+
+
+class ForecastCache:
+    """Two-tier cache of inverse-transformed price forecasts.
+
+    Keys are ``(district_id, commodity_id, horizon, data_version, model_fingerprint)``
+    so a new observation or a retrained model never hits an old entry. The
+    memory tier is an LRU of ``max_entries``; when ``disk_dir`` is set, entries
+    are also written there as ``.npy`` files, one directory per pair, and
+    survive restarts. The disk tier is an LRU too, capped at
+    ``disk_max_entries`` files and ``disk_max_bytes``. Each process evicts
+    among the files it knows of (those found by its last scan of
+    ``disk_dir`` plus its own writes); it rescans every
+    ``disk_max_entries // 16`` writes so other workers' files count as well.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_dir=None, disk_max_entries=DEFAULT_DISK_MAX_ENTRIES,
+                 disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._disk = OrderedDict()  # path -> size in bytes, least recently used first
+        self._disk_bytes = 0
+        self._writes_since_scan = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _pair_dir(self, district_id, commodity_id):
+        return os.path.join(self.disk_dir, f'd{district_id}_c{commodity_id}')
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return os.path.join(self._pair_dir(*key[:2]), f'{digest}.npy')
+
+    def _scan_disk(self):
+        """Rebuild the disk index from ``disk_dir``, oldest modification first."""
+        found = []
+        with os.scandir(self.disk_dir) as pair_dirs:
+            for pair_dir in pair_dirs:
+                if not pair_dir.is_dir():
+                    # Flat files from the layout before per-pair directories are never read again
+                    if pair_dir.name.endswith('.npy'):
+                        _remove(pair_dir.path)
+                    continue
+                try:
+                    with os.scandir(pair_dir.path) as files:
+                        for entry in files:
+                            if entry.name.endswith('.npy'):
+                                try:
+                                    st = entry.stat()
+                                except FileNotFoundError:
+                                    continue
+                                found.append((st.st_mtime_ns, entry.path, st.st_size))
+                except FileNotFoundError:
+                    continue
+        found.sort()
+        with self._lock:
+            self._disk = OrderedDict((path, size) for _, path, size in found)
+            self._disk_bytes = sum(size for _, _, size in found)
+            self._writes_since_scan = 0
+        self._evict_disk()
+
+    def _evict_disk(self):
+        evicted = []
+        with self._lock:
+            while self._disk and (len(self._disk) > self.disk_max_entries or self._disk_bytes > self.disk_max_bytes):
+                path, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(path)
+            self.disk_evictions += len(evicted)
+        for path in evicted:
+            _remove(path)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value.copy()
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    value = np.load(path)
+                except (OSError, ValueError):
+                    value = None
+                if value is not None:
+                    self._remember(key, value)
+                    with self._lock:
+                        self.hits += 1
+                        self.disk_hits += 1
+                        if path in self._disk:
+                            self._disk.move_to_end(path)
+                    return value.copy()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        value = np.array(value)
+        self._remember(key, value)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp_path, path)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:  # invalidated by another process meanwhile
+                return
+            with self._lock:
+                self._disk_bytes += size - self._disk.pop(path, 0)
+                self._disk[path] = size
+                self._writes_since_scan += 1
+                rescan = self._writes_since_scan >= max(1, self.disk_max_entries // 16)
+            if rescan:
+                self._scan_disk()
+            else:
+                self._evict_disk()
+
+    def invalidate_pair(self, district_id, commodity_id):
+        """Drop every cached forecast for one (district, commodity) pair."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == district_id and key[1] == commodity_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if self.disk_dir:
+            pair_dir = self._pair_dir(district_id, commodity_id)
+            try:
+                names = os.listdir(pair_dir)
+            except FileNotFoundError:
+                return
+            # Temp files belong to writes in flight; those entries carry a new data_version anyway
+            paths = [os.path.join(pair_dir, name) for name in names if name.endswith('.npy')]
+            with self._lock:
+                for path in paths:
+                    self._disk_bytes -= self._disk.pop(path, 0)
+            for path in paths:
+                _remove(path)
+
+    def invalidate_pairs(self, pairs):
+        for district_id, commodity_id in pairs:
+            self.invalidate_pair(district_id, commodity_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'disk_evictions': self.disk_evictions,
+            }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Precomputed forecasts older than this are ignored even if their inputs still match
+DEFAULT_MAX_AGE_SECONDS = float(os.environ.get('PRICE_FORECAST_TABLE_MAX_AGE_HOURS', '36')) * 3600
+
+
+def write_table(path, horizon, rows, source_meta=None):
+    """Write precomputed forecasts as one uncompressed ``.npz`` table.
+
+    ``rows`` is a list of ``((district_id, commodity_id), prices, data_version, fingerprint)``
+    where ``prices`` has ``horizon`` values.
+    """
+    count = len(rows)
+    pairs = np.zeros((count, 2), dtype=np.int32)
+    prices = np.full((count, horizon), np.nan, dtype=np.float64)
+    width = max((len(data_version) for _, _, data_version, _ in rows), default=3)
+    data_versions = np.zeros((count, width), dtype=np.int64)
+    fingerprints = np.empty(count, dtype=object)
+    for i, (pair, values, data_version, fingerprint) in enumerate(rows):
+        pairs[i] = pair
+        prices[i] = np.asarray(values, dtype=np.float64).reshape(-1)[:horizon]
+        data_versions[i] = data_version
+        fingerprints[i] = fingerprint
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}.npz'
+    np.savez(
+        tmp_path,
+        pairs=pairs,
+        prices=prices,
+        data_versions=data_versions,
+        fingerprints=fingerprints.astype(str),
+        horizon=np.int64(horizon),
+        generated_at=np.float64(time.time()),
+        source_mtime_ns=np.int64((source_meta or {}).get('source_mtime_ns', -1)),
+    )
+    os.replace(tmp_path, path)
+
+
+class ForecastTable:
+    """Read side of the nightly forecast table.
+
+    A row is served only if it was generated from the same price series
+    (last observed day and length) and the same model file the live predictor
+    would use, and the table is younger than ``max_age``. The file is reloaded
+    when it is replaced on disk.
+    """
+
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE_SECONDS, check_interval=5.0):
+        self.path = path
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._loaded_mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.horizon = 0
+        self.generated_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval and self._loaded_mtime is not None:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._rows = {}
+            self._loaded_mtime = None
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with np.load(self.path, allow_pickle=False) as table:
+            prices = table['prices']
+            rows = {}
+            for i, (district_id, commodity_id) in enumerate(table['pairs']):
+                if np.isnan(prices[i]).any():
+                    continue
+                rows[(int(district_id), int(commodity_id))] = (
+                    prices[i],
+                    tuple(int(v) for v in table['data_versions'][i]),
+                    str(table['fingerprints'][i]),
+                )
+            self.horizon = int(table['horizon'])
+            self.generated_at = float(table['generated_at'])
+        self._rows = rows
+        self._loaded_mtime = mtime
+        logger.info("Loaded precomputed forecasts", extra={'rows': len(rows), 'path': self.path})
+
+    def lookup(self, key):
+        """Prices of shape (horizon, 1) for a predictor forecast_key, or None."""
+        district_id, commodity_id, horizon, data_version, fingerprint = key
+        with self._lock:
+            self._maybe_reload()
+            row = self._rows.get((district_id, commodity_id))
+            fresh = (
+                row is not None
+                and horizon <= self.horizon
+                and time.time() - self.generated_at <= self.max_age
+                and row[1] == tuple(data_version)
+                and row[2] == fingerprint
+            )
+            if not fresh:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0][:horizon].reshape(-1, 1).copy()
+
+    def rows(self):
+        """{pair: (prices, data_version, fingerprint)} as currently loaded."""
+        with self._lock:
+            self._maybe_reload()
+            return dict(self._rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rows': len(self._rows),
+                'horizon': self.horizon,
+                'generated_at': self.generated_at,
+            }
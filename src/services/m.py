@@ -1,83 +1,146 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import torch
-import torch.nn as nn
-from torchvision import transforms
-from PIL import Image
+from PIL import UnidentifiedImageError
+import json
 import os
+from admission import Overloaded
+from cpu_threads import AUTOTUNE, apply_affinity, autotune, configure_torch
+from disease_cascade import CASCADE_SIZE, Cascade, top1
+from detection_cache import DEFAULT_MAX_ENTRIES as CACHE_ENTRIES, DetectionCache, upload_digest
+from disease_model import CLASSES, detection_result, load_model
+from disease_preprocess import INPUT_SIZE, preprocess_bytes
+from disease_uploads import UploadError, decode_chunks, upload_items
+from micro_batcher import DEFAULT_MAX_BATCH, DEFAULT_TIMEOUT, MicroBatcher
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Model definition
-def ConvBlock(in_channels, out_channels, pool=False):
-    layers = [
-        nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
-        nn.BatchNorm2d(out_channels),
-        nn.ReLU(inplace=True)
-    ]
-    if pool:
-        layers.append(nn.MaxPool2d(4))
-    return nn.Sequential(*layers)
-
-class ResNet9(nn.Module):
-    def __init__(self, in_channels, num_diseases):
-        super(ResNet9, self).__init__()
-        self.conv1 = ConvBlock(in_channels, 64)
-        self.conv2 = ConvBlock(64, 128, pool=True)
-        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
-        self.conv3 = ConvBlock(128, 256, pool=True)
-        self.conv4 = ConvBlock(256, 512, pool=True)
-        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
-        self.classifier = nn.Sequential(
-            nn.MaxPool2d(4),
-            nn.Flatten(),
-            nn.Linear(512, num_diseases)
-        )
-
-    def forward(self, xb):
-        out = self.conv1(xb)
-        out = self.conv2(out)
-        out = self.res1(out) + out
-        out = self.conv3(out)
-        out = self.conv4(out)
-        out = self.res2(out) + out
-        out = self.classifier(out)
-        return out
-
 # Preprocessing function
-def preprocess_image(image_path):
-    transform = transforms.Compose([
-        transforms.Resize((256, 256)),
-        transforms.ToTensor(),
-    ])
-    image = Image.open(image_path).convert('RGB')
-    return transform(image).unsqueeze(0)
-
-# Define classes
-classes = ['Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 'Apple___healthy', 
-           'Blueberry___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Cherry_(including_sour)___healthy',
-           'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Corn_(maize)___Common_rust_',
-           'Corn_(maize)___Northern_Leaf_Blight', 'Corn_(maize)___healthy', 'Grape___Black_rot',
-           'Grape___Esca_(Black_Measles)', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Grape___healthy',
-           'Orange___Haunglongbing_(Citrus_greening)', 'Peach___Bacterial_spot', 'Peach___healthy',
-           'Pepper,_bell___Bacterial_spot', 'Pepper,_bell___healthy', 'Potato___Early_blight',
-           'Potato___Late_blight', 'Potato___healthy', 'Raspberry___healthy', 'Soybean___healthy',
-           'Squash___Powdery_mildew', 'Strawberry___Leaf_scorch', 'Strawberry___healthy',
-           'Tomato___Bacterial_spot', 'Tomato___Early_blight', 'Tomato___Late_blight',
-           'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot', 'Tomato___Spider_mites Two-spotted_spider_mite',
-           'Tomato___Target_Spot', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Tomato___Tomato_mosaic_virus',
-           'Tomato___healthy']
-
-# Load the model
-in_channels = 3
-num_diseases = len(classes)
-model = ResNet9(in_channels, num_diseases)
-model_path = os.path.join(os.path.dirname(__file__), 'plant-disease-model.pth')
-
-if os.path.exists(model_path):
-    model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-model.eval()
+def preprocess_image(image):
+    """Model input for an image path or encoded image bytes."""
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, 'rb') as f:
+            image = f.read()
+    return preprocess_bytes(image, out=torch.empty((1, 3, INPUT_SIZE, INPUT_SIZE)))
+
+classes = CLASSES
+
+# Fixed torch thread pools (INFERENCE_* settings) so concurrent requests don't oversubscribe the cores
+cpus = apply_affinity()
+threads = configure_torch()
+
+# Load the model (DISEASE_MODEL_VARIANT picks eager, folded, scripted, int8 or onnx)
+model = load_model()
+
+tuning = None
+if AUTOTUNE:
+    _sample = torch.rand(1, 3, INPUT_SIZE, INPUT_SIZE)
+    tuning = autotune(lambda: model(_sample), torch.set_num_threads)
+    threads['intra'] = torch.get_num_threads()
+
+# Optional low-resolution first pass (DISEASE_CASCADE_SIZE); cached results are keyed by the setup used
+cascade = Cascade(model) if CASCADE_SIZE else None
+result_fingerprint = cascade.fingerprint if cascade else model.fingerprint
+
+def classify_tensor(batch):
+    """(confidence, class index) for each image of a (N, 3, 256, 256) batch."""
+    if cascade is not None:
+        confidence, preds, _ = cascade(batch)
+    else:
+        confidence, preds = top1(model(batch))
+    return list(zip(confidence.tolist(), preds.tolist()))
+
+def classify_batch(inputs):
+    """(confidence, class index) for each (3, H, W) input."""
+    return classify_tensor(torch.stack(inputs))
+
+# Concurrent requests share forward passes; DISEASE_MAX_BATCH=1 runs each on its own
+batcher = MicroBatcher(classify_batch, name='disease-batcher') if DEFAULT_MAX_BATCH > 1 else None
+
+def classify(input_tensor):
+    if batcher is None:
+        return classify_batch([input_tensor[0]])[0]
+    return batcher(input_tensor[0])
+
+# Resent photos are answered from here; DISEASE_CACHE_SIZE=0 turns it off
+cache = DetectionCache() if CACHE_ENTRIES > 0 else None
+
+def cache_lookup(data, input_tensor=None):
+    """(cached result or None, keys to store a computed result under, model input) for one encoded image.
+
+    ``input_tensor`` is the image already decoded, as (1, 3, H, W); otherwise
+    it is decoded here unless the upload digest alone answers.
+    """
+    if cache is None:
+        return None, (), input_tensor if input_tensor is not None else preprocess_bytes(data)
+    upload_key = ('upload', result_fingerprint, upload_digest(data))
+    result = cache.get(upload_key, count_miss=False)
+    if result is not None:
+        return result, (), input_tensor
+    if input_tensor is None:
+        input_tensor = preprocess_bytes(data)
+    input_key = (cache.key_mode, result_fingerprint, cache.input_digest(input_tensor))
+    result = cache.get(input_key)
+    if result is not None:
+        return result, (upload_key,), input_tensor
+    return None, (input_key, upload_key), input_tensor
+
+def cache_store(keys, result):
+    for key in keys:
+        cache.put(key, result)
+
+def cached_classify(data):
+    """(confidence, class index) for one encoded image, from the result cache when possible."""
+    result, keys, input_tensor = cache_lookup(data)
+    if result is None:
+        result = classify(input_tensor)
+    cache_store(keys, result)
+    return result
+
+def classify_chunk(chunk, batch, errors):
+    """{position in chunk: (confidence, class index)} for the decoded images of a batch upload chunk.
+
+    Goes through the result cache and the shared micro-batcher like single
+    uploads, so batch requests queue behind (and are shed with) everyone
+    else; images that fail get their message in ``errors``.
+    """
+    decoded = [i for i in range(len(chunk)) if i not in errors]
+    results, misses = {}, []
+    for row, i in enumerate(decoded):
+        result, keys, input_tensor = cache_lookup(chunk[i][1], batch[row:row + 1])
+        if result is None:
+            misses.append((i, keys, input_tensor))
+        else:
+            cache_store(keys, result)
+            results[i] = result
+    if not misses:
+        return results
+    if batcher is None:
+        try:
+            computed = classify_tensor(torch.cat([input_tensor for _, _, input_tensor in misses]))
+        except Exception as e:
+            errors.update((i, str(e)) for i, _, _ in misses)
+            return results
+        for (i, keys, _), result in zip(misses, computed):
+            cache_store(keys, result)
+            results[i] = result
+        return results
+    futures = []
+    for i, keys, input_tensor in misses:
+        try:
+            futures.append((i, keys, batcher.submit(input_tensor[0])))
+        except Overloaded as e:
+            errors[i] = f"Service overloaded, retry shortly ({e})"
+    for i, keys, future in futures:
+        try:
+            result = future.result(DEFAULT_TIMEOUT)
+        except Exception as e:
+            errors[i] = str(e) or e.__class__.__name__
+            continue
+        cache_store(keys, result)
+        results[i] = result
+    return results
 
 @app.route('/api/pest-detection/analyze', methods=['POST'])
 def analyze_image():
@@ -86,36 +149,65 @@ def analyze_image():
 
     image_file = request.files['image']
     try:
-        # Save and preprocess the image
-        temp_path = os.path.join("temp", image_file.filename)
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-        image_file.save(temp_path)
-        
-        input_tensor = preprocess_image(temp_path)
-        
-        # Predict
-        with torch.no_grad():
-            output = model(input_tensor)
-            probabilities = torch.nn.functional.softmax(output, dim=1)
-            confidence, preds = torch.max(probabilities, dim=1)
-        
-        # Cleanup
-        os.remove(temp_path)
-        if confidence[0].item() <75 :
-            return jsonify({
-            "prediction": "Non - Plant Image",
-            "confidence": 0,
-            "success": True
-            })
-        else :
-            return jsonify({
-                "prediction": classes[preds[0].item()],
-                "confidence": float(confidence[0].item()),
-                "success": True
-            })
+        # Decode straight from the upload (no temp file) and predict
+        try:
+            confidence, pred = cached_classify(image_file.read())
+        except UnidentifiedImageError:
+            return jsonify({"error": "Unsupported or corrupt image", "success": False}), 400
+
+        return jsonify(detection_result(confidence, pred))
 
+    except Overloaded as e:
+        return jsonify({"error": f"Service overloaded, retry shortly ({e})", "success": False}), 503
     except Exception as e:
         return jsonify({"error": str(e), "success": False}), 500
 
+@app.route('/api/pest-detection/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Classify many images in one request.
+
+    Send the images as repeated "images" files and/or .zip archives of
+    images. The response is newline-delimited JSON: one
+    {"index", "name", "prediction", "confidence", "success"} line per image
+    (or {"index", "name", "error", "success": false}), written as each model
+    batch finishes, then {"done": true, "images", "failed"}. Images go through
+    the result cache and the shared micro-batcher; ones shed because its queue
+    is full get an "overloaded" error line, and a request arriving while it is
+    full gets a 503.
+    """
+    files = request.files.getlist('images') + request.files.getlist('image')
+    if not files:
+        return jsonify({"error": "No image files provided", "success": False}), 400
+    try:
+        items = upload_items(files)
+    except UploadError as e:
+        return jsonify({"error": str(e), "success": False}), 400
+    if not items:
+        return jsonify({"error": "No images found in the upload", "success": False}), 400
+    if batcher is not None and batcher.saturated:
+        return jsonify({"error": "Service overloaded, retry shortly", "success": False}), 503
+
+    def generate():
+        index = failed = 0
+        for chunk, batch, errors in decode_chunks(items, max(1, DEFAULT_MAX_BATCH)):
+            results = classify_chunk(chunk, batch, errors)
+            for i, (name, _) in enumerate(chunk):
+                if i in errors:
+                    line = {"index": index, "name": name, "error": errors[i], "success": False}
+                    failed += 1
+                else:
+                    line = {"index": index, "name": name, **detection_result(*results[i])}
+                yield json.dumps(line) + '\n'
+                index += 1
+        yield json.dumps({"done": True, "images": index, "failed": failed}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/pest-detection/stats', methods=['GET'])
+def detection_stats():
+    return jsonify({"batching": batcher.stats() if batcher else None, "cache": cache.stats() if cache else None,
+                    "cascade": cascade.stats() if cascade else None,
+                    "threads": {**threads, "cpus": cpus, "autotune": tuning}})
+
 if __name__ == '__main__':
     app.run(debug=True, port=3000)
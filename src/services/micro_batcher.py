@@ -0,0 +1,110 @@
+import collections
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from admission import Overloaded
+
+DEFAULT_MAX_BATCH = int(os.environ.get('DISEASE_MAX_BATCH', '16'))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get('DISEASE_BATCH_WAIT_MS', '5'))
+DEFAULT_MAX_QUEUE = int(os.environ.get('DISEASE_MAX_QUEUE', '256'))
+DEFAULT_TIMEOUT = float(os.environ.get('DISEASE_BATCH_TIMEOUT', '30'))
+
+
+class MicroBatcher:
+    """Run concurrent single-item calls through ``fn`` together.
+
+    A background thread takes the first waiting item, then keeps collecting
+    until it has ``max_batch`` items or ``max_wait_ms`` has passed since that
+    first item arrived, calls ``fn(items)`` once and hands result ``i`` back to
+    the caller of item ``i``. Items that arrive while a batch is running are
+    already queued when it finishes, so under load batches fill without
+    waiting; an idle service adds at most ``max_wait_ms`` to a lone request.
+    """
+
+    def __init__(self, fn, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 max_queue=DEFAULT_MAX_QUEUE, name='micro-batcher', window=1024):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue(maxsize=max(0, max_queue))
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.errors = 0
+        self._sizes = collections.Counter()
+        self._waits = collections.deque(maxlen=window)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Future for ``fn([..., item, ...])[i]``; raises Overloaded when the queue is full."""
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(f'{self._queue.qsize()} images already queued')
+        return future
+
+    @property
+    def saturated(self):
+        """True while the queue is full, i.e. the next submit would be shed."""
+        return self._queue.full()
+
+    def __call__(self, item, timeout=DEFAULT_TIMEOUT):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.fn([item for item, _, _ in batch])
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self._sizes[len(batch)] += 1
+                self._waits.extend(started - queued for _, _, queued in batch)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            waits = np.array(self._waits) * 1000 if self._waits else np.zeros(1)
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self._sizes.items())},
+                'queue_wait_ms_p50': float(np.percentile(waits, 50)),
+                'queue_wait_ms_p95': float(np.percentile(waits, 95)),
+            }
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Manifest of the saved price models, built once at startup.
+
+Maps every (district_id, commodity_id) to its model path, scaler path, file
+size and architecture signature. The manifest is cached as JSON and reused as
+long as the model and scaler files still have the same mtime and size; only
+changed archives have their config.json re-read.
+
+    python model_manifest.py    # rebuild and print a summary
+"""
+
+import json
+import logging
+import os
+import re
+
+from numpy_lstm import archive_signature
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = re.compile(r'^district_(\d+)_commodity_(\d+)\.keras$')
+SCALER_FILE = re.compile(r'^district_(\d+)_commodity_(\d+)\.joblib$')
+MANIFEST_VERSION = 1
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelManifest:
+    def __init__(self, models_dir, cache_path=None):
+        self.models_dir = models_dir
+        self.models_path = os.path.join(models_dir, 'models')
+        self.scalers_path = os.path.join(models_dir, 'scalers')
+        self.cache_path = cache_path or os.path.join(models_dir, 'manifest.json')
+        self.entries = {}
+        self.missing_scalers = []
+        self.orphan_scalers = []
+        self.rebuilt = 0
+
+    @classmethod
+    def load(cls, models_dir, cache_path=None):
+        manifest = cls(models_dir, cache_path)
+        manifest.refresh()
+        return manifest
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cached.get('version') != MANIFEST_VERSION:
+            return {}
+        return {(e['district_id'], e['commodity_id']): e for e in cached.get('entries', [])}
+
+    def _write_cache(self):
+        payload = {
+            'version': MANIFEST_VERSION,
+            'entries': [self.entries[pair] for pair in sorted(self.entries)],
+            'missing_scalers': [list(pair) for pair in self.missing_scalers],
+        }
+        tmp_path = f'{self.cache_path}.tmp-{os.getpid()}'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("Could not write model manifest cache", extra={'path': self.cache_path, 'error': str(e)})
+
+    def refresh(self):
+        """Scan both directories once, reusing cached entries whose files are unchanged."""
+        cached = self._read_cache()
+        scalers = {}
+        for name in os.listdir(self.scalers_path):
+            match = SCALER_FILE.match(name)
+            if match:
+                scalers[(int(match.group(1)), int(match.group(2)))] = os.path.join(self.scalers_path, name)
+
+        entries, missing, rebuilt = {}, [], 0
+        for name in os.listdir(self.models_path):
+            match = MODEL_FILE.match(name)
+            if not match:
+                continue
+            pair = (int(match.group(1)), int(match.group(2)))
+            scaler_path = scalers.get(pair)
+            if scaler_path is None:
+                missing.append(pair)
+                continue
+            model_path = os.path.join(self.models_path, name)
+            model_mtime, model_size = _stat(model_path)
+            scaler_mtime, scaler_size = _stat(scaler_path)
+            entry = cached.get(pair)
+            if (entry is None or entry['model_mtime_ns'] != model_mtime or entry['model_size'] != model_size
+                    or entry['scaler_mtime_ns'] != scaler_mtime or entry['scaler_size'] != scaler_size
+                    or entry['model_path'] != model_path):
+                try:
+                    signature = archive_signature(model_path)
+                except Exception as e:
+                    logger.error("Unreadable model archive", extra={'path': model_path, 'error': str(e)})
+                    continue
+                rebuilt += 1
+                entry = {
+                    'district_id': pair[0],
+                    'commodity_id': pair[1],
+                    'model_path': model_path,
+                    'scaler_path': scaler_path,
+                    'model_size': model_size,
+                    'model_mtime_ns': model_mtime,
+                    'scaler_size': scaler_size,
+                    'scaler_mtime_ns': scaler_mtime,
+                    'signature': signature,
+                }
+            entries[pair] = entry
+
+        for pair in sorted(missing):
+            logger.warning("Scaler file not found; model will not be served",
+                           extra={'district_id': pair[0], 'commodity_id': pair[1]})
+        self.entries = entries
+        self.missing_scalers = sorted(missing)
+        self.orphan_scalers = sorted(set(scalers) - set(entries) - set(missing))
+        self.rebuilt = rebuilt
+        if rebuilt or set(cached) != set(entries):
+            self._write_cache()
+        return self
+
+    def get(self, district_id, commodity_id):
+        return self.entries.get((district_id, commodity_id))
+
+    def pairs(self):
+        return sorted(self.entries)
+
+    def commodities(self, district_id):
+        return sorted(c for d, c in self.entries if d == district_id)
+
+    def summary(self):
+        signatures = {}
+        for entry in self.entries.values():
+            signatures[entry['signature']] = signatures.get(entry['signature'], 0) + 1
+        return {
+            'models': len(self.entries),
+            'missing_scalers': [list(pair) for pair in self.missing_scalers],
+            'orphan_scalers': [list(pair) for pair in self.orphan_scalers],
+            'total_model_bytes': sum(e['model_size'] for e in self.entries.values()),
+            'signatures': signatures,
+            'rebuilt_entries': self.rebuilt,
+        }
+
+
+if __name__ == '__main__':
+    models_dir = os.environ.get('PRICE_MODELS_DIR',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models'))
+    print(json.dumps(ModelManifest.load(models_dir).summary(), indent=2))
@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget for resident price models (bytes)
+DEFAULT_BUDGET_BYTES = int(float(os.environ.get('PRICE_MODEL_CACHE_MB', '512')) * 1024 * 1024)
+
+
+def parse_pairs(spec):
+    """Parse a "district:commodity,district:commodity" string into id tuples."""
+    pairs = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        district_id, commodity_id = item.split(':')
+        pairs.append((int(district_id), int(commodity_id)))
+    return pairs
+
+
+def entry_nbytes(entry):
+    """Best-effort resident size of a loaded {'model', 'scaler'} entry."""
+    model = entry.get('model')
+    if hasattr(model, 'nbytes'):
+        return int(model.nbytes)
+    if hasattr(model, 'get_weights'):
+        return int(sum(w.nbytes for w in model.get_weights()))
+    return 0
+
+
+class ModelRegistry:
+    """Thread-safe, process-wide cache of (district, commodity) price models.
+
+    Entries are loaded on demand through ``loader(district_id, commodity_id)``,
+    which returns a dict with at least ``model`` and ``scaler`` (or None when the
+    pair has no model). Unpinned entries are evicted least-recently-used first
+    once the resident size exceeds ``budget_bytes``.
+    """
+
+    def __init__(self, loader, budget_bytes=DEFAULT_BUDGET_BYTES, pinned=()):
+        self.loader = loader
+        self.budget_bytes = budget_bytes
+        self.pinned = set(pinned)
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_failures = 0
+        self.resident_bytes = 0
+
+    def get(self, district_id, commodity_id):
+        key = (district_id, commodity_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other pairs stay servable; the
+        # per-key lock makes concurrent misses on the same pair load it once.
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry
+            try:
+                entry = self.loader(district_id, commodity_id)
+            except Exception as e:
+                logger.error("Error loading model", extra={
+                    'district_id': district_id, 'commodity_id': commodity_id, 'error': str(e)})
+                entry = None
+            if entry is None:
+                with self._lock:
+                    self.load_failures += 1
+                return None
+            self._insert(key, entry)
+            return entry
+
+    def _insert(self, key, entry):
+        size = entry_nbytes(entry)
+        with self._lock:
+            if key in self._entries:
+                self.resident_bytes -= self._sizes[key]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.resident_bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        if self.resident_bytes <= self.budget_bytes:
+            return
+        for key in list(self._entries):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            if key in self.pinned or len(self._entries) == 1:
+                continue
+            del self._entries[key]
+            self.resident_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def pin(self, pairs, load=True):
+        """Keep ``pairs`` resident regardless of the budget, optionally loading them now."""
+        pairs = list(pairs)
+        with self._lock:
+            self.pinned.update(pairs)
+        if load:
+            for district_id, commodity_id in pairs:
+                self.get(district_id, commodity_id)
+
+    def unpin(self, pairs):
+        with self._lock:
+            self.pinned.difference_update(pairs)
+            self._evict_locked()
+
+    def invalidate(self, district_id, commodity_id):
+        key = (district_id, commodity_id)
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self.resident_bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.resident_bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'load_failures': self.load_failures,
+                'models': len(self._entries),
+                'pinned': len(self.pinned),
+                'resident_bytes': self.resident_bytes,
+                'budget_bytes': self.budget_bytes,
+            }
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+TensorFlow-free inference for the saved commodity price models.
+
+Every archive under saved_models/models is a Keras 3 ``.keras`` zip holding
+``config.json`` (InputLayer -> Cast(float16) -> LSTM -> Dropout -> LSTM ->
+Dropout -> Dense -> Dense) and ``model.weights.h5``. ``NumpyLSTMModel`` reads
+both directly and runs the forward pass with vectorized NumPy. The models were
+trained under the ``mixed_float16`` policy, so activations are rounded to
+float16 where Keras would hold them in float16.
+
+    python numpy_lstm.py verify    # compare against Keras on every model
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+
+import numpy as np
+
+from rollout import RingBuffer
+
+SKIPPED_LAYERS = ('InputLayer', 'Cast', 'Dropout')
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _linear(x):
+    return x
+
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+
+ACTIVATIONS = {'sigmoid': _sigmoid, 'tanh': np.tanh, 'relu': _relu, 'linear': _linear}
+
+
+def _as_float16(x):
+    return x.astype(np.float16).astype(np.float32)
+
+
+def parse_layers(model_config):
+    """Layer specs for the LSTM/Dense stack described by a functional model config."""
+    specs = []
+    for layer in model_config['layers']:
+        class_name = layer['class_name']
+        config = layer['config']
+        if class_name in SKIPPED_LAYERS:
+            continue
+        if class_name == 'LSTM':
+            if config.get('go_backwards') or config.get('stateful'):
+                raise ValueError(f"Unsupported LSTM options in {config.get('name')}")
+            specs.append({
+                'type': 'lstm',
+                'units': config['units'],
+                'return_sequences': config['return_sequences'],
+                'activation': config['activation'],
+                'recurrent_activation': config['recurrent_activation'],
+            })
+        elif class_name == 'Dense':
+            specs.append({'type': 'dense', 'units': config['units'], 'activation': config['activation']})
+        else:
+            raise ValueError(f"Unsupported layer type: {class_name}")
+    return specs
+
+
+def signature_from_specs(specs):
+    """Compact architecture signature, e.g. 'lstm128s-lstm64-dense32relu-dense1linear'."""
+    return '-'.join(
+        f"lstm{s['units']}{'s' if s['return_sequences'] else ''}" if s['type'] == 'lstm'
+        else f"dense{s['units']}{s['activation']}"
+        for s in specs
+    )
+
+
+def archive_signature(path):
+    """Architecture signature of a ``.keras`` archive without reading its weights."""
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read('config.json'))
+    return signature_from_specs(parse_layers(config['config']))
+
+
+def _layer_groups(layers_group, prefix):
+    names = [name for name in layers_group if re.fullmatch(rf'{prefix}(_\d+)?', name)]
+    return sorted(names, key=lambda name: int(name.rsplit('_', 1)[1]) if name != prefix else 0)
+
+
+def _layer_vars(group):
+    if 'vars' in group and len(group['vars']):
+        return [group['vars'][str(i)][()] for i in range(len(group['vars']))]
+    if 'cell' in group:
+        return _layer_vars(group['cell'])
+    return []
+
+
+def read_archive(path):
+    """Return (layer specs, per-layer weight lists) from a ``.keras`` archive."""
+    import h5py
+
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read('config.json'))
+        weights_bytes = archive.read('model.weights.h5')
+    specs = parse_layers(config['config'])
+    with h5py.File(io.BytesIO(weights_bytes), 'r') as weights_file:
+        layers_group = weights_file['layers']
+        groups = {
+            'lstm': _layer_groups(layers_group, 'lstm'),
+            'dense': _layer_groups(layers_group, 'dense'),
+        }
+        weights = []
+        for spec in specs:
+            name = groups[spec['type']].pop(0)
+            weights.append(_layer_vars(layers_group[name]))
+    return specs, weights
+
+
+class NumpyLSTMModel:
+    """Stacked LSTM + Dense forward pass in NumPy.
+
+    ``predict`` mirrors ``model.predict`` on a ``(batch, timesteps, 1)`` input
+    and ``rollout`` mirrors the autoregressive forecast loop.
+    """
+
+    def __init__(self, specs, weights, float16_rounding=True, dtype=np.float32):
+        self.specs = specs
+        self.dtype = dtype
+        self.round = _as_float16 if float16_rounding else _linear
+        self.layers = []
+        for spec, layer_weights in zip(specs, weights):
+            layer_weights = [np.ascontiguousarray(w, dtype=dtype) for w in layer_weights]
+            if spec['type'] == 'lstm':
+                kernel, recurrent_kernel = layer_weights[:2]
+                bias = layer_weights[2] if len(layer_weights) > 2 else np.zeros(kernel.shape[1], dtype=dtype)
+                self.layers.append((spec, (kernel, recurrent_kernel, bias)))
+            else:
+                kernel = layer_weights[0]
+                bias = layer_weights[1] if len(layer_weights) > 1 else np.zeros(kernel.shape[1], dtype=dtype)
+                self.layers.append((spec, (kernel, bias)))
+
+    @classmethod
+    def from_keras_archive(cls, path, **kwargs):
+        specs, weights = read_archive(path)
+        return cls(specs, weights, **kwargs)
+
+    @classmethod
+    def from_keras(cls, model, **kwargs):
+        """Build from an in-memory Keras model (e.g. one already in the registry)."""
+        specs = parse_layers(model.get_config())
+        weights = [layer.get_weights() for layer in model.layers
+                   if layer.__class__.__name__ in ('LSTM', 'Dense')]
+        return cls(specs, weights, **kwargs)
+
+    @property
+    def nbytes(self):
+        return sum(w.nbytes for _, layer_weights in self.layers for w in layer_weights)
+
+    @property
+    def signature(self):
+        return signature_from_specs(self.specs)
+
+    def _input_projection(self, x):
+        kernel, _, bias = self.layers[0][1]
+        return self.round(x) @ kernel + bias
+
+    def _lstm(self, spec, weights, projected, project=True):
+        kernel, recurrent_kernel, bias = weights
+        if project:
+            projected = projected @ kernel + bias
+        batch, timesteps, _ = projected.shape
+        units = spec['units']
+        activation = ACTIVATIONS[spec['activation']]
+        recurrent_activation = ACTIVATIONS[spec['recurrent_activation']]
+        h = np.zeros((batch, units), dtype=self.dtype)
+        c = np.zeros((batch, units), dtype=self.dtype)
+        outputs = np.empty((batch, timesteps, units), dtype=self.dtype) if spec['return_sequences'] else None
+        for t in range(timesteps):
+            z = projected[:, t] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            g = activation(z[:, 2 * units:3 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = self.round(f * c + i * g)
+            h = self.round(o * activation(c))
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+    def _forward(self, projected):
+        """Forward pass from first-layer input projections of shape (batch, timesteps, 4 * units)."""
+        out = projected
+        for index, (spec, weights) in enumerate(self.layers):
+            if spec['type'] == 'lstm':
+                out = self._lstm(spec, weights, out, project=index > 0)
+            else:
+                kernel, bias = weights
+                out = self.round(ACTIVATIONS[spec['activation']](out @ kernel + bias))
+        return out
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=self.dtype)
+        return self._forward(self._input_projection(x)).astype(np.float16)
+
+    def rollout(self, sequence, horizon):
+        """Autoregressive forecast; the first layer's input projection of each
+        window value is computed once and kept in a ring buffer."""
+        window = np.asarray(sequence, dtype=self.dtype).reshape(-1, 1)
+        projections = RingBuffer(self._input_projection(window), dtype=self.dtype)
+        outputs = np.empty(horizon, dtype=np.float16)
+        next_input = np.empty((1, 1), dtype=self.dtype)
+        for step in range(horizon):
+            pred = self._forward(projections.window()[None])[0, 0]
+            outputs[step] = pred
+            next_input[0, 0] = outputs[step]
+            projections.push(self._input_projection(next_input)[0])
+        return outputs
+
+
+class StackedLSTMModel:
+    """Several same-shaped ``NumpyLSTMModel``s advanced together.
+
+    Weights are stacked along a leading model axis so every layer becomes one
+    batched matmul; ``rollout`` steps all forecasts in lockstep.
+    """
+
+    def __init__(self, models):
+        signatures = {model.signature for model in models}
+        if len(signatures) != 1:
+            raise ValueError(f"Cannot stack models with different architectures: {sorted(signatures)}")
+        first = models[0]
+        self.specs = first.specs
+        self.dtype = first.dtype
+        self.round = first.round
+        self.size = len(models)
+        self.layers = []
+        for index, spec in enumerate(self.specs):
+            stacked = tuple(
+                np.stack([model.layers[index][1][w] for model in models])
+                for w in range(len(first.layers[index][1]))
+            )
+            self.layers.append((spec, stacked))
+
+    def _input_projection(self, x):
+        # x: (timesteps, models) -> (timesteps, models, 4 * units)
+        kernel, _, bias = self.layers[0][1]
+        return self.round(x)[..., None] * kernel[:, 0, :] + bias
+
+    def _lstm(self, spec, weights, projected, project=True):
+        # projected: (timesteps, models, features), time-major
+        kernel, recurrent_kernel, bias = weights
+        if project:
+            projected = np.matmul(projected.transpose(1, 0, 2), kernel).transpose(1, 0, 2) + bias
+        timesteps, models, _ = projected.shape
+        units = spec['units']
+        activation = ACTIVATIONS[spec['activation']]
+        recurrent_activation = ACTIVATIONS[spec['recurrent_activation']]
+        h = np.zeros((models, 1, units), dtype=self.dtype)
+        c = np.zeros((models, units), dtype=self.dtype)
+        outputs = np.empty((timesteps, models, units), dtype=self.dtype) if spec['return_sequences'] else None
+        for t in range(timesteps):
+            z = projected[t] + np.matmul(h, recurrent_kernel)[:, 0]
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            g = activation(z[:, 2 * units:3 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = self.round(f * c + i * g)
+            h = self.round(o * activation(c))[:, None, :]
+            if outputs is not None:
+                outputs[t] = h[:, 0]
+        return outputs if outputs is not None else h[:, 0]
+
+    def _forward(self, projected):
+        out = projected
+        for index, (spec, weights) in enumerate(self.layers):
+            if spec['type'] == 'lstm':
+                out = self._lstm(spec, weights, out, project=index > 0)
+            else:
+                kernel, bias = weights
+                out = self.round(ACTIVATIONS[spec['activation']](np.matmul(out[:, None, :], kernel)[:, 0] + bias))
+        return out
+
+    def rollout(self, sequences, horizon):
+        """Forecast every model from its own window; ``sequences`` is (models, timesteps)."""
+        windows = np.asarray(sequences, dtype=self.dtype).reshape(self.size, -1).T
+        projections = RingBuffer(self._input_projection(windows), dtype=self.dtype)
+        outputs = np.empty((self.size, horizon), dtype=np.float16)
+        for step in range(horizon):
+            outputs[:, step] = self._forward(projections.window())[:, 0]
+            projections.push(self._input_projection(outputs[:, step].astype(self.dtype)[None])[0])
+        return outputs
+
+
+def verify(models_dir, tolerance, samples, horizon):
+    """Compare the NumPy backend with Keras on every bundled model."""
+    from tensorflow.keras.models import load_model
+    from rollout import CompiledRollout
+
+    models_path = os.path.join(models_dir, 'models')
+    rng = np.random.default_rng(0)
+    report = []
+    for model_file in sorted(f for f in os.listdir(models_path) if f.endswith('.keras')):
+        path = os.path.join(models_path, model_file)
+        keras_model = load_model(path)
+        numpy_model = NumpyLSTMModel.from_keras_archive(path)
+        windows = rng.random((samples, 30, 1)).astype(np.float32)
+        predict_diff = np.abs(
+            keras_model.predict(windows, verbose=0).astype(np.float64)
+            - numpy_model.predict(windows).astype(np.float64)
+        ).max()
+        rollout_diff = np.abs(
+            CompiledRollout(keras_model)(windows[:1], horizon).astype(np.float64)
+            - numpy_model.rollout(windows[0], horizon).astype(np.float64)
+        ).max()
+        ok = predict_diff <= tolerance and rollout_diff <= tolerance
+        report.append({
+            'model': model_file,
+            'predict_max_abs_diff': float(predict_diff),
+            'rollout_max_abs_diff': float(rollout_diff),
+            'ok': bool(ok),
+        })
+        print(f"{'OK  ' if ok else 'FAIL'} {model_file}: predict {predict_diff:.2e}, rollout {rollout_diff:.2e}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NumPy backend for the price models.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('verify', help='check numerical equivalence against Keras')
+    check.add_argument('--models-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models'))
+    check.add_argument('--tolerance', type=float, default=1e-2, help='max abs diff in scaled units')
+    check.add_argument('--samples', type=int, default=32)
+    check.add_argument('--horizon', type=int, default=100)
+    check.add_argument('--out', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    report = verify(args.models_dir, args.tolerance, args.samples, args.horizon)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    failed = [r['model'] for r in report if not r['ok']]
+    print(f"{len(report) - len(failed)}/{len(report)} models within tolerance {args.tolerance}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
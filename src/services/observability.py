@@ -0,0 +1,163 @@
+"""
+Logging setup and Prometheus-style metrics for the price service.
+
+Log records carry their fields as ``extra`` and are rendered as
+``key=value`` pairs (or one JSON object per line with PRICE_LOG_FORMAT=json);
+PRICE_LOG_LEVEL gates them (default INFO). Metrics are plain in-process
+histograms and counters rendered in the Prometheus text format; with the
+pre-fork server every worker reports its own.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get('PRICE_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('PRICE_LOG_FORMAT', 'text')
+# Loggers whose DEBUG output is wanted; third-party libraries stay at INFO and above
+SERVICE_LOGGERS = ('pricePredict', 'serve_prices', 'price_store', 'forecast_table', 'model_registry',
+                   'model_manifest', 'scaler_table')
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f'{k}={v}' for k, v in _fields(record).items())
+        return f'{line} {fields}' if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {'ts': round(record.created, 3), 'level': record.levelname, 'logger': record.name,
+                   'msg': record.getMessage()}
+        payload.update(_fields(record))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Install one stderr handler on the root logger (idempotent)."""
+    root = logging.getLogger()
+    if any(getattr(h, '_price_service', False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._price_service = True
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(KeyValueFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root.addHandler(handler)
+    level = logging.getLevelName(level) if isinstance(level, str) else level
+    root.setLevel(max(level, logging.INFO))
+    for name in SERVICE_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labelnames, values)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, count, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    label_text = _label_text(self.labelnames + ('le',), labels + (repr(bound),))
+                    lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+                label_text = _label_text(self.labelnames + ('le',), labels + ('+Inf',))
+                lines.append(f'{self.name}_bucket{label_text} {count}')
+                lines.append(f'{self.name}_sum{_label_text(self.labelnames, labels)} {total}')
+                lines.append(f'{self.name}_count{_label_text(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labelnames, labels)} {value}')
+        return lines
+
+
+def stats_gauges(prefix, stats, help_text):
+    """Gauge lines for every numeric value of a ``stats()`` dictionary."""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f'{prefix}_{key}'
+        lines += [f'# HELP {name} {help_text} ({key})', f'# TYPE {name} gauge', f'{name} {value}']
+    return lines
+
+
+STAGE_SECONDS = Histogram('price_stage_seconds', 'Time spent per prediction stage', ('stage',))
+REQUEST_SECONDS = Histogram('price_request_seconds', 'HTTP request latency', ('endpoint', 'status'))
+REQUESTS = Counter('price_requests_total', 'HTTP requests served', ('endpoint', 'status'))
+
+
+def stage(name):
+    """Context manager timing one stage (data_fetch, model_load, scaling, rollout, serialization, ...)."""
+    return STAGE_SECONDS.time(name)
+
+
+def render(*extra_lines):
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render() + REQUESTS.render()
+    for chunk in extra_lines:
+        lines += chunk
+    return '\n'.join(lines) + '\n'
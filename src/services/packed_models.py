@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Packed, memory-mappable weights for the whole price model fleet.
+
+``convert`` reads every ``.keras`` archive once and writes:
+  models-<stamp>.bin - all weight tensors back to back (64-byte aligned)
+  models.json        - the .bin's name, per-pair layer specs, tensor
+                       offsets/shapes and source fingerprints
+
+Weights are stored as float16 by default, or as int8 with one float32 scale
+per output column (``--dtype int8``); biases stay float32. Both shrink the
+file and the page cache it occupies, not the resident weights: the NumPy
+forward pass multiplies in float32, so loading a float16/int8 model
+dequantizes every kernel into a private float32 copy (what
+``NumpyLSTMModel.nbytes`` and the registry budget count). Only
+``--dtype float32`` models are served straight from views of the shared
+memory map. Upcasting per matmul instead would repeat the conversion for the
+recurrent kernel at every timestep of every forecast step.
+
+    python packed_models.py convert --dtype float16
+    python packed_models.py report --samples 16    # forecast error vs the .keras originals
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from model_manifest import ModelManifest
+from numpy_lstm import NumpyLSTMModel, read_archive
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PACKED_DIR = os.path.join(SERVICES_DIR, 'saved_models', 'packed')
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+ALIGNMENT = 64
+
+
+def quantize_int8(weights):
+    """Symmetric per-output-column int8 quantization of a 2-D kernel."""
+    scale = np.abs(weights).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.clip(np.rint(weights / scale), -127, 127).astype(np.int8)
+    return quantized, scale.astype(np.float32)
+
+
+class _Writer:
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+
+    def write(self, array):
+        padding = (-self.offset) % ALIGNMENT
+        if padding:
+            self.f.write(b'\0' * padding)
+            self.offset += padding
+        array = np.ascontiguousarray(array)
+        record = {'offset': self.offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+        self.f.write(array.tobytes())
+        self.offset += array.nbytes
+        return record
+
+
+def convert(models_dir, out_dir, storage='float16'):
+    if storage not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype: {storage}")
+    manifest = ModelManifest.load(models_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    # A new .bin per conversion: models.json names it, so replacing models.json
+    # switches readers to the new weights in one step
+    data_file = f'models-{time.time_ns()}.bin'
+    bin_path = os.path.join(out_dir, data_file)
+    tmp_bin = f'{bin_path}.tmp-{os.getpid()}'
+    index = {'storage': storage, 'alignment': ALIGNMENT, 'data': data_file, 'models': {}}
+    with open(tmp_bin, 'wb') as f:
+        writer = _Writer(f)
+        for district_id, commodity_id in manifest.pairs():
+            entry = manifest.get(district_id, commodity_id)
+            specs, weights = read_archive(entry['model_path'])
+            layers = []
+            for spec, layer_weights in zip(specs, weights):
+                tensors = []
+                for tensor in layer_weights:
+                    tensor = np.asarray(tensor, dtype=np.float32)
+                    if tensor.ndim == 2 and storage == 'int8':
+                        quantized, scale = quantize_int8(tensor)
+                        record = writer.write(quantized)
+                        record['scale'] = writer.write(scale)
+                    elif tensor.ndim == 2 and storage == 'float16':
+                        record = writer.write(tensor.astype(np.float16))
+                    else:
+                        record = writer.write(tensor)
+                    tensors.append(record)
+                layers.append(tensors)
+            index['models'][f'{district_id}:{commodity_id}'] = {
+                'specs': specs,
+                'layers': layers,
+                'source_mtime_ns': entry['model_mtime_ns'],
+                'source_size': entry['model_size'],
+            }
+        index['bytes'] = writer.offset
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_bin, bin_path)
+    index_path = os.path.join(out_dir, 'models.json')
+    tmp_index = f'{index_path}.tmp-{os.getpid()}'
+    with open(tmp_index, 'w') as f:
+        json.dump(index, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_index, index_path)
+    # Processes that already mapped an older file keep it until they reopen the store
+    for name in os.listdir(out_dir):
+        if name.startswith('models') and name.endswith('.bin') and name != data_file:
+            os.remove(os.path.join(out_dir, name))
+    return index
+
+
+class PackedModelStore:
+    """Memory-maps the packed weights once and builds NumPy models from slices of them.
+
+    float32 models reference the map directly; float16/int8 models get their
+    own dequantized float32 copy on ``load``.
+    """
+
+    def __init__(self, packed_dir=DEFAULT_PACKED_DIR):
+        self.packed_dir = packed_dir
+        with open(os.path.join(packed_dir, 'models.json')) as f:
+            self.index = json.load(f)
+        self.storage = self.index['storage']
+        data_file = self.index.get('data', 'models.bin')
+        self.data = np.memmap(os.path.join(packed_dir, data_file), dtype=np.uint8, mode='r')
+
+    @classmethod
+    def open_if_present(cls, packed_dir=DEFAULT_PACKED_DIR):
+        if not os.path.exists(os.path.join(packed_dir, 'models.json')):
+            return None
+        return cls(packed_dir)
+
+    def _tensor(self, record):
+        dtype = np.dtype(record['dtype'])
+        count = int(np.prod(record['shape'])) if record['shape'] else 1
+        start = record['offset']
+        array = self.data[start:start + count * dtype.itemsize].view(dtype).reshape(record['shape'])
+        if 'scale' in record:
+            return array.astype(np.float32) * self._tensor(record['scale'])
+        return array
+
+    def __contains__(self, pair):
+        return f'{pair[0]}:{pair[1]}' in self.index['models']
+
+    def is_current(self, district_id, commodity_id, source_mtime_ns, source_size):
+        model = self.index['models'].get(f'{district_id}:{commodity_id}')
+        return bool(model) and model['source_mtime_ns'] == source_mtime_ns and model['source_size'] == source_size
+
+    def load(self, district_id, commodity_id, **kwargs):
+        model = self.index['models'].get(f'{district_id}:{commodity_id}')
+        if model is None:
+            return None
+        weights = [[self._tensor(record) for record in layer] for layer in model['layers']]
+        return NumpyLSTMModel(model['specs'], weights, **kwargs)
+
+
+def report(models_dir, packed_dir, samples, horizon):
+    """Forecast error of the packed models against the original archives."""
+    import joblib
+
+    manifest = ModelManifest.load(models_dir)
+    store = PackedModelStore(packed_dir)
+    rng = np.random.default_rng(0)
+    rows = []
+    for district_id, commodity_id in manifest.pairs():
+        entry = manifest.get(district_id, commodity_id)
+        original = NumpyLSTMModel.from_keras_archive(entry['model_path'])
+        started = time.perf_counter()
+        packed = store.load(district_id, commodity_id)
+        load_us = (time.perf_counter() - started) * 1e6
+        scaler = joblib.load(entry['scaler_path'])
+        windows = rng.random((samples, 30)).astype(np.float32)
+        scaled_errors, price_errors = [], []
+        for window in windows:
+            a = original.rollout(window, horizon).reshape(-1, 1)
+            b = packed.rollout(window, horizon).reshape(-1, 1)
+            scaled_errors.append(np.abs(a.astype(np.float64) - b).max())
+            price_errors.append(np.abs(scaler.inverse_transform(a.astype(np.float64))
+                                       - scaler.inverse_transform(b.astype(np.float64))).max())
+        rows.append({
+            'district_id': district_id,
+            'commodity_id': commodity_id,
+            'load_us': round(load_us, 1),
+            'max_abs_error_scaled': float(np.max(scaled_errors)),
+            'max_abs_error_price': float(np.max(price_errors)),
+            'mean_abs_error_price': float(np.mean(price_errors)),
+        })
+        print(f"district {district_id}, commodity {commodity_id}: max price error {np.max(price_errors):.2f}")
+    return {
+        'storage': store.storage,
+        'packed_bytes': store.index['bytes'],
+        'original_bytes': manifest.summary()['total_model_bytes'],
+        'horizon': horizon,
+        'samples': samples,
+        'max_abs_error_price': max(r['max_abs_error_price'] for r in rows),
+        'median_load_us': float(np.median([r['load_us'] for r in rows])),
+        'models': rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the price models into one memory-mappable file.')
+    parser.add_argument('--models-dir', default=os.path.join(SERVICES_DIR, 'saved_models'))
+    parser.add_argument('--packed-dir', default=DEFAULT_PACKED_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('convert', help='convert every .keras archive')
+    pack.add_argument('--dtype', default='float16', choices=STORAGE_DTYPES)
+    check = commands.add_parser('report', help='forecast error against the originals')
+    check.add_argument('--samples', type=int, default=8)
+    check.add_argument('--horizon', type=int, default=100)
+    check.add_argument('--out', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        started = time.perf_counter()
+        index = convert(args.models_dir, args.packed_dir, args.dtype)
+        print(f"Packed {len(index['models'])} models ({index['bytes'] / 1e6:.1f} MB, {args.dtype}) "
+              f"into {args.packed_dir} in {time.perf_counter() - started:.1f}s")
+    else:
+        result = report(args.models_dir, args.packed_dir, args.samples, args.horizon)
+        print(f"{result['storage']}: {result['packed_bytes'] / 1e6:.1f} MB vs {result['original_bytes'] / 1e6:.1f} MB, "
+              f"max price error {result['max_abs_error_price']:.2f}, median load {result['median_load_us']:.0f} us")
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
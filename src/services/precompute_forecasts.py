@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Nightly job: materialize the full forecast for every (district, commodity)
+pair that has both a model and a scaler into the forecast table served by
+pricePredict.py.
+
+    python precompute_forecasts.py                # all cores, 100-day horizon
+    python precompute_forecasts.py --workers 4 --horizon 100 --backend numpy
+    python precompute_forecasts.py --dirty-only   # only pairs whose prices or model changed
+
+Rows are only served to a predictor running the same engine as --backend:
+the engine is part of each row's model fingerprint.
+
+Schedule it after the day's prices are ingested, e.g. from cron:
+    30 2 * * * cd /srv/agritech/src/services && python precompute_forecasts.py
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from forecast_table import ForecastTable, write_table
+from model_manifest import ModelManifest
+from price_store import PriceStore
+
+_predictor = None
+
+
+def _init_worker(models_dir, store_dir, backend):
+    global _predictor
+    from price_predictor import CommodityPricePredictor
+
+    _predictor = CommodityPricePredictor(models_dir=models_dir, backend=backend, price_store=PriceStore(store_dir))
+
+
+def _forecast_pair(args):
+    pair, horizon, previous = args
+    started = time.perf_counter()
+    try:
+        key = _predictor.forecast_key(pair[0], pair[1], horizon)
+        if previous is not None and key is not None and (tuple(key[3]), key[4]) == previous:
+            return pair, None, key[3], key[4], time.perf_counter() - started, None
+        prices = _predictor.forecast(pair[0], pair[1], horizon)
+        if key is None or prices is None:
+            return pair, None, None, None, time.perf_counter() - started, 'no model or insufficient history'
+        return pair, prices.reshape(-1), key[3], key[4], time.perf_counter() - started, None
+    except Exception as e:
+        return pair, None, None, None, time.perf_counter() - started, str(e)
+
+
+def _previous_rows(table_path, horizon):
+    """Rows of an existing table with at least ``horizon`` days, keyed by pair."""
+    if not os.path.exists(table_path):
+        return {}
+    table = ForecastTable(table_path, max_age=float('inf'))
+    rows = table.rows()
+    return rows if table.horizon >= horizon else {}
+
+
+def run(models_dir, store_dir, source_file, table_path, horizon, workers, backend, dirty_only=False):
+    started = time.perf_counter()
+    store = PriceStore(store_dir, source_file=source_file)
+    store.refresh()
+    manifest = ModelManifest.load(models_dir)
+    pairs, missing_scalers = manifest.pairs(), manifest.missing_scalers
+    print(f"Precomputing {horizon}-day forecasts for {len(pairs)} pairs on {workers} workers")
+
+    # With dirty_only, rows whose price series and model are unchanged are copied over
+    previous = _previous_rows(table_path, horizon) if dirty_only else {}
+    rows, report, reused = [], [], 0
+    for pair in missing_scalers:
+        report.append({'district_id': pair[0], 'commodity_id': pair[1], 'seconds': 0.0, 'error': 'scaler file not found'})
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(models_dir, store_dir, backend)) as executor:
+        for pair, prices, data_version, fingerprint, seconds, error in executor.map(
+                _forecast_pair, [(pair, horizon, previous[pair][1:] if pair in previous else None) for pair in pairs]):
+            if prices is None and error is None:
+                reused += 1
+                rows.append((pair, previous[pair][0][:horizon], data_version, fingerprint))
+                continue
+            report.append({'district_id': pair[0], 'commodity_id': pair[1], 'seconds': round(seconds, 4), 'error': error})
+            if error:
+                print(f"FAIL district {pair[0]}, commodity {pair[1]}: {error}")
+                continue
+            rows.append((pair, prices, data_version, fingerprint))
+
+    write_table(table_path, horizon, rows, source_meta=store.snapshot().meta)
+    seconds = [r['seconds'] for r in report if not r['error']]
+    summary = {
+        'table': table_path,
+        'horizon': horizon,
+        'workers': workers,
+        'backend': backend,
+        'pairs': len(pairs) + len(missing_scalers),
+        'succeeded': len(rows),
+        'reused': reused,
+        'failed': len(report) + reused - len(rows),
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'pair_seconds_p50': round(float(np.median(seconds)), 4) if seconds else None,
+        'pair_seconds_max': round(float(np.max(seconds)), 4) if seconds else None,
+        'pairs_report': report,
+    }
+    with open(os.path.splitext(table_path)[0] + '_report.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Wrote {len(rows)} forecasts to {table_path} in {summary['total_seconds']}s "
+          f"({reused} unchanged, {summary['failed']} failed)")
+    return summary
+
+
+def main():
+    from price_predictor import FORECAST_TABLE, HISTORICAL_FILE, MODEL_BACKEND, MODELS_DIR, PRICE_STORE_DIR
+
+    parser = argparse.ArgumentParser(description='Precompute forecasts for every model.')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--store', default=PRICE_STORE_DIR)
+    parser.add_argument('--source', default=HISTORICAL_FILE)
+    parser.add_argument('--out', default=FORECAST_TABLE)
+    parser.add_argument('--horizon', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', default=MODEL_BACKEND, choices=('keras', 'numpy', 'packed'))
+    parser.add_argument('--dirty-only', action='store_true',
+                        help='keep rows of the existing table whose prices and model have not changed')
+    args = parser.parse_args()
+
+    run(args.models_dir, args.store, args.source, args.out, args.horizon, args.workers, args.backend,
+        args.dirty_only)
+
+
+if __name__ == '__main__':
+    main()
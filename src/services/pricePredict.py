@@ -1,12 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+import logging
 import os
+import time
+from cpu_threads import AUTOTUNE, apply_affinity, configure_blas
+# BLAS reads its pool size when numpy loads, so the limit (INFERENCE_* settings) goes first
+CPUS = apply_affinity()
+BLAS_THREADS = configure_blas()
 import numpy as np
 from flask_cors import CORS
-import pandas as pd
-import tensorflow as tf
-import joblib
-from tensorflow.keras.models import load_model
-from datetime import datetime, timedelta
+from model_registry import parse_pairs
+from price_store import PriceStore
+from forecast_cache import ForecastCache
+from forecast_table import ForecastTable
+from admission import AdmissionController, Overloaded
+from observability import REQUEST_SECONDS, REQUESTS, configure_logging, render as render_metrics, stage, stats_gauges
+from responses import FORMATS, dumps, forecast_payload
+# The predictor and its settings live in price_predictor.py (importable without
+# starting the service); re-exported here for existing imports
+from price_predictor import (  # noqa: F401
+    BATCH_STACK_SIZE, FORECAST_CACHE_DIR, FORECAST_TABLE, HISTORICAL_FILE, MODEL_BACKEND, MODELS_DIR,
+    PRICE_STORE_DIR, CommodityPricePredictor, warm_pairs_from_env,
+)
+
+configure_logging()
+logger = logging.getLogger('pricePredict')
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -41,143 +58,274 @@ COMMODITY_ID_TO_NAME = {2: 'Paddy(Dhan)(Common)',4: 'Maize',5: 'Jowar(Sorghum)',
 
 COMMODITY_NAME_TO_ID = {v: k for k, v in COMMODITY_ID_TO_NAME.items()}
 
-class CommodityPricePredictor:
-    def __init__(self, models_dir='/Users/tuhinaagarwal/Desktop/agritech/src/services/saved_models', sequence_length=30):
-        self.models_dir = models_dir
-        self.models_path = os.path.join(models_dir, 'models')
-        self.scalers_path = os.path.join(models_dir, 'scalers')
-        self.sequence_length = sequence_length
-        self.loaded_models = {}
-
-        # Configure GPU memory growth
-        gpus = tf.config.experimental.list_physical_devices('GPU')
-        if gpus:
-            try:
-                for gpu in gpus:
-                    tf.config.experimental.set_memory_growth(gpu, True)
-            except RuntimeError as e:
-                print(f"GPU configuration error: {e}")
-
-    def load_district_models(self, district_id):
-        print(f"Loading models for district: {district_id}")
-        district_models = {}
-        model_files = [f for f in os.listdir(self.models_path) if f.startswith(f'district_{district_id}_')]
-        print(f"Model files found: {model_files}")
-        for model_file in model_files:
-            try:
-                commodity_id = int(model_file.split('_')[-1].split('.')[0])
-                model_path = os.path.join(self.models_path, model_file)
-                scaler_path = os.path.join(self.scalers_path, f'district_{district_id}_commodity_{commodity_id}.joblib')
-                if not os.path.exists(scaler_path):
-                    print(f"Scaler file not found: {scaler_path}")
-                    continue
-                model = load_model(model_path)
-                scaler = joblib.load(scaler_path)
-                district_models[commodity_id] = {'model': model, 'scaler': scaler}
-            except Exception as e:
-                print(f"Error loading model for Commodity {commodity_id}: {str(e)}")
-        return district_models
-
-    def prepare_sequence(self, historical_prices, scaler):
-        print("Preparing sequence for prediction.")
-        if len(historical_prices) < self.sequence_length:
-            raise ValueError(f"Need at least {self.sequence_length} historical prices")
-        scaled_prices = scaler.transform(historical_prices.reshape(-1, 1))
-        sequence = scaled_prices[-self.sequence_length:]
-        return sequence.reshape(1, self.sequence_length, 1)
-
-    def predict_future_prices(self, district_id, commodity_id, historical_data, future_days=30):
-        print(f"Predicting future prices for district {district_id}, commodity {commodity_id} for {future_days} days.")
-        if district_id not in self.loaded_models:
-            print(f"Loading models for district {district_id}")
-            self.loaded_models[district_id] = self.load_district_models(district_id)
-        if not self.loaded_models[district_id]:
-            print("No models loaded for district.")
-            return None
-
-        model_data = self.loaded_models[district_id].get(commodity_id)
-        if not model_data:
-            print(f"Model not found for district {district_id} and commodity {commodity_id}")
-            return jsonify({'error': f'Model for district {district_id} and commodity {commodity_id} not found'}), 404
-
-        commodity_history = historical_data[
-            (historical_data['district_id'] == district_id) &
-            (historical_data['commodity_id'] == commodity_id)
-        ]['modal_price'].values
-
-        print(f"Commodity history length: {len(commodity_history)}")
-        if len(commodity_history) < self.sequence_length:
-            print(f"Insufficient data for commodity {commodity_id}. Need at least {self.sequence_length} prices.")
-            return None
-
-        sequence = self.prepare_sequence(commodity_history, model_data['scaler'])
-        future_predictions = []
-        current_sequence = sequence.copy()
-        for _ in range(future_days):
-            next_pred = model_data['model'].predict(current_sequence, verbose=0)
-            future_predictions.append(next_pred[0, 0])
-            current_sequence = np.roll(current_sequence, -1, axis=1)
-            current_sequence[0, -1, 0] = next_pred[0, 0]
-        future_predictions = np.array(future_predictions).reshape(-1, 1)
-        future_predictions = model_data['scaler'].inverse_transform(future_predictions)
-
-        return [({
-            'predicted_date': (datetime.now() + timedelta(days=i + 1)).strftime('%Y-%m-%d'),
-            'predicted_price': price[0]
-        }) for i, price in enumerate(future_predictions)]
+# One predictor per process so loaded models survive across requests
+predictor = CommodityPricePredictor(
+    pinned=parse_pairs(os.environ.get('PRICE_MODEL_PINNED')),
+    price_store=PriceStore(PRICE_STORE_DIR, source_file=HISTORICAL_FILE),
+    forecast_cache=ForecastCache(disk_dir=FORECAST_CACHE_DIR),
+    forecast_table=ForecastTable(FORECAST_TABLE),
+    admission=AdmissionController(),
+    coalesce=True,
+    threads={'blas': BLAS_THREADS},
+)
+if os.environ.get('PRICE_WARM_PAIRS'):
+    predictor.warm_up(set(warm_pairs_from_env(predictor.manifest)) | predictor.registry.pinned)
+thread_tuning = predictor.autotune_threads() if AUTOTUNE else None
+
+
+def response_format(data):
+    """'rows' (default) or 'columnar', from the body's "format" or ?format=."""
+    fmt = (data or {}).get('format') or request.args.get('format') or 'rows'
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, str(response.status_code))
+        REQUESTS.inc(endpoint, str(response.status_code))
+    return response
 
 
 # Flask routes
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not predictor.ready.is_set():
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready', 'models': predictor.manifest.summary()['models']})
+
+
+@app.route('/models/stats', methods=['GET'])
+def model_stats():
+    return jsonify(predictor.registry.stats())
+
+
+@app.route('/forecasts/stats', methods=['GET'])
+def forecast_stats():
+    return jsonify({'cache': predictor.forecast_cache.stats(), 'table': predictor.forecast_table.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    store = predictor.price_store
+    text = render_metrics(
+        stats_gauges('price_model_cache', predictor.registry.stats(), 'Model registry'),
+        stats_gauges('price_forecast_cache', predictor.forecast_cache.stats(), 'Forecast cache'),
+        stats_gauges('price_forecast_table', predictor.forecast_table.stats(), 'Precomputed forecast table'),
+        stats_gauges('price_admission', predictor.admission.stats(), 'Admission control'),
+        stats_gauges('price_coalescing', predictor.coalescer.stats(), 'Request coalescing'),
+        stats_gauges('price_store', {'reloads': store.reloads, 'appended_rows': store.appended_rows}, 'Price store'),
+        stats_gauges('price_threads', {**predictor.threads, 'cpus': len(CPUS)}, 'Inference thread pools'),
+    )
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/threads/stats', methods=['GET'])
+def thread_stats():
+    return jsonify({**predictor.threads, 'cpus': CPUS, 'autotune': thread_tuning})
+
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    return jsonify({'admission': predictor.admission.stats(), 'coalescing': predictor.coalescer.stats()})
+
+
+def overloaded_response():
+    response = jsonify({'error': 'Service overloaded, retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
         data = request.json
-        print(f"Received data: {data}")
+        logger.debug("Received prediction request", extra={'body': data})
         district_name = data.get('region')
         crop_name = data.get('crop')
+        try:
+            fmt = response_format(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         if district_name not in DISTRICT_NAME_TO_ID or crop_name not in COMMODITY_NAME_TO_ID:
-            print(f"Invalid district or crop name. Received: {district_name}, {crop_name}")
+            logger.info("Invalid district or crop name", extra={'region': district_name, 'crop': crop_name})
             return jsonify({'error': 'Invalid district or crop name'}), 400
 
         district_id = DISTRICT_NAME_TO_ID[district_name]
         commodity_id = COMMODITY_NAME_TO_ID[crop_name]
 
-        # Load historical data
-        historical_file = '/Users/tuhinaagarwal/Desktop/agritech/src/services/historical_data.csv'  # Update this path as needed
-        if not os.path.exists(historical_file):
-            print(f"Historical data file not found: {historical_file}")
+        # Historical prices come from the memory-mapped store, which re-ingests
+        # the CSV on its own when the file changes
+        if not predictor.price_store.available():
+            logger.error("Historical data file not found", extra={'path': HISTORICAL_FILE})
             return jsonify({'error': 'Historical data not found'}), 500
 
-        historical_data = pd.read_csv(historical_file, low_memory=False)
-        print(f"Historical data loaded. Number of records: {len(historical_data)}")
-
         # Predict
-        predictor = CommodityPricePredictor(models_dir='/Users/tuhinaagarwal/Desktop/agritech/src/services/saved_models')
-        print(f"Predicting for district {district_id}, commodity {commodity_id}")
-        predictions = predictor.predict_future_prices(
-            district_id=district_id,
-            commodity_id=commodity_id,
-            historical_data=historical_data,
+        predictions = predictor.forecast(district_id, commodity_id, future_days=100)
+        if predictions is None:
+            logger.warning("No predictions generated", extra={'district_id': district_id, 'commodity_id': commodity_id})
+            return jsonify({'error': 'Could not generate predictions'}), 500
+
+        with stage('serialization'):
+            return json_response(forecast_payload(district_name, crop_name, predictions, fmt))
+    except Overloaded as e:
+        logger.warning("Shedding request", extra={'reason': str(e)})
+        return overloaded_response()
+    except Exception as e:
+        logger.exception("Request failed")
+        return jsonify({'error': str(e)}), 500
+
+
+def batch_items(data):
+    """(region, crop) names requested by a /predict/batch body; raises ValueError if it is malformed."""
+    if 'items' in data:
+        items = data['items']
+        if not isinstance(items, list) or not all(
+                isinstance(item, dict) and isinstance(item.get('region'), str) and isinstance(item.get('crop'), str)
+                for item in items):
+            raise ValueError('"items" must be a list of {"region": str, "crop": str} objects')
+        return [(item['region'], item['crop']) for item in items]
+    district_name = data.get('region')
+    if not isinstance(district_name, str) or district_name not in DISTRICT_NAME_TO_ID:
+        raise ValueError('Invalid district name')
+    crops = data.get('crops')
+    if crops is None:
+        crops = [COMMODITY_ID_TO_NAME[c] for c in predictor.available_commodities(DISTRICT_NAME_TO_ID[district_name])
+                 if c in COMMODITY_ID_TO_NAME]
+    elif not isinstance(crops, list) or not all(isinstance(crop, str) for crop in crops):
+        raise ValueError('"crops" must be a list of crop names')
+    return [(district_name, crop_name) for crop_name in crops]
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Forecast several crops in one call.
+
+    Body: {"region": "Salem", "crops": [...]} (all crops with a model in the
+    region when "crops" is omitted), or {"items": [{"region", "crop"}, ...]}.
+    "format": "columnar" (or ?format=columnar) returns dates and prices as
+    parallel arrays instead of per-day objects.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        try:
+            fmt = response_format(data)
+            items = batch_items(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not predictor.price_store.available():
+            logger.error("Historical data file not found", extra={'path': HISTORICAL_FILE})
+            return jsonify({'error': 'Historical data not found'}), 500
+
+        valid = [(d, c) for d, c in items if d in DISTRICT_NAME_TO_ID and c in COMMODITY_NAME_TO_ID]
+        forecasts = predictor.predict_many(
+            [(DISTRICT_NAME_TO_ID[d], COMMODITY_NAME_TO_ID[c]) for d, c in valid],
             future_days=100
         )
-        print(f"Predictions: {predictions}")
-        pp = []
-        for prediction in predictions:
-    # Convert predicted_price to float if necessary (assuming it's already a float)
-            predicted_price = int(prediction['predicted_price'])
-            prediction['predicted_price'] = predicted_price
-            pp.append(predicted_price)
-            print(f"Date: {prediction['predicted_date']}, Price: {predicted_price}")
-        if not predictions:
-            print("No predictions generated.")
-            return jsonify({'error': 'Could not generate predictions'}), 500
 
-        return jsonify({'region': district_name, 'crop': crop_name, 'predictions': predictions,'prices':pp})
+        results = []
+        for district_name, crop_name in items:
+            if district_name not in DISTRICT_NAME_TO_ID or crop_name not in COMMODITY_NAME_TO_ID:
+                results.append({'region': district_name, 'crop': crop_name, 'error': 'Invalid district or crop name'})
+                continue
+            predictions = forecasts.get((DISTRICT_NAME_TO_ID[district_name], COMMODITY_NAME_TO_ID[crop_name]))
+            if predictions is None:
+                results.append({'region': district_name, 'crop': crop_name, 'error': 'Could not generate predictions'})
+                continue
+            with stage('serialization'):
+                results.append(forecast_payload(district_name, crop_name, predictions, fmt))
+        with stage('serialization'):
+            return json_response({'results': results})
+    except Overloaded as e:
+        logger.warning("Shedding request", extra={'reason': str(e)})
+        return overloaded_response()
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Request failed")
         return jsonify({'error': str(e)}), 500
 
 
+
+def _record_id(value, field):
+    """A district or commodity id from JSON: an integer, or an integral float or string."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value < 2 ** 31:
+        raise ValueError(f'{field} must be a non-negative integer')
+    return value
+
+
+def ingest_row(row):
+    """Journal record for one /prices/ingest row; raises ValueError if it is unusable."""
+    if not isinstance(row, dict):
+        raise ValueError('each row must be an object')
+    district_id = row.get('district_id', DISTRICT_NAME_TO_ID.get(row.get('region')))
+    commodity_id = row.get('commodity_id', COMMODITY_NAME_TO_ID.get(row.get('crop')))
+    if district_id is None or commodity_id is None:
+        raise ValueError('unknown district or crop')
+    district_id = _record_id(district_id, 'district_id')
+    commodity_id = _record_id(commodity_id, 'commodity_id')
+    try:
+        day = int(np.datetime64(str(row['date']), 'D').astype(np.int64))
+        price = float(row['modal_price'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('date (YYYY-MM-DD) and numeric modal_price are required')
+    if not np.isfinite(price) or price <= 0:
+        raise ValueError('modal_price must be positive')
+    return (district_id, commodity_id, day, price)
+
+
+@app.route('/prices/ingest', methods=['POST'])
+def ingest_prices():
+    """Append new daily prices.
+
+    Body: {"rows": [{"region" or "district_id", "crop" or "commodity_id", "date", "modal_price"}, ...]}.
+    Only forecasts of the pairs whose series changed are invalidated.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('rows', []), list):
+        return jsonify({'error': 'Body must be a JSON object with a "rows" list'}), 400
+    try:
+        records, rejected = [], []
+        for i, row in enumerate(data.get('rows', [])):
+            try:
+                records.append(ingest_row(row))
+            except ValueError as e:
+                rejected.append({'row': i, 'error': str(e)})
+        result = predictor.price_store.append(records) if records else {
+            'received': 0, 'appended': 0, 'corrected': 0, 'duplicates': 0, 'changed_pairs': []}
+        logger.info("Ingested prices", extra={'appended': result['appended'], 'corrected': result['corrected'],
+                                              'changed_pairs': len(result['changed_pairs'])})
+        result['received'] += len(rejected)
+        result['rejected'] = rejected
+        result['changed_pairs'] = [{'district_id': d, 'commodity_id': c} for d, c in result['changed_pairs']]
+        return jsonify(result)
+    except Exception as e:
+        logger.exception("Request failed")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(port=1234, debug=True)
@@ -0,0 +1,429 @@
+"""
+CommodityPricePredictor and its configuration, without the Flask app.
+
+Importing this module only reads settings from the environment; pricePredict.py
+builds the service's single predictor from it, and tools such as
+precompute_forecasts.py construct their own without starting the web service.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from admission import SingleFlight
+from cpu_threads import autotune, configure_blas, configure_tensorflow
+from model_manifest import ModelManifest
+from model_registry import DEFAULT_BUDGET_BYTES, ModelRegistry, parse_pairs
+from numpy_lstm import NumpyLSTMModel, StackedLSTMModel
+from observability import stage
+from packed_models import PackedModelStore
+from responses import forecast_dates
+from rollout import CompiledRollout, rollout
+from scaler_table import ScalerTable, inverse_transform_many, load_scaler, transform_many
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.environ.get('PRICE_MODELS_DIR', os.path.join(SERVICES_DIR, 'saved_models'))
+HISTORICAL_FILE = os.environ.get('PRICE_HISTORICAL_FILE', os.path.join(SERVICES_DIR, 'historical_data.csv'))
+# Cached manifest of model/scaler paths; defaults to saved_models/manifest.json
+MODEL_MANIFEST = os.environ.get('PRICE_MODEL_MANIFEST')
+# Parameters of every scaler in one array table; defaults to saved_models/scalers.npz
+SCALER_TABLE = os.environ.get('PRICE_SCALER_TABLE')
+# 'keras' runs the saved models through TensorFlow; 'numpy' reads the same
+# archives into the TensorFlow-free backend in numpy_lstm.py; 'packed' maps
+# the file written by packed_models.py convert and falls back to the archives
+MODEL_BACKEND = os.environ.get('PRICE_MODEL_BACKEND', 'keras')
+PACKED_MODELS_DIR = os.environ.get('PRICE_PACKED_MODELS_DIR', os.path.join(MODELS_DIR, 'packed'))
+# Models rolled out in lockstep by predict_many; gains flatten past ~32
+# (108 bundled pairs: 16 -> 2.5x, 64 -> 2.7-2.8x over serial forecasts)
+BATCH_STACK_SIZE = int(os.environ.get('PRICE_BATCH_STACK_SIZE', '64'))
+PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR', os.path.join(SERVICES_DIR, 'historical_store'))
+# Optional on-disk tier for cached forecasts
+FORECAST_CACHE_DIR = os.environ.get('PRICE_FORECAST_CACHE_DIR')
+# Table written by precompute_forecasts.py
+FORECAST_TABLE = os.environ.get('PRICE_FORECAST_TABLE', os.path.join(SERVICES_DIR, 'forecast_table', 'forecasts.npz'))
+
+# Same logger name as before the split, so log filters keep matching
+logger = logging.getLogger('pricePredict')
+
+
+class CommodityPricePredictor:
+    def __init__(self, models_dir=MODELS_DIR, sequence_length=30, registry=None,
+                 budget_bytes=DEFAULT_BUDGET_BYTES, pinned=(), price_store=None, backend=MODEL_BACKEND,
+                 forecast_cache=None, forecast_table=None, manifest=None, packed_models=None,
+                 scaler_table=None, admission=None, coalesce=False, threads=None):
+        if backend not in ('keras', 'numpy', 'packed'):
+            raise ValueError(f"Unknown model backend: {backend}")
+        self.models_dir = models_dir
+        self.models_path = os.path.join(models_dir, 'models')
+        self.scalers_path = os.path.join(models_dir, 'scalers')
+        self.sequence_length = sequence_length
+        self.backend = backend
+        # Built once (or read from its on-disk cache) instead of scanning the
+        # model directory per district
+        self.manifest = manifest if manifest is not None else ModelManifest.load(models_dir, MODEL_MANIFEST)
+        # Replaces unpickling one scikit-learn scaler per model load
+        self.scalers = scaler_table if scaler_table is not None else ScalerTable.load(self.manifest, SCALER_TABLE)
+        self.packed_models = packed_models
+        if backend == 'packed' and packed_models is None:
+            self.packed_models = PackedModelStore.open_if_present(PACKED_MODELS_DIR)
+            if self.packed_models is None:
+                logger.warning("No packed models found; reading the .keras archives instead",
+                               extra={'packed_dir': PACKED_MODELS_DIR})
+        self.ready = threading.Event()
+        self.ready.set()
+        self._warming = 0
+        self._warming_lock = threading.Lock()
+        self._warm_threads = []
+        self.price_store = price_store
+        self.forecast_cache = forecast_cache
+        self.forecast_table = forecast_table
+        # Bounds concurrent forecast computations (cache hits bypass it); identical
+        # concurrent requests share one computation when coalescing is on
+        self.admission = admission
+        self.coalescer = SingleFlight() if coalesce else None
+        if price_store is not None and forecast_cache is not None:
+            # New rows for a pair drop its cached forecasts
+            price_store.add_listener(forecast_cache.invalidate_pairs)
+        # Thread pool sizes in effect, reported by /threads/stats
+        self.threads = dict(threads or {})
+        if backend == 'keras':
+            self.threads.update(configure_tensorflow())
+            self.configure_gpus()
+        # Shared LRU cache of (district, commodity) -> {'model', 'scaler'}; compared
+        # with None because an empty registry is falsy
+        if registry is None:
+            registry = ModelRegistry(self.load_model_pair, budget_bytes=budget_bytes)
+        self.registry = registry
+        if pinned:
+            self.registry.pin(pinned, load=False)
+            self.warm_up(pinned)
+
+    def configure_gpus(self):
+        import tensorflow as tf
+
+        # Configure GPU memory growth
+        gpus = tf.config.experimental.list_physical_devices('GPU')
+        if gpus:
+            try:
+                for gpu in gpus:
+                    tf.config.experimental.set_memory_growth(gpu, True)
+            except RuntimeError as e:
+                logger.error("GPU configuration error", extra={'error': str(e)})
+
+    def model_path(self, district_id, commodity_id):
+        entry = self.manifest.get(district_id, commodity_id)
+        return entry['model_path'] if entry else None
+
+    def model_fingerprint(self, district_id, commodity_id):
+        model_path = self.model_path(district_id, commodity_id)
+        if model_path is None:
+            return None
+        try:
+            stat = os.stat(model_path)
+        except FileNotFoundError:
+            return None
+        # Each engine forecasts slightly differently (the numpy port, and even
+        # more so reduced-precision packed weights), so cached and precomputed
+        # results are kept apart per engine, not just per model file
+        if self.is_packed(district_id, commodity_id, stat):
+            engine = f'packed-{self.packed_models.storage}'
+        else:
+            engine = 'keras' if self.backend == 'keras' else 'numpy'
+        return f'{stat.st_mtime_ns}:{stat.st_size}:{engine}'
+
+    def is_packed(self, district_id, commodity_id, stat):
+        return (self.backend == 'packed' and self.packed_models is not None
+                and self.packed_models.is_current(district_id, commodity_id, stat.st_mtime_ns, stat.st_size))
+
+    def get_model(self, district_id, commodity_id, fingerprint=None):
+        """Registry entry for a pair, reloading it if the model file has changed."""
+        model_data = self.registry.get(district_id, commodity_id)
+        if model_data and fingerprint and model_data.get('fingerprint') != fingerprint:
+            self.registry.invalidate(district_id, commodity_id)
+            model_data = self.registry.get(district_id, commodity_id)
+        return model_data
+
+    def forecast_key(self, district_id, commodity_id, future_days):
+        if self.price_store is None:
+            return None
+        data_version = self.price_store.data_version(district_id, commodity_id)
+        fingerprint = self.model_fingerprint(district_id, commodity_id)
+        if data_version is None or fingerprint is None:
+            return None
+        return (district_id, commodity_id, future_days, data_version, fingerprint)
+
+    def load_model_pair(self, district_id, commodity_id):
+        with stage('model_load'):
+            return self._load_model_pair(district_id, commodity_id)
+
+    def _load_model_pair(self, district_id, commodity_id):
+        entry = self.manifest.get(district_id, commodity_id)
+        if entry is None:
+            return None
+        model_path, scaler_path = entry['model_path'], entry['scaler_path']
+        logger.info("Loading model", extra={'backend': self.backend, 'district_id': district_id,
+                                             'commodity_id': commodity_id})
+        fingerprint = self.model_fingerprint(district_id, commodity_id)
+        scaler = self.scalers.get(district_id, commodity_id) or load_scaler(scaler_path)
+        if self.backend == 'packed' and fingerprint and 'packed-' in fingerprint:
+            return {'model': self.packed_models.load(district_id, commodity_id), 'scaler': scaler,
+                    'fingerprint': fingerprint}
+        if self.backend in ('numpy', 'packed'):
+            return {'model': NumpyLSTMModel.from_keras_archive(model_path), 'scaler': scaler,
+                    'fingerprint': fingerprint}
+        from tensorflow.keras.models import load_model
+        model = load_model(model_path)
+        return {'model': model, 'scaler': scaler, 'rollout': CompiledRollout(model), 'fingerprint': fingerprint}
+
+    def load_district_models(self, district_id):
+        logger.debug("Loading district models", extra={'district_id': district_id})
+        district_models = {}
+        for commodity_id in self.manifest.commodities(district_id):
+            model_data = self.registry.get(district_id, commodity_id)
+            if model_data:
+                district_models[commodity_id] = model_data
+        return district_models
+
+    def prepare_sequence(self, historical_prices, scaler):
+        if len(historical_prices) < self.sequence_length:
+            raise ValueError(f"Need at least {self.sequence_length} historical prices")
+        scaled_prices = scaler.transform(historical_prices.reshape(-1, 1))
+        sequence = scaled_prices[-self.sequence_length:]
+        return sequence.reshape(1, self.sequence_length, 1)
+
+    def get_price_history(self, district_id, commodity_id, historical_data=None):
+        # Only the last sequence_length prices feed the model, so the store
+        # hands back just that tail instead of filtering the whole dataset
+        if historical_data is None:
+            return self.price_store.get_recent(district_id, commodity_id, self.sequence_length)
+        return historical_data[
+            (historical_data['district_id'] == district_id) &
+            (historical_data['commodity_id'] == commodity_id)
+        ]['modal_price'].values
+
+    def lookup_forecast(self, key):
+        """Cached or precomputed forecast for a forecast_key, or None."""
+        if key is None:
+            return None
+        with stage('cache_lookup'):
+            return self._lookup_forecast(key)
+
+    def _lookup_forecast(self, key):
+        if self.forecast_cache is not None:
+            cached = self.forecast_cache.get(key)
+            if cached is not None:
+                return cached
+        if self.forecast_table is not None:
+            precomputed = self.forecast_table.lookup(key)
+            if precomputed is not None:
+                if self.forecast_cache is not None:
+                    self.forecast_cache.put(key, precomputed)
+                return precomputed
+        return None
+
+    def forecast(self, district_id, commodity_id, future_days=30, historical_data=None):
+        """Inverse-transformed forecast of shape (future_days, 1), or None."""
+        key = self.forecast_key(district_id, commodity_id, future_days) if historical_data is None else None
+        known = self.lookup_forecast(key)
+        if known is not None:
+            return known
+        if key is None or self.coalescer is None:
+            return self.compute_forecast(district_id, commodity_id, future_days, historical_data, key)
+        return self.coalescer.do(key, lambda: self.compute_forecast(district_id, commodity_id, future_days, None, key))
+
+    def admitted(self):
+        return self.admission.slot() if self.admission is not None else nullcontext()
+
+    def compute_forecast(self, district_id, commodity_id, future_days, historical_data, key):
+        with self.admitted():
+            model_data = self.get_model(district_id, commodity_id, key[-1] if key else None)
+            if not model_data:
+                logger.warning("Model not found", extra={'district_id': district_id, 'commodity_id': commodity_id})
+                return None
+
+            with stage('data_fetch'):
+                commodity_history = self.get_price_history(district_id, commodity_id, historical_data)
+            if commodity_history is None or len(commodity_history) < self.sequence_length:
+                logger.warning("Insufficient price history", extra={
+                    'district_id': district_id, 'commodity_id': commodity_id, 'required': self.sequence_length})
+                return None
+
+            with stage('scaling'):
+                sequence = self.prepare_sequence(commodity_history, model_data['scaler'])
+            with stage('rollout'):
+                future_predictions = rollout(model_data, sequence, future_days).reshape(-1, 1)
+            with stage('scaling'):
+                future_predictions = model_data['scaler'].inverse_transform(future_predictions)
+        if key is not None and self.forecast_cache is not None:
+            self.forecast_cache.put(key, future_predictions)
+        return future_predictions
+
+    def predict_future_prices(self, district_id, commodity_id, historical_data=None, future_days=30):
+        logger.debug("Predicting future prices", extra={
+            'district_id': district_id, 'commodity_id': commodity_id, 'future_days': future_days})
+        future_predictions = self.forecast(district_id, commodity_id, future_days, historical_data)
+        if future_predictions is None:
+            return None
+        return self.format_predictions(future_predictions)
+
+    def format_predictions(self, future_predictions):
+        prices = np.asarray(future_predictions).reshape(-1).tolist()
+        return [{'predicted_date': date, 'predicted_price': price}
+                for date, price in zip(forecast_dates(len(prices)), prices)]
+
+    def numpy_model(self, model_data):
+        if self.backend in ('numpy', 'packed'):
+            return model_data['model']
+        if 'numpy_model' not in model_data:
+            model_data['numpy_model'] = NumpyLSTMModel.from_keras(model_data['model'])
+        return model_data['numpy_model']
+
+    def autotune_threads(self, future_days=30):
+        """Pick the BLAS thread count by timing rollouts of the first model in the manifest."""
+        if self.backend == 'keras':
+            # TensorFlow's pools are fixed once it has run an op
+            return None
+        pairs = self.manifest.pairs()
+        model_data = self.registry.get(*pairs[0]) if pairs else None
+        if model_data is None:
+            return None
+        sequence = np.random.default_rng(0).random((1, self.sequence_length, 1))
+        tuning = autotune(lambda: rollout(model_data, sequence, future_days), configure_blas)
+        self.threads['blas'] = tuning['chosen']['threads']
+        return tuning
+
+    def available_commodities(self, district_id):
+        return self.manifest.commodities(district_id)
+
+    def warm_up(self, pairs, background=True):
+        """Load ``pairs`` (and trace their rollouts) before reporting ready."""
+        pairs = [pair for pair in pairs if self.manifest.get(*pair)]
+        with self._warming_lock:
+            self._warming += 1
+            self.ready.clear()
+
+        def run():
+            started = time.perf_counter()
+            if self.price_store is not None:
+                self.price_store.available()
+            for district_id, commodity_id in pairs:
+                try:
+                    model_data = self.registry.get(district_id, commodity_id)
+                    if model_data:
+                        rollout(model_data, np.zeros((1, self.sequence_length, 1)), 1)
+                except Exception as e:
+                    logger.error("Warm-up failed", extra={
+                        'district_id': district_id, 'commodity_id': commodity_id, 'error': str(e)})
+            logger.info("Warm-up finished", extra={'models': len(pairs),
+                                                   'seconds': round(time.perf_counter() - started, 2)})
+            with self._warming_lock:
+                self._warming -= 1
+                if not self._warming:
+                    self.ready.set()
+
+        if background:
+            thread = threading.Thread(target=run, name='price-model-warmup', daemon=True)
+            with self._warming_lock:
+                self._warm_threads.append(thread)
+            thread.start()
+        else:
+            run()
+
+    def wait_warm_up(self):
+        """Block until every background warm-up has finished (before forking, for instance)."""
+        while True:
+            with self._warming_lock:
+                threads = [thread for thread in self._warm_threads if thread.is_alive()]
+                self._warm_threads = threads
+            if not threads:
+                return
+            for thread in threads:
+                thread.join()
+
+    def predict_many(self, pairs, future_days=30, stack_size=BATCH_STACK_SIZE):
+        """Forecast many (district_id, commodity_id) pairs at once.
+
+        Models with the same architecture are stacked and rolled out together,
+        ``stack_size`` at a time. A stack still runs the window timesteps in
+        sequence for every forecast step, one batched matvec per model and
+        layer; stacking saves the per-call NumPy overhead, not the arithmetic,
+        so all 108 bundled pairs come out about 2.7x faster than serial
+        forecasts rather than ``stack_size`` times faster. Returns {pair: (future_days, 1) array or None};
+        responses.forecast_payload turns one into a response body.
+        """
+        results = {}
+        pending = []
+        for district_id, commodity_id in pairs:
+            results[(district_id, commodity_id)] = None
+            key = self.forecast_key(district_id, commodity_id, future_days)
+            batch_key = self.batch_key(key)
+            known = self.lookup_forecast(key)
+            if known is None and batch_key != key:
+                known = self.lookup_forecast(batch_key)
+            if known is not None:
+                results[(district_id, commodity_id)] = known
+            else:
+                pending.append((district_id, commodity_id, key, batch_key))
+        if pending:
+            # The whole batch takes one admission slot
+            with self.admitted():
+                self._compute_many(pending, future_days, stack_size, results)
+        return results
+
+    def batch_key(self, key):
+        """Cache key for a predict_many result.
+
+        predict_many always runs the numpy port of the model; under the keras
+        backend its results are cached under the numpy engine's fingerprint,
+        apart from /predict's keras forecasts.
+        """
+        if key is None or self.backend != 'keras':
+            return key
+        return key[:-1] + (key[-1].rsplit(':', 1)[0] + ':numpy',)
+
+    def _compute_many(self, pending, future_days, stack_size, results):
+        ready = {}
+        for district_id, commodity_id, key, batch_key in pending:
+            model_data = self.get_model(district_id, commodity_id, key[-1] if key else None)
+            if not model_data:
+                logger.warning("Model not found", extra={'district_id': district_id, 'commodity_id': commodity_id})
+                continue
+            with stage('data_fetch'):
+                history = self.get_price_history(district_id, commodity_id)
+            if history is None or len(history) < self.sequence_length:
+                logger.warning("Insufficient price history", extra={
+                    'district_id': district_id, 'commodity_id': commodity_id, 'required': self.sequence_length})
+                continue
+            model = self.numpy_model(model_data)
+            history = np.asarray(history)[-self.sequence_length:]
+            ready.setdefault(model.signature, []).append(
+                ((district_id, commodity_id), batch_key, model_data, model, history))
+
+        for group in ready.values():
+            for start in range(0, len(group), stack_size):
+                chunk = group[start:start + stack_size]
+                scalers = [model_data['scaler'] for _, _, model_data, _, _ in chunk]
+                with stage('scaling'):
+                    sequences = transform_many(np.stack([history for _, _, _, _, history in chunk]), scalers)
+                with stage('rollout'):
+                    stacked = StackedLSTMModel([model for _, _, _, model, _ in chunk])
+                    outputs = stacked.rollout(sequences, future_days)
+                with stage('scaling'):
+                    outputs = inverse_transform_many(outputs, scalers)
+                for (pair, key, _, _, _), output in zip(chunk, outputs):
+                    future_predictions = output.reshape(-1, 1)
+                    if key is not None and self.forecast_cache is not None:
+                        self.forecast_cache.put(key, future_predictions)
+                    results[pair] = future_predictions
+        return results
+
+
+def warm_pairs_from_env(manifest):
+    spec = os.environ.get('PRICE_WARM_PAIRS', '')
+    if spec.strip() == 'all':
+        return manifest.pairs()
+    return parse_pairs(spec)
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Columnar, memory-mapped store for historical commodity prices.
+
+The ingest step turns historical_data.csv into a base directory base-<n>/ of:
+  prices.npy  - modal prices, one contiguous run per (district_id, commodity_id)
+  days.npy    - observation date of each price as days since 1970-01-01 (-1 if unknown)
+  index.npy   - (district_id, commodity_id, offset, length) per pair
+and meta.json, which names the current base directory and holds the
+fingerprint of the source CSV it was built from. A new base is always written
+to a new directory and published by replacing meta.json alone, so a reader
+never mixes arrays of two bases.
+
+Rows keep their CSV order inside each pair, so a series read from the store is
+identical to the boolean-mask filter the predictor used to run on the DataFrame.
+
+New daily prices go into journal.bin, an append-only log of
+(district_id, commodity_id, day, price) records that every snapshot overlays
+on the base arrays: a record for a date the series already has replaces that
+price (last write wins), any other record is inserted before the first row
+with a later date, leaving existing rows in their order.
+
+Every rebuild from the CSV, and every PRICE_JOURNAL_COMPACT_ROWS appended
+records, folds the journal into the base arrays and truncates it, so
+snapshots only overlay what arrived since. Folded records are also kept in
+the base's journal_folded.npy (one per pair and date) and applied again on the next CSV
+rebuild, so both feeds can be used side by side.
+
+    python price_store.py ingest historical_data.csv
+    python price_store.py append todays_prices.csv    # district_id,commodity_id,date,modal_price
+    python price_store.py compact
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_DTYPE = np.dtype([
+    ('district_id', '<i4'),
+    ('commodity_id', '<i4'),
+    ('offset', '<i8'),
+    ('length', '<i8'),
+])
+
+JOURNAL_DTYPE = np.dtype([
+    ('district_id', '<i4'),
+    ('commodity_id', '<i4'),
+    ('day', '<i4'),
+    ('price', '<f8'),
+])
+
+DATE_COLUMNS = ('date', 'arrival_date', 'price_date', 'Arrival_Date', 'Date')
+NO_DATE = -1
+JOURNAL_FILE = 'journal.bin'
+FOLDED_FILE = 'journal_folded.npy'
+# Journal records after which a refresh folds them into the base arrays (0 = only on CSV rebuilds)
+JOURNAL_COMPACT_ROWS = int(os.environ.get('PRICE_JOURNAL_COMPACT_ROWS', '100000'))
+
+
+def source_fingerprint(source_file):
+    stat = os.stat(source_file)
+    return {'source_mtime_ns': stat.st_mtime_ns, 'source_size': stat.st_size}
+
+
+def ingest_csv(source_file, store_dir):
+    """Build the columnar store for ``source_file`` in ``store_dir``."""
+    import pandas as pd
+
+    fingerprint = source_fingerprint(source_file)
+    header = pd.read_csv(source_file, nrows=0).columns
+    date_column = next((c for c in DATE_COLUMNS if c in header), None)
+    usecols = ['district_id', 'commodity_id', 'modal_price'] + ([date_column] if date_column else [])
+    frame = pd.read_csv(source_file, usecols=usecols, low_memory=False)
+
+    district_ids = frame['district_id'].to_numpy(dtype=np.int32)
+    commodity_ids = frame['commodity_id'].to_numpy(dtype=np.int32)
+    prices = frame['modal_price'].to_numpy(dtype=np.float64)
+    if date_column:
+        dates = pd.to_datetime(frame[date_column], errors='coerce')
+        days = dates.values.astype('datetime64[D]').astype(np.int64)
+        days[dates.isna().to_numpy()] = NO_DATE
+        days = days.astype(np.int32)
+    else:
+        days = np.full(len(frame), NO_DATE, dtype=np.int32)
+
+    # Stable sort keeps the original row order within each pair
+    order = np.lexsort((commodity_ids, district_ids))
+    district_ids = district_ids[order]
+    commodity_ids = commodity_ids[order]
+    prices = np.ascontiguousarray(prices[order])
+    days = np.ascontiguousarray(days[order])
+
+    if len(order):
+        boundaries = np.flatnonzero(
+            (np.diff(district_ids) != 0) | (np.diff(commodity_ids) != 0)
+        ) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(order)]))
+    else:
+        starts = ends = np.empty(0, dtype=np.int64)
+
+    index = np.empty(len(starts), dtype=INDEX_DTYPE)
+    index['district_id'] = district_ids[starts]
+    index['commodity_id'] = commodity_ids[starts]
+    index['offset'] = starts
+    index['length'] = ends - starts
+
+    meta = dict(fingerprint, source=os.path.abspath(source_file), date_column=date_column, built_at=time.time())
+    with _journal_lock(store_dir) as journal_fd:
+        records = read_journal(store_dir)[0]
+        folded = _load_folded(store_dir)
+        prices, days, index = fold_records(prices, days, index, np.concatenate((folded, records)))
+        meta = _write_base(store_dir, prices, days, index, meta, folded=_dedupe(folded, records))
+        os.ftruncate(journal_fd, 0)
+    return meta
+
+
+def _write_base(store_dir, prices, days, index, meta, folded):
+    """Write the arrays to a new base directory and publish it by replacing meta.json."""
+    name = f'base-{time.time_ns()}'
+    base_dir = os.path.join(store_dir, name)
+    os.makedirs(base_dir)
+    np.save(os.path.join(base_dir, 'prices.npy'), prices)
+    np.save(os.path.join(base_dir, 'days.npy'), days)
+    np.save(os.path.join(base_dir, 'index.npy'), index)
+    np.save(os.path.join(base_dir, FOLDED_FILE), folded)
+    meta = dict(meta, base=name, rows=int(len(prices)), pairs=int(len(index)), journal_folded=int(len(folded)))
+    # Replaced (new inode) only once the whole base is on disk, which is how readers notice it
+    tmp_meta = os.path.join(store_dir, f'meta.json.tmp-{os.getpid()}')
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, os.path.join(store_dir, 'meta.json'))
+    # Readers that already mapped an older base keep it; readers part-way through loading one retry
+    for entry in os.listdir(store_dir):
+        if entry.startswith('base-') and entry != name:
+            shutil.rmtree(os.path.join(store_dir, entry), ignore_errors=True)
+        elif entry in ('prices.npy', 'days.npy', 'index.npy', FOLDED_FILE):  # layout before base directories
+            os.remove(os.path.join(store_dir, entry))
+    return meta
+
+
+def _empty_store(store_dir):
+    """Create a store with no base rows, so a journal can be started without a CSV."""
+    os.makedirs(store_dir, exist_ok=True)
+    _write_base(store_dir, np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int32), np.empty(0, dtype=INDEX_DTYPE),
+                {'source': None, 'date_column': None, 'built_at': time.time()}, np.empty(0, dtype=JOURNAL_DTYPE))
+
+
+def _base_dir(store_dir, meta):
+    # Stores written before base directories keep their arrays next to meta.json
+    return os.path.join(store_dir, meta['base']) if meta.get('base') else store_dir
+
+
+def _load_base(store_dir, attempts=5):
+    """(meta, prices, days, index, meta.json stat) of the current base, mapped read-only."""
+    for attempt in range(attempts):
+        stat = _base_stat(store_dir)
+        try:
+            with open(os.path.join(store_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            base_dir = _base_dir(store_dir, meta)
+            prices = np.load(os.path.join(base_dir, 'prices.npy'), mmap_mode='r')
+            days = np.load(os.path.join(base_dir, 'days.npy'), mmap_mode='r')
+            index = np.load(os.path.join(base_dir, 'index.npy'))
+        except FileNotFoundError:
+            # A newer base replaced this one while it was being loaded
+            if attempt == attempts - 1:
+                raise
+            continue
+        if _base_stat(store_dir) == stat:
+            return meta, prices, days, index, stat
+    raise RuntimeError(f"price store {store_dir} kept changing while being loaded")
+
+
+def read_journal(store_dir, start=0):
+    """Journal records from byte offset ``start`` on, and the offset they end at."""
+    path = os.path.join(store_dir, JOURNAL_FILE)
+    try:
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+    except FileNotFoundError:
+        return np.empty(0, dtype=JOURNAL_DTYPE), 0
+    usable = len(data) - len(data) % JOURNAL_DTYPE.itemsize
+    return np.frombuffer(data[:usable], dtype=JOURNAL_DTYPE), start + usable
+
+
+class _journal_lock:
+    """Exclusive lock on the journal (the one write_journal takes); yields its file descriptor."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def __enter__(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.fd = os.open(os.path.join(self.store_dir, JOURNAL_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self.fd
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+
+
+def _load_folded(store_dir):
+    """Records folded into the current base; callers hold the journal lock, so it cannot change meanwhile."""
+    try:
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        return np.load(os.path.join(_base_dir(store_dir, meta), FOLDED_FILE))
+    except FileNotFoundError:
+        return np.empty(0, dtype=JOURNAL_DTYPE)
+
+
+def _pair_keys(records):
+    return records['district_id'].astype(np.int64) << 32 | records['commodity_id'].astype(np.int64)
+
+
+def _dedupe(*parts):
+    """One record per (pair, day) from ``parts`` in order, the last one winning."""
+    records = np.concatenate(parts)
+    if not len(records):
+        return records
+    keys = np.stack((_pair_keys(records), records['day'].astype(np.int64)), axis=1)
+    _, last = np.unique(keys[::-1], axis=0, return_index=True)
+    return records[::-1][last]
+
+
+def write_journal(store_dir, records):
+    """Append records to the journal (one locked write, fsynced)."""
+    os.makedirs(store_dir, exist_ok=True)
+    fd = os.open(os.path.join(store_dir, JOURNAL_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, np.ascontiguousarray(records, dtype=JOURNAL_DTYPE).tobytes())
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def locate_days(days, query_days):
+    """Index of the last row of ``days`` with each query date, or -1."""
+    if not len(days):
+        return np.full(len(query_days), -1, dtype=np.int64)
+    order = np.argsort(days, kind='stable')
+    ordered = days[order]
+    found = np.searchsorted(ordered, query_days, side='right') - 1
+    hit = (found >= 0) & (ordered[np.maximum(found, 0)] == query_days) & (query_days != NO_DATE)
+    return np.where(hit, order[np.maximum(found, 0)], -1)
+
+
+def merge_records(prices, days, record_days, record_prices):
+    """Apply journal records to one series; the last record for a date wins.
+
+    Dates the series has get their price replaced in place; other records are
+    inserted before the first row with a later date (appended when there is
+    none), so existing rows keep the order the CSV gave them.
+    """
+    prices = np.array(prices, dtype=np.float64)
+    days = np.array(days, dtype=np.int32)
+    unique_days, first = np.unique(record_days[::-1], return_index=True)
+    unique_prices = record_prices[::-1][first]
+    existing = locate_days(days, unique_days)
+    present = existing >= 0
+    prices[existing[present]] = unique_prices[present]
+    new_days, new_prices = unique_days[~present].astype(np.int32), unique_prices[~present]
+    if len(new_days):
+        # Running maximum is non-decreasing, and its first value above d marks the first later row
+        positions = np.searchsorted(np.maximum.accumulate(days), new_days, side='right') if len(days) else 0
+        days = np.insert(days, positions, new_days)
+        prices = np.insert(prices, positions, new_prices)
+    return prices, days
+
+
+def fold_records(prices, days, index, records):
+    """Base arrays with ``records`` merged in; only the slices of pairs they touch are rebuilt."""
+    if not len(records):
+        return prices, days, index
+    keys = _pair_keys(records)
+    merged = {}
+    for key in np.unique(keys):
+        mine = records[keys == key]
+        merged[(int(key >> 32), int(key & 0xFFFFFFFF))] = mine
+    price_parts, day_parts, rows = [], [], []
+    for row in index:
+        pair = (int(row['district_id']), int(row['commodity_id']))
+        offset, length = int(row['offset']), int(row['length'])
+        series = prices[offset:offset + length], days[offset:offset + length]
+        mine = merged.pop(pair, None)
+        if mine is not None:
+            series = merge_records(*series, mine['day'], mine['price'])
+        price_parts.append(series[0])
+        day_parts.append(series[1])
+        rows.append(pair)
+    for pair, mine in sorted(merged.items()):
+        series = merge_records(np.empty(0), np.empty(0, dtype=np.int32), mine['day'], mine['price'])
+        price_parts.append(series[0])
+        day_parts.append(series[1])
+        rows.append(pair)
+    lengths = np.array([len(part) for part in price_parts], dtype=np.int64)
+    new_index = np.empty(len(rows), dtype=INDEX_DTYPE)
+    new_index['district_id'] = [pair[0] for pair in rows]
+    new_index['commodity_id'] = [pair[1] for pair in rows]
+    new_index['offset'] = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(rows) else lengths
+    new_index['length'] = lengths
+    new_prices = np.concatenate(price_parts).astype(np.float64) if price_parts else np.empty(0, dtype=np.float64)
+    new_days = np.concatenate(day_parts).astype(np.int32) if day_parts else np.empty(0, dtype=np.int32)
+    return new_prices, new_days, new_index
+
+
+def compact_journal(store_dir):
+    """Fold journal.bin into the base arrays and truncate it. Returns the number of records folded."""
+    with _journal_lock(store_dir) as journal_fd:
+        records = read_journal(store_dir)[0]
+        if not len(records):
+            return 0
+        meta, prices, days, index, _ = _load_base(store_dir)
+        prices, days, index = fold_records(prices, days, index, records)
+        _write_base(store_dir, prices, days, index, meta, folded=_dedupe(_load_folded(store_dir), records))
+        os.ftruncate(journal_fd, 0)
+    return len(records)
+
+
+def _base_stat(store_dir):
+    try:
+        st = os.stat(os.path.join(store_dir, 'meta.json'))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+class _Snapshot:
+    """One immutable version of the store: memory-mapped base arrays plus the journal overlay."""
+
+    def __init__(self, store_dir, base=None):
+        self.store_dir = store_dir
+        if base is None:
+            self.meta, self.prices, self.days, index, self.base_stat = _load_base(store_dir)
+            self.index = {
+                (int(row['district_id']), int(row['commodity_id'])): (int(row['offset']), int(row['length']))
+                for row in index
+            }
+            self.overlay = {}
+            self.journal_size = 0
+        else:
+            self.meta, self.prices, self.days, self.index = base.meta, base.prices, base.days, base.index
+            self.base_stat = base.base_stat
+            self.overlay = dict(base.overlay)
+            self.journal_size = base.journal_size
+        self._versions = {}
+
+    def extended(self):
+        """Snapshot with the journal records written since this one was taken, and the pairs they touch."""
+        records, end = read_journal(self.store_dir, self.journal_size)
+        snapshot = _Snapshot(self.store_dir, base=self)
+        snapshot.journal_size = end
+        touched = set()
+        if len(records):
+            keys = _pair_keys(records)
+            for key in np.unique(keys):
+                pair = (int(key >> 32), int(key & 0xFFFFFFFF))
+                mine = records[keys == key]
+                prices, days = snapshot.series(pair)
+                if prices is None:  # a pair the CSV does not have yet
+                    prices, days = np.empty(0), np.empty(0, dtype=np.int32)
+                snapshot.overlay[pair] = merge_records(prices, days, mine['day'], mine['price'])
+                touched.add(pair)
+        return snapshot, touched
+
+    def __contains__(self, pair):
+        return pair in self.overlay or pair in self.index
+
+    def pairs(self):
+        return set(self.index) | set(self.overlay)
+
+    def series(self, pair):
+        """(prices, days) of a pair, or (None, None)."""
+        merged = self.overlay.get(pair)
+        if merged is not None:
+            return merged
+        location = self.index.get(pair)
+        if location is None:
+            return None, None
+        offset, length = location
+        return self.prices[offset:offset + length], self.days[offset:offset + length]
+
+    def version(self, pair):
+        """(last day, length, crc32 of the prices) of a pair, or None."""
+        version = self._versions.get(pair)
+        if version is None:
+            prices, days = self.series(pair)
+            if prices is None or not len(prices):
+                return None
+            checksum = zlib.crc32(np.ascontiguousarray(prices, dtype=np.float64).tobytes())
+            version = (int(days[-1]), len(prices), checksum)
+            self._versions[pair] = version
+        return version
+
+
+def changed_pairs(old, new):
+    """Pairs whose series differ between two snapshots (all of ``new`` if ``old`` is None)."""
+    if old is None:
+        return new.pairs()
+    return {pair for pair in old.pairs() | new.pairs() if old.version(pair) != new.version(pair)}
+
+
+class PriceStore:
+    """Serves per-pair price tails from a memory-mapped columnar store.
+
+    When ``source_file`` is given the store is rebuilt and remapped as soon as
+    the CSV's mtime or size no longer matches what it was built from (checked
+    at most every ``check_interval`` seconds). Records appended to the journal,
+    by this process or another one, are picked up on the same schedule and
+    only the pairs they touch are reported as changed. Once the journal holds
+    ``compact_rows`` records it is folded into the base arrays.
+    """
+
+    def __init__(self, store_dir, source_file=None, check_interval=1.0, compact_rows=JOURNAL_COMPACT_ROWS):
+        self.store_dir = store_dir
+        self.source_file = source_file
+        self.check_interval = check_interval
+        self.compact_rows = compact_rows
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.reloads = 0
+        self.appended_rows = 0
+
+    def add_listener(self, callback):
+        """Call ``callback(changed_pairs)`` whenever a reload changes some series."""
+        self._listeners.append(callback)
+
+    def _notify(self, changed):
+        if changed:
+            for callback in self._listeners:
+                callback(changed)
+
+    def _is_stale(self, snapshot):
+        if self.source_file is None or not os.path.exists(self.source_file):
+            return False
+        if snapshot is None:
+            return True
+        fingerprint = source_fingerprint(self.source_file)
+        return any(snapshot.meta.get(k) != v for k, v in fingerprint.items())
+
+    def _journal_size(self):
+        try:
+            return os.stat(os.path.join(self.store_dir, JOURNAL_FILE)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def refresh(self, force=False):
+        """Rebuild and remap the store if the source changed. Returns True on reload."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None and not force and os.path.exists(os.path.join(self.store_dir, 'meta.json')):
+                snapshot, _ = _Snapshot(self.store_dir).extended()
+                self._snapshot = snapshot
+            if not force and not self._is_stale(snapshot):
+                journal_size = self._journal_size()
+                if snapshot is None:
+                    return False
+                replaced = _base_stat(self.store_dir) != snapshot.base_stat
+                if self.compact_rows and journal_size >= self.compact_rows * JOURNAL_DTYPE.itemsize:
+                    folded = compact_journal(self.store_dir)
+                    logger.info("Folded price journal into the store", extra={'records': folded})
+                    replaced = True
+                if journal_size == snapshot.journal_size and not replaced:
+                    return False
+                if journal_size > snapshot.journal_size and not replaced:
+                    self._snapshot, touched = snapshot.extended()
+                    self.reloads += 1
+                    changed = touched
+                else:
+                    # Journal folded or truncated, or the base rebuilt (possibly by
+                    # another process); start over from the base arrays
+                    self._snapshot, _ = _Snapshot(self.store_dir).extended()
+                    self.reloads += 1
+                    changed = changed_pairs(snapshot, self._snapshot)
+                new_snapshot = None
+            else:
+                if self.source_file is not None and os.path.exists(self.source_file):
+                    logger.info("Ingesting historical prices", extra={'source': self.source_file})
+                    ingest_csv(self.source_file, self.store_dir)
+                new_snapshot, _ = _Snapshot(self.store_dir).extended()
+                self._snapshot = new_snapshot
+                self.reloads += 1
+        if new_snapshot is not None:
+            changed = changed_pairs(snapshot, new_snapshot)
+        self._notify(changed)
+        return True
+
+    def append(self, rows):
+        """Add (district_id, commodity_id, day, price) records to the journal.
+
+        Rows for a date the series already has at the same price are dropped as
+        duplicates; a different price for an existing date is a correction.
+        Returns counts and the set of pairs whose series changed.
+        """
+        records = np.asarray(rows, dtype=JOURNAL_DTYPE).reshape(-1)
+        valid = (records['day'] != NO_DATE) & np.isfinite(records['price']) & (records['price'] > 0)
+        if not valid.all():
+            raise ValueError(f"{int((~valid).sum())} rows without a date or a positive price")
+        if not os.path.exists(os.path.join(self.store_dir, 'meta.json')):
+            _empty_store(self.store_dir)
+        snapshot = self.snapshot()
+
+        kept, duplicates, corrections = [], 0, 0
+        keys = _pair_keys(records)
+        for key in np.unique(keys):
+            pair = (int(key >> 32), int(key & 0xFFFFFFFF))
+            mine = records[keys == key]
+            # Last row for a date within the batch wins
+            _, last = np.unique(mine['day'][::-1], return_index=True)
+            mine = mine[::-1][last]
+            prices, days = snapshot.series(pair)
+            if prices is not None and len(prices):
+                existing = locate_days(np.asarray(days), mine['day'])
+                known = existing >= 0
+                same = known & (np.asarray(prices, dtype=np.float64)[np.maximum(existing, 0)] == mine['price'])
+                duplicates += int(same.sum())
+                corrections += int((known & ~same).sum())
+                mine = mine[~same]
+            kept.append(mine)
+        kept = np.concatenate(kept) if kept else records[:0]
+        if len(kept):
+            write_journal(self.store_dir, kept)
+            self.appended_rows += len(kept)
+        changed = set()
+        with self._lock:
+            if self._snapshot is not None and self._journal_size() > self._snapshot.journal_size:
+                self._snapshot, changed = self._snapshot.extended()
+                self.reloads += 1
+        self._notify(changed)
+        return {
+            'received': len(records),
+            'appended': len(kept) - corrections,
+            'corrected': corrections,
+            'duplicates': duplicates,
+            'changed_pairs': sorted(changed),
+        }
+
+    def snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.refresh()
+        if self._snapshot is None:
+            raise FileNotFoundError(f"Price store not found in {self.store_dir}")
+        return self._snapshot
+
+    def available(self):
+        try:
+            self.snapshot()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def history_length(self, district_id, commodity_id):
+        prices, _ = self.snapshot().series((district_id, commodity_id))
+        return len(prices) if prices is not None else 0
+
+    def get_recent(self, district_id, commodity_id, n):
+        """Last ``n`` prices of a pair (fewer if the series is shorter), or None."""
+        prices, _ = self.snapshot().series((district_id, commodity_id))
+        if prices is None:
+            return None
+        return np.array(prices[max(len(prices) - n, 0):])
+
+    def last_day(self, district_id, commodity_id):
+        """Date of the most recent observation (days since epoch), or None."""
+        _, days = self.snapshot().series((district_id, commodity_id))
+        if days is None or not len(days):
+            return None
+        return int(days[-1])
+
+    def data_version(self, district_id, commodity_id):
+        """(last observed day, series length, checksum) for cache keys, or None if unknown."""
+        return self.snapshot().version((district_id, commodity_id))
+
+    def pairs(self):
+        return sorted(self.snapshot().pairs())
+
+
+def rows_from_csv(path):
+    """Journal records from a CSV with district_id, commodity_id, a date column and modal_price."""
+    import pandas as pd
+
+    frame = pd.read_csv(path)
+    date_column = next((c for c in DATE_COLUMNS if c in frame.columns), None)
+    if date_column is None:
+        raise ValueError(f"{path} has no date column (one of {', '.join(DATE_COLUMNS)})")
+    dates = pd.to_datetime(frame[date_column], errors='coerce')
+    records = np.empty(len(frame), dtype=JOURNAL_DTYPE)
+    records['district_id'] = frame['district_id'].to_numpy(dtype=np.int32)
+    records['commodity_id'] = frame['commodity_id'].to_numpy(dtype=np.int32)
+    days = dates.values.astype('datetime64[D]').astype(np.int64)
+    days[dates.isna().to_numpy()] = NO_DATE
+    records['day'] = days
+    records['price'] = frame['modal_price'].to_numpy(dtype=np.float64)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the columnar historical price store.')
+    parser.add_argument('--store', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historical_store'),
+                        help='store directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='rebuild the store from a historical prices CSV')
+    ingest.add_argument('source', help='historical prices CSV')
+    append = commands.add_parser('append', help='add new dated prices to the journal')
+    append.add_argument('source', help='CSV with district_id, commodity_id, date and modal_price')
+    commands.add_parser('compact', help='fold the journal into the columnar arrays and truncate it')
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        started = time.perf_counter()
+        meta = ingest_csv(args.source, args.store)
+        print(f"Ingested {meta['rows']} rows for {meta['pairs']} pairs into {args.store} "
+              f"in {time.perf_counter() - started:.2f}s")
+    elif args.command == 'append':
+        started = time.perf_counter()
+        result = PriceStore(args.store).append(rows_from_csv(args.source))
+        print(f"Appended {result['appended']} rows, corrected {result['corrected']}, skipped {result['duplicates']} "
+              f"duplicates; {len(result['changed_pairs'])} pairs changed ({time.perf_counter() - started:.2f}s)")
+    elif args.command == 'compact':
+        started = time.perf_counter()
+        folded = compact_journal(args.store)
+        print(f"Folded {folded} journal records into {args.store} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
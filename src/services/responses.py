@@ -0,0 +1,63 @@
+"""
+Forecast response payloads built from whole arrays.
+
+Dates are one ``datetime64`` range (cached per day and horizon) and prices
+one ``astype`` instead of a ``strftime`` and an ``int()`` per point. Two
+shapes are offered:
+
+  rows      - {"region", "crop", "predictions": [{"predicted_date", "predicted_price"}], "prices"}
+              (the original response)
+  columnar  - {"region", "crop", "format": "columnar", "start_date", "dates", "prices"}
+
+``dumps`` uses orjson when it is installed and the standard library otherwise.
+"""
+
+import json
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMATS = ('rows', 'columnar')
+
+
+@lru_cache(maxsize=64)
+def _date_strings(today, days):
+    start = np.datetime64(today, 'D')
+    return tuple((start + np.arange(1, days + 1)).astype(str).tolist())
+
+
+def forecast_dates(days, today=None):
+    """ISO dates for the ``days`` days after ``today`` (local date by default)."""
+    return _date_strings((today or datetime.now().date()).isoformat(), days)
+
+
+def price_column(predictions):
+    """Forecast prices truncated to integers, as ``int(price)`` does per element."""
+    prices = np.asarray(predictions).reshape(-1)
+    if not np.isfinite(prices).all():
+        raise ValueError('forecast contains non-finite prices')
+    return prices.astype(np.int64).tolist()
+
+
+def forecast_payload(region, crop, predictions, fmt='rows'):
+    """Response body for one forecast array of shape (days,) or (days, 1)."""
+    prices = price_column(predictions)
+    dates = forecast_dates(len(prices))
+    if fmt == 'columnar':
+        return {'region': region, 'crop': crop, 'format': 'columnar', 'start_date': dates[0] if dates else None,
+                'dates': dates, 'prices': prices}
+    rows = [{'predicted_date': date, 'predicted_price': price} for date, price in zip(dates, prices)]
+    return {'region': region, 'crop': crop, 'predictions': rows, 'prices': prices}
+
+
+def dumps(payload):
+    """JSON bytes for a payload of dicts, lists, strings and Python numbers."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Autoregressive rollout engines for the commodity price models.
+
+Each forecast feeds the model's own prediction back as the newest value of a
+fixed-length window. ``legacy_rollout`` is the original loop (one
+``model.predict`` and one ``np.roll`` per day); ``CompiledRollout`` runs the
+whole horizon inside a single ``tf.function`` while-loop, and ``RingBuffer``
+keeps a sliding window in preallocated storage for backends that step in
+Python.
+
+Outputs keep the model's output dtype (float16 for the mixed-precision
+models) so the scaler's inverse transform sees exactly what the legacy loop
+produced.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size sliding window without per-step allocation.
+
+    ``initial`` has shape ``(size, ...)``; every entry is stored twice (at ``i``
+    and ``i + size``) so ``window()`` is always a contiguous view of the last
+    ``size`` entries, oldest first.
+    """
+
+    def __init__(self, initial, dtype=np.float32):
+        initial = np.asarray(initial, dtype=dtype)
+        self.size = len(initial)
+        self._data = np.empty((2 * self.size,) + initial.shape[1:], dtype=dtype)
+        self._data[:self.size] = initial
+        self._data[self.size:] = initial
+        self._head = 0
+
+    def push(self, value):
+        self._data[self._head] = value
+        self._data[self._head + self.size] = value
+        self._head = (self._head + 1) % self.size
+
+    def window(self):
+        return self._data[self._head:self._head + self.size]
+
+
+def legacy_rollout(model, sequence, horizon):
+    """The original per-day ``model.predict`` loop, kept as the reference."""
+    future_predictions = []
+    current_sequence = sequence.copy()
+    for _ in range(horizon):
+        next_pred = model.predict(current_sequence, verbose=0)
+        future_predictions.append(next_pred[0, 0])
+        current_sequence = np.roll(current_sequence, -1, axis=1)
+        current_sequence[0, -1, 0] = next_pred[0, 0]
+    return np.array(future_predictions)
+
+
+class CompiledRollout:
+    """Runs a full forecast horizon as one compiled TensorFlow graph."""
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self._tf = tf
+        self.output_dtype = tf.as_dtype(model.outputs[0].dtype)
+        self._fn = tf.function(self._rollout, reduce_retracing=True)
+
+    def _rollout(self, window, horizon):
+        tf = self._tf
+        outputs = tf.TensorArray(self.output_dtype, size=horizon)
+
+        def body(step, window, outputs):
+            pred = self.model(window, training=False)
+            outputs = outputs.write(step, pred[0, 0])
+            next_value = tf.reshape(tf.cast(pred[0, 0], window.dtype), (1, 1, 1))
+            window = tf.concat([window[:, 1:, :], next_value], axis=1)
+            return step + 1, window, outputs
+
+        _, _, outputs = tf.while_loop(
+            lambda step, window, outputs: step < horizon,
+            body,
+            (tf.constant(0), window, outputs),
+        )
+        return outputs.stack()
+
+    def __call__(self, sequence, horizon):
+        # The model's input layer is float32, so casting here matches what
+        # model.predict does to the float64 scaler output
+        window = self._tf.constant(np.asarray(sequence, dtype=np.float32).reshape(1, -1, 1))
+        return self._fn(window, self._tf.constant(horizon, dtype=self._tf.int32)).numpy()
+
+
+def rollout(entry, sequence, horizon):
+    """Forecast ``horizon`` steps for a registry entry using its best engine."""
+    engine = entry.get('rollout')
+    if engine is not None:
+        return engine(sequence, horizon)
+    model = entry['model']
+    if hasattr(model, 'rollout'):
+        return model.rollout(sequence, horizon)
+    return legacy_rollout(model, sequence, horizon)
+
+
+def benchmark(models_dir, horizons, repeats, limit):
+    """Time the legacy loop against the compiled engine on bundled models."""
+    from tensorflow.keras.models import load_model
+
+    models_path = os.path.join(models_dir, 'models')
+    model_files = sorted(f for f in os.listdir(models_path) if f.endswith('.keras'))[:limit]
+    rng = np.random.default_rng(0)
+    results = []
+    for model_file in model_files:
+        model = load_model(os.path.join(models_path, model_file))
+        engine = CompiledRollout(model)
+        sequence = rng.random((1, 30, 1))
+        engine(sequence, 1)  # trace once
+        for horizon in horizons:
+            timings = {}
+            for name, fn in (('legacy', lambda: legacy_rollout(model, sequence, horizon)),
+                             ('compiled', lambda: engine(sequence, horizon))):
+                samples = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    out = fn()
+                    samples.append(time.perf_counter() - started)
+                timings[name] = (float(np.median(samples)), out)
+            legacy_ms, legacy_out = timings['legacy'][0] * 1000, timings['legacy'][1]
+            compiled_ms, compiled_out = timings['compiled'][0] * 1000, timings['compiled'][1]
+            results.append({
+                'model': model_file,
+                'horizon': horizon,
+                'legacy_ms': round(legacy_ms, 3),
+                'compiled_ms': round(compiled_ms, 3),
+                'speedup': round(legacy_ms / compiled_ms, 2) if compiled_ms else None,
+                'max_abs_diff': float(np.max(np.abs(legacy_out.astype(np.float64) - compiled_out.astype(np.float64)))),
+            })
+            print(f"{model_file} horizon={horizon}: legacy {legacy_ms:.1f} ms, compiled {compiled_ms:.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-horizon latency of the legacy and compiled rollouts.')
+    parser.add_argument('--models-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models'))
+    parser.add_argument('--horizons', type=int, nargs='+', default=[1, 10, 30, 100])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=3, help='number of models to time')
+    parser.add_argument('--out', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = benchmark(args.models_dir, args.horizons, args.repeats, args.limit)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+All fitted MinMaxScalers from ``saved_models/scalers`` in one array table.
+
+Each pair's scaler is reduced to the parameters its transforms use
+(``scale_``, ``min_``, ``clip``, ``feature_range``) and stored in
+``saved_models/scalers.npz`` together with the source file's mtime and size.
+Loading reuses the table and only unpickles scalers whose files changed.
+
+``transform`` and ``inverse_transform`` repeat scikit-learn's arithmetic
+(same dtype handling, same in-place operations, same order) so results are
+bit-identical, and accept per-row parameters to scale a batch of pairs in
+one call.
+
+    python scaler_table.py    # export / refresh the table and check it against sklearn
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FLOAT_DTYPES = (np.float64, np.float32, np.float16)
+TABLE_VERSION = 1
+
+
+def _float_array(X):
+    """Copy of X as scikit-learn's check_array(copy=True, dtype=FLOAT_DTYPES) returns it."""
+    X = np.asarray(X)
+    dtype = X.dtype if X.dtype in FLOAT_DTYPES else np.float64
+    return np.array(X, dtype=dtype, copy=True)
+
+
+def transform(X, scale, min_, clip=None):
+    """MinMaxScaler.transform; ``clip`` is None or the (low, high) feature range."""
+    X = _float_array(X)
+    X *= scale
+    X += min_
+    if clip is not None:
+        np.clip(X, np.asarray(clip[0], dtype=X.dtype), np.asarray(clip[1], dtype=X.dtype), out=X)
+    return X
+
+
+def inverse_transform(X, scale, min_):
+    """MinMaxScaler.inverse_transform."""
+    X = _float_array(X)
+    X -= min_
+    X /= scale
+    return X
+
+
+class MinMaxParams:
+    """The part of a fitted single-feature MinMaxScaler the predictor uses."""
+
+    __slots__ = ('scale_', 'min_', 'clip', 'feature_range')
+
+    def __init__(self, scale, min_, clip=False, feature_range=(0.0, 1.0)):
+        self.scale_ = np.asarray(scale, dtype=np.float64).reshape(1)
+        self.min_ = np.asarray(min_, dtype=np.float64).reshape(1)
+        self.clip = bool(clip)
+        self.feature_range = tuple(float(v) for v in feature_range)
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        if getattr(scaler, 'n_features_in_', 1) != 1 or np.size(scaler.scale_) != 1:
+            raise ValueError('only single-feature MinMaxScalers can be tabulated')
+        return cls(scaler.scale_, scaler.min_, getattr(scaler, 'clip', False), scaler.feature_range)
+
+    def transform(self, X):
+        return transform(X, self.scale_, self.min_, self.feature_range if self.clip else None)
+
+    def inverse_transform(self, X):
+        return inverse_transform(X, self.scale_, self.min_)
+
+
+def stack_params(scalers):
+    """Per-row (scale, min) columns for a batch of scalers, ready to broadcast over (M, T)."""
+    scale = np.array([s.scale_[0] for s in scalers], dtype=np.float64).reshape(-1, 1)
+    min_ = np.array([s.min_[0] for s in scalers], dtype=np.float64).reshape(-1, 1)
+    return scale, min_
+
+
+def transform_many(X, scalers):
+    """Scale row i of X (M, T) with scalers[i] in one pass."""
+    if any(getattr(s, 'clip', False) for s in scalers):
+        return np.stack([s.transform(row.reshape(-1, 1)).reshape(-1) for s, row in zip(scalers, X)])
+    scale, min_ = stack_params(scalers)
+    return transform(X, scale, min_)
+
+
+def inverse_transform_many(X, scalers):
+    """Inverse of transform_many."""
+    scale, min_ = stack_params(scalers)
+    return inverse_transform(X, scale, min_)
+
+
+def load_scaler(path):
+    import joblib
+
+    return joblib.load(path)
+
+
+class ScalerTable:
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        self.reloaded = 0
+
+    @classmethod
+    def load(cls, manifest, path=None):
+        table = cls(path or os.path.join(manifest.models_dir, 'scalers.npz'))
+        table.refresh(manifest)
+        return table
+
+    def _read(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != TABLE_VERSION:
+                    return {}
+                rows = {}
+                for i, (district_id, commodity_id) in enumerate(data['pairs']):
+                    rows[(int(district_id), int(commodity_id))] = (
+                        MinMaxParams(data['scale'][i], data['min'][i], data['clip'][i], data['feature_range'][i]),
+                        int(data['source_mtime_ns'][i]),
+                        int(data['source_size'][i]),
+                    )
+                return rows
+        except (OSError, KeyError, ValueError):
+            return {}
+
+    def _write(self):
+        pairs = sorted(self.rows)
+        params = [self.rows[pair][0] for pair in pairs]
+        tmp_path = f'{self.path}.tmp-{os.getpid()}.npz'
+        try:
+            np.savez(
+                tmp_path,
+                version=np.int64(TABLE_VERSION),
+                pairs=np.array(pairs, dtype=np.int32).reshape(-1, 2),
+                scale=np.array([p.scale_[0] for p in params], dtype=np.float64),
+                min=np.array([p.min_[0] for p in params], dtype=np.float64),
+                clip=np.array([p.clip for p in params], dtype=bool),
+                feature_range=np.array([p.feature_range for p in params], dtype=np.float64).reshape(-1, 2),
+                source_mtime_ns=np.array([self.rows[pair][1] for pair in pairs], dtype=np.int64),
+                source_size=np.array([self.rows[pair][2] for pair in pairs], dtype=np.int64),
+            )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not write scaler table", extra={'path': self.path, 'error': str(e)})
+
+    def refresh(self, manifest):
+        """Reuse rows whose scaler file is unchanged; unpickle the rest."""
+        cached = self._read()
+        rows, reloaded = {}, 0
+        for pair in manifest.pairs():
+            entry = manifest.get(*pair)
+            row = cached.get(pair)
+            if row is None or row[1] != entry['scaler_mtime_ns'] or row[2] != entry['scaler_size']:
+                try:
+                    params = MinMaxParams.from_scaler(load_scaler(entry['scaler_path']))
+                except Exception as e:
+                    logger.warning("Scaler not tabulated", extra={
+                        'district_id': pair[0], 'commodity_id': pair[1], 'error': str(e)})
+                    continue
+                row = (params, entry['scaler_mtime_ns'], entry['scaler_size'])
+                reloaded += 1
+            rows[pair] = row
+        self.rows = rows
+        self.reloaded = reloaded
+        if reloaded or set(cached) != set(rows):
+            self._write()
+        return self
+
+    def get(self, district_id, commodity_id):
+        row = self.rows.get((district_id, commodity_id))
+        return row[0] if row else None
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def check_against_sklearn(manifest, table, samples=64):
+    """Number of pairs whose table transforms differ from the pickled scaler (should be 0)."""
+    rng = np.random.default_rng(0)
+    mismatched = 0
+    for pair in manifest.pairs():
+        params = table.get(*pair)
+        if params is None:
+            continue
+        scaler = load_scaler(manifest.get(*pair)['scaler_path'])
+        prices = rng.uniform(0, 20000, (samples, 1))
+        same = True
+        with np.errstate(over='ignore'):
+            for dtype in FLOAT_DTYPES:
+                scaled = rng.random((samples, 1)).astype(dtype)
+                for a, b in ((scaler.transform(prices), params.transform(prices)),
+                             (scaler.inverse_transform(scaled), params.inverse_transform(scaled))):
+                    same = same and a.dtype == b.dtype and np.array_equal(a, b, equal_nan=True)
+        if not same:
+            print(f"Mismatch for district {pair[0]}, commodity {pair[1]}")
+            mismatched += 1
+    return mismatched
+
+
+if __name__ == '__main__':
+    import warnings
+
+    from model_manifest import ModelManifest
+
+    warnings.filterwarnings('ignore', message='Trying to unpickle estimator')
+    models_dir = os.environ.get('PRICE_MODELS_DIR',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models'))
+    manifest = ModelManifest.load(models_dir)
+    table = ScalerTable.load(manifest)
+    print(f"{len(table)} scalers in {table.path} ({table.reloaded} re-read)")
+    print(f"Pairs differing from scikit-learn: {check_against_sklearn(manifest, table)}")
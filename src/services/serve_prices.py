@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Pre-fork production server for pricePredict.py.
+
+The parent process loads the price store and every model once (NumPy or
+packed backend only; TensorFlow does not survive fork), freezes the heap with
+``gc.freeze()`` and forks ``--workers`` children that accept on one shared
+listening socket. Model weights stay in copy-on-write pages shared by all
+workers, so each extra worker only adds its own interpreter and request state.
+Workers that exit are restarted; SIGTERM/SIGINT stop all of them. With
+``--cpu-affinity spread`` worker i is pinned to the i-th block of the usable
+CPUs, and a restarted worker takes over the block of the one it replaces.
+
+    PRICE_MODEL_BACKEND=packed python serve_prices.py --workers 4 --cpu-affinity spread
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# One BLAS thread per worker (cpu_threads.py); the workers themselves use the cores
+os.environ.setdefault('INFERENCE_INTRA_THREADS', '1')
+
+logger = logging.getLogger('serve_prices')
+
+
+def rss_kb(pid):
+    """Resident and private (not shared with any other process) memory of ``pid`` in kB."""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Private_Clean', 'Private_Dirty'):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        return None, None
+    return values.get('Rss'), values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+
+def preload(pricePredict, pairs):
+    predictor = pricePredict.predictor
+    if predictor.backend == 'keras':
+        sys.exit("serve_prices.py needs PRICE_MODEL_BACKEND=numpy or packed; TensorFlow cannot be shared across fork")
+    started = time.perf_counter()
+    # PRICE_MODEL_PINNED / PRICE_WARM_PAIRS start a warm-up thread at import.
+    # Forking while it runs would leave the children waiting on a thread they
+    # don't have (/ready stuck at 503) and registry locks held, so finish it here
+    predictor.wait_warm_up()
+    if predictor.price_store.available():
+        predictor.price_store.snapshot()
+    else:
+        logger.error("Historical data file not found", extra={'path': pricePredict.HISTORICAL_FILE})
+    predictor.warm_up(pairs, background=False)
+    stats = predictor.registry.stats()
+    if stats['evictions']:
+        logger.warning("Model cache budget too small to hold every model; raise PRICE_MODEL_CACHE_MB",
+                       extra={'models': len(pairs), 'evicted': stats['evictions']})
+    logger.info("Preloaded models", extra={'models': stats['models'],
+                                           'resident_mb': round(stats['resident_bytes'] / 1e6, 1),
+                                           'seconds': round(time.perf_counter() - started, 2)})
+
+
+def serve_worker(app, listener, threaded):
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=threaded, fd=listener.fileno())
+    logger.info("Worker serving", extra={'pid': os.getpid(), 'host': host, 'port': port})
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve price predictions from pre-forked workers.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--preload', default='all', help="'all' or district:commodity pairs to load before forking")
+    parser.add_argument('--no-threads', action='store_true', help='handle one request at a time per worker')
+    parser.add_argument('--cpu-affinity', choices=('none', 'spread'), default='none',
+                        help="'spread' pins each worker to its own block of CPUs")
+    args = parser.parse_args()
+
+    import gc
+
+    import pricePredict
+    from cpu_threads import set_affinity, worker_share
+    from model_registry import parse_pairs
+
+    manifest = pricePredict.predictor.manifest
+    pairs = manifest.pairs() if args.preload == 'all' else parse_pairs(args.preload)
+    preload(pricePredict, pairs)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    # Objects created so far are never collected, so the collector never
+    # touches (and un-shares) their pages in the children
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                if args.cpu_affinity == 'spread':
+                    set_affinity(worker_share(pricePredict.CPUS, index, args.workers))
+                serve_worker(pricePredict.app, listener, threaded=not args.no_threads)
+            finally:
+                os._exit(1)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        spawn(index)
+    rss, private = rss_kb(os.getpid())
+    logger.info("Started workers", extra={'parent_pid': os.getpid(), 'workers': args.workers, 'host': args.host,
+                                          'port': args.port, 'parent_rss_kb': rss})
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        index, started = child
+        logger.warning("Worker exited; restarting", extra={'pid': pid, 'status': status, 'worker': index})
+        if time.monotonic() - started < 1.0:
+            # Crashing on startup; don't spin
+            time.sleep(1.0)
+        spawn(index)
+    listener.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded, SingleFlight
+
+
+def run_followers(flight, key, count, started):
+    """Start ``count`` threads calling flight.do(key, ...) once the leader is running; returns their outcomes."""
+    outcomes = [None] * count
+
+    def follow(i):
+        try:
+            outcomes[i] = ('result', flight.do(key, lambda: 'follower ran'))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    started.wait(5)
+    threads = [threading.Thread(target=follow, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    # Followers count as coalesced as soon as they find the leader's call
+    deadline = time.monotonic() + 5
+    while flight.stats()['coalesced'] < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return threads, outcomes
+
+
+def test_single_flight_shares_the_leaders_result():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+
+    def leader():
+        started.set()
+        release.wait(5)
+        return 42
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(flight.do('k', leader)))
+    thread.start()
+    followers, outcomes = run_followers(flight, 'k', 3, started)
+    release.set()
+    for t in [thread, *followers]:
+        t.join(5)
+
+    assert result == [42]
+    assert outcomes == [('result', 42)] * 3
+    assert flight.stats() == {'leaders': 1, 'coalesced': 3, 'in_flight': 0}
+
+
+def test_single_flight_propagates_the_leaders_error():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+    error = ValueError('model missing')
+
+    def leader():
+        started.set()
+        release.wait(5)
+        raise error
+
+    raised = []
+
+    def lead():
+        try:
+            flight.do('k', leader)
+        except ValueError as e:
+            raised.append(e)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    followers, outcomes = run_followers(flight, 'k', 2, started)
+    release.set()
+    for t in [thread, *followers]:
+        t.join(5)
+
+    assert raised == [error]
+    assert outcomes == [('error', error)] * 2
+    # The failed call is forgotten, so the next caller runs fn again
+    assert flight.do('k', lambda: 'retried') == 'retried'
+
+
+def test_admission_sheds_when_the_queue_is_full():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=1)
+    with admission.slot():
+        with pytest.raises(Overloaded):
+            with admission.slot():
+                pass
+    stats = admission.stats()
+    assert (stats['admitted'], stats['rejected'], stats['active']) == (1, 1, 0)
+
+
+def test_admission_times_out_queued_callers():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    errors = []
+
+    def wait():
+        try:
+            with admission.slot():
+                pass
+        except Overloaded as e:
+            errors.append(e)
+
+    with admission.slot():
+        thread = threading.Thread(target=wait)
+        thread.start()
+        thread.join(5)
+    assert len(errors) == 1
+    assert admission.stats()['timeouts'] == 1
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from detection_cache import DetectionCache, perceptual_digest
+
+
+def test_detection_cache_matches_recompressed_photos():
+    torch.manual_seed(0)
+    image = torch.nn.functional.interpolate(torch.rand(1, 3, 8, 8), size=(64, 64), mode='bilinear')
+    noisy = (image + 0.002 * torch.randn_like(image)).clamp(0, 1)
+    cache = DetectionCache(key_mode='perceptual', disk_dir=None, max_distance=8)
+    cache.put(('perceptual', 'fp', perceptual_digest(image)), (0.9, 3))
+
+    assert cache.get(('perceptual', 'fp', perceptual_digest(noisy))) == (0.9, 3)
+    assert cache.get(('perceptual', 'other-model', perceptual_digest(image))) is None
+    stats = cache.stats()
+    assert (stats['input_hits'], stats['misses']) == (1, 1)
+
+
+def test_detection_cache_disk_tier(tmp_path):
+    DetectionCache(disk_dir=str(tmp_path)).put(('upload', 'fp', 'abc'), (0.8, 1))
+    restarted = DetectionCache(disk_dir=str(tmp_path))
+    assert restarted.get(('upload', 'fp', 'abc')) == (0.8, 1)
+    assert restarted.stats()['disk_hits'] == 1
+    with pytest.raises(ValueError):
+        DetectionCache(key_mode='exact')
+
+
+def test_detection_cache_disk_tier_is_bounded_and_scoped_by_model(tmp_path):
+    cache = DetectionCache(disk_dir=str(tmp_path), disk_max_entries=4)
+    for i in range(6):
+        cache.put(('upload', 'model-a', f'{i:032x}'), (0.5, i))
+    cache.put(('upload', 'model-b', f'{0:032x}'), (0.7, 9))
+    files = [os.path.join(root, name) for root, _, names in os.walk(tmp_path) for name in names]
+    assert len(files) == 4
+    assert len({os.path.dirname(path) for path in files}) == 2
+    assert cache.stats()['disk_evictions'] == 3
+
+    restarted = DetectionCache(disk_dir=str(tmp_path), disk_max_entries=4)
+    assert restarted.get(('upload', 'model-b', f'{0:032x}')) == (0.7, 9)
+    assert restarted.get(('upload', 'model-a', f'{0:032x}')) is None
+    assert restarted.get(('upload', 'model-a', f'{5:032x}')) == (0.5, 5)
+
+    entry_bytes = restarted.stats()['disk_bytes'] // 4
+    assert DetectionCache(disk_dir=str(tmp_path), disk_max_bytes=2 * entry_bytes).stats()['disk_entries'] == 2
+
+
+def test_detection_cache_band_index_finds_the_nearest_hash():
+    rng = np.random.default_rng(0)
+    cache = DetectionCache(key_mode='perceptual', disk_dir=None, max_entries=64, max_distance=8)
+    stored = [int.from_bytes(rng.bytes(32), 'big') for _ in range(200)]
+    for i, value in enumerate(stored):
+        cache.put(('perceptual', 'fp', f'{value:064x}'), (0.5, i))
+    kept = stored[-64:]
+    for i, value in enumerate(kept):
+        flipped = value
+        for bit in rng.choice(256, size=int(rng.integers(0, 9)), replace=False):
+            flipped ^= 1 << int(bit)
+        assert cache.get(('perceptual', 'fp', f'{flipped:064x}')) == (0.5, len(stored) - 64 + i)
+    # Evicted hashes are gone from the index as well
+    assert cache.get(('perceptual', 'fp', f'{stored[0]:064x}')) is None
+    assert sum(len(keys) for keys in cache._bands.values()) == 64 * 9
@@ -0,0 +1,37 @@
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from disease_uploads import UploadError, upload_items
+
+MB = 1024 * 1024
+
+
+def plain(name, size):
+    return FileStorage(io.BytesIO(b'x' * size), name)
+
+
+def archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        for name, size in members:
+            z.writestr(name, b'x' * size)
+    buffer.seek(0)
+    return FileStorage(buffer, 'leaves.zip')
+
+
+def test_size_limit_applies_to_plain_files_and_zip_members():
+    items = upload_items([plain('small.jpg', 10), plain('big.jpg', MB + 1),
+                          archive([('a.jpg', 20), ('b.png', MB + 1), ('notes.txt', 5), ('dir/', 0)])], max_bytes=MB)
+    assert [name for name, _ in items] == ['small.jpg', 'big.jpg', 'a.jpg', 'b.png']
+    assert items[0][1] == b'x' * 10 and items[2][1] == b'x' * 20
+    assert items[1][1] == items[3][1] == 'image exceeds 1 MB'
+
+
+def test_rejects_too_many_images_and_broken_archives():
+    with pytest.raises(UploadError, match='at most 2 images'):
+        upload_items([plain('a.jpg', 1), archive([('b.jpg', 1), ('c.jpg', 1)])], max_images=2)
+    with pytest.raises(UploadError, match='not a valid zip'):
+        upload_items([FileStorage(io.BytesIO(b'not a zip'), 'broken.zip')])
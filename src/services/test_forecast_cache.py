@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from forecast_cache import ForecastCache
+
+VERSION = (19800, 365, 1234)
+
+
+def forecast_key(district_id, commodity_id, horizon=30, data_version=VERSION, fingerprint='fp'):
+    return (district_id, commodity_id, horizon, data_version, fingerprint)
+
+
+def npy_files(folder):
+    return sorted(name for _, _, names in os.walk(folder) for name in names if name.endswith('.npy'))
+
+
+def test_forecast_cache_memory_lru():
+    cache = ForecastCache(max_entries=2)
+    for i in range(3):
+        cache.put(forecast_key(1, i), np.full(3, i))
+    assert cache.get(forecast_key(1, 0)) is None
+    assert cache.get(forecast_key(1, 2)).tolist() == [2, 2, 2]
+    assert cache.stats()['entries'] == 2
+
+
+def test_forecast_cache_disk_tier_survives_restart_and_invalidation(tmp_path):
+    cache = ForecastCache(disk_dir=str(tmp_path))
+    cache.put(forecast_key(1, 2), np.arange(3.0))
+    cache.put(forecast_key(1, 3), np.arange(4.0))
+
+    restarted = ForecastCache(disk_dir=str(tmp_path))
+    assert restarted.get(forecast_key(1, 2)).tolist() == [0, 1, 2]
+    assert restarted.stats()['disk_hits'] == 1
+
+    restarted.invalidate_pair(1, 2)
+    assert restarted.get(forecast_key(1, 2)) is None
+    assert ForecastCache(disk_dir=str(tmp_path)).get(forecast_key(1, 3)).tolist() == [0, 1, 2, 3]
+    assert len(npy_files(tmp_path)) == 1
+
+
+def test_forecast_cache_disk_tier_is_bounded(tmp_path):
+    cache = ForecastCache(max_entries=1, disk_dir=str(tmp_path), disk_max_entries=4)
+    for i in range(10):
+        cache.put(forecast_key(i % 3, i), np.arange(30.0))
+    assert len(npy_files(tmp_path)) == 4
+    # The most recently written entries are the ones kept
+    assert cache.get(forecast_key(0, 9)) is not None
+    assert cache.get(forecast_key(0, 0)) is None
+
+    entry_bytes = cache.stats()['disk_bytes'] // 4
+    smaller = ForecastCache(disk_dir=str(tmp_path), disk_max_bytes=2 * entry_bytes)
+    assert smaller.stats()['disk_entries'] == 2
+    assert len(npy_files(tmp_path)) == 2
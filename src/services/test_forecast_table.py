@@ -0,0 +1,25 @@
+import numpy as np
+
+from forecast_table import ForecastTable, write_table
+
+VERSION = (19800, 365, 1234)
+
+
+def forecast_key(district_id, commodity_id, horizon=30, data_version=VERSION, fingerprint='fp'):
+    return (district_id, commodity_id, horizon, data_version, fingerprint)
+
+
+def test_forecast_table_serves_only_fresh_rows(tmp_path):
+    path = str(tmp_path / 'table.npz')
+    write_table(path, 30, [((1, 2), np.arange(30.0), VERSION, 'fp')])
+    table = ForecastTable(path, check_interval=0)
+
+    assert table.lookup(forecast_key(1, 2, horizon=7)).reshape(-1).tolist() == list(range(7))
+    assert table.lookup(forecast_key(1, 2, horizon=31)) is None
+    assert table.lookup(forecast_key(1, 2, data_version=(19801, 366, 99))) is None
+    assert table.lookup(forecast_key(1, 2, fingerprint='retrained')) is None
+    assert table.lookup(forecast_key(5, 5)) is None
+
+    table.max_age = -1
+    assert table.lookup(forecast_key(1, 2, horizon=7)) is None
+    assert table.stats()['hits'] == 1
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from micro_batcher import MicroBatcher
+
+
+def test_micro_batcher_batches_and_returns_results_in_order():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch=4, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6]
+    assert sum(len(batch) for batch in calls) == 4
+    assert batcher(5) == 10
+
+
+def test_micro_batcher_propagates_errors_and_sheds_load():
+    release = threading.Event()
+
+    def fail(items):
+        release.wait(5)
+        raise RuntimeError('bad batch')
+
+    batcher = MicroBatcher(fail, max_batch=1, max_wait_ms=0, max_queue=1)
+    first = batcher.submit('a')
+    # Wait for the worker to take 'a'; then one item fits in the queue and the next is shed
+    deadline = time.monotonic() + 5
+    while batcher.stats()['queued'] and time.monotonic() < deadline:
+        time.sleep(0.001)
+    second = batcher.submit('b')
+    with pytest.raises(Overloaded):
+        batcher.submit('c')
+    release.set()
+    for future in (first, second):
+        with pytest.raises(RuntimeError, match='bad batch'):
+            future.result(5)
+    assert batcher.stats()['rejected'] == 1
+
+
+def test_micro_batcher_reports_saturation():
+    release = threading.Event()
+    batcher = MicroBatcher(lambda items: release.wait(5) and items, max_batch=1, max_wait_ms=0, max_queue=1)
+    first = batcher.submit(1)
+    deadline = time.monotonic() + 5
+    while batcher.stats()['queued'] and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert not batcher.saturated
+    second = batcher.submit(2)
+    assert batcher.saturated
+    release.set()
+    assert (first.result(5), second.result(5)) == (1, 2)
+    assert not batcher.saturated
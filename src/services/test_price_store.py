@@ -0,0 +1,152 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from price_store import (JOURNAL_FILE, NO_DATE, PriceStore, changed_pairs, compact_journal, ingest_csv,
+                         merge_records)
+
+CSV = """date,district_id,commodity_id,modal_price
+2024-01-01,1,1,100
+2024-01-03,1,1,300
+2024-01-02,1,1,200
+2024-01-05,1,1,500
+2024-01-01,2,7,10
+2024-01-02,2,7,20
+"""
+
+DAY = np.datetime64('2024-01-01', 'D').astype(np.int64)
+
+
+def merge(prices, days, records):
+    record_days = np.array([day for day, _ in records], dtype=np.int32)
+    record_prices = np.array([price for _, price in records], dtype=np.float64)
+    return merge_records(np.array(prices, dtype=np.float64), np.array(days, dtype=np.int32), record_days, record_prices)
+
+
+@pytest.fixture
+def store(tmp_path):
+    source = tmp_path / 'prices.csv'
+    source.write_text(CSV)
+    store_dir = str(tmp_path / 'store')
+    ingest_csv(str(source), store_dir)
+    return PriceStore(store_dir, str(source), check_interval=0, compact_rows=0)
+
+
+def series(store, pair):
+    prices, days = store.snapshot().series(pair)
+    return np.asarray(prices).tolist(), np.asarray(days).tolist()
+
+
+def test_merge_replaces_known_dates_last_record_wins():
+    prices, days = merge([1, 2, 3], [10, 11, 12], [(11, 5.0), (11, 6.0)])
+    assert prices.tolist() == [1, 6, 3]
+    assert days.tolist() == [10, 11, 12]
+
+
+def test_merge_appends_later_dates_in_order():
+    prices, days = merge([1, 2], [10, 11], [(14, 4.0), (13, 3.0)])
+    assert days.tolist() == [10, 11, 13, 14]
+    assert prices.tolist() == [1, 2, 3, 4]
+
+
+def test_merge_backfill_keeps_existing_row_order():
+    # The base is not sorted by date; existing rows must stay where they are
+    prices, days = merge([1, 2, 3, 4], [10, 30, 20, 40], [(25, 9.0), (5, 8.0), (50, 7.0)])
+    assert days.tolist() == [5, 10, 25, 30, 20, 40, 50]
+    assert prices.tolist() == [8, 1, 9, 2, 3, 4, 7]
+
+
+def test_merge_into_undated_and_empty_series():
+    prices, days = merge([1, 2], [NO_DATE, NO_DATE], [(3, 9.0)])
+    assert days.tolist() == [NO_DATE, NO_DATE, 3]
+    assert prices.tolist() == [1, 2, 9]
+    prices, days = merge([], [], [(4, 2.0), (3, 1.0)])
+    assert days.tolist() == [3, 4]
+    assert prices.tolist() == [1, 2]
+
+
+def test_changed_pairs_reports_only_touched_pairs(store):
+    before = store.snapshot()
+    assert changed_pairs(None, before) == {(1, 1), (2, 7)}
+    store.append([(2, 7, DAY + 2, 30.0)])
+    after = store.snapshot()
+    assert after is not before
+    assert changed_pairs(before, after) == {(2, 7)}
+    assert changed_pairs(after, after) == set()
+
+
+def test_append_drops_duplicates_and_counts_corrections(store):
+    result = store.append([(1, 1, DAY, 100.0), (1, 1, DAY + 1, 250.0), (1, 1, DAY + 9, 900.0)])
+    assert (result['duplicates'], result['corrected'], result['appended']) == (1, 1, 1)
+    assert series(store, (1, 1)) == ([100, 300, 250, 500, 900], [DAY, DAY + 2, DAY + 1, DAY + 4, DAY + 9])
+
+
+def test_compaction_keeps_series_and_versions(store, tmp_path):
+    store.append([(1, 1, DAY + 3, 400.0), (3, 3, DAY, 1.0)])
+    expected = {pair: series(store, pair) for pair in store.snapshot().pairs()}
+    versions = {pair: store.data_version(*pair) for pair in expected}
+
+    assert compact_journal(store.store_dir) == 2
+    assert os.path.getsize(os.path.join(store.store_dir, JOURNAL_FILE)) == 0
+    reader = PriceStore(store.store_dir, store.source_file, check_interval=0, compact_rows=0)
+    for current in (store, reader):
+        assert {pair: series(current, pair) for pair in current.snapshot().pairs()} == expected
+        assert {pair: current.data_version(*pair) for pair in expected} == versions
+
+
+def test_csv_rebuild_keeps_journal_records(store):
+    store.append([(1, 1, DAY + 3, 400.0)])
+    compact_journal(store.store_dir)
+    store.append([(2, 7, DAY + 2, 30.0)])
+    expected = series(store, (1, 1)), series(store, (2, 7))
+
+    source = store.source_file
+    os.utime(source, ns=(os.stat(source).st_atime_ns, os.stat(source).st_mtime_ns + 10**9))
+    assert store.refresh()
+    assert (series(store, (1, 1)), series(store, (2, 7))) == expected
+    assert os.path.getsize(os.path.join(store.store_dir, JOURNAL_FILE)) == 0
+
+
+def test_append_starts_pairs_missing_from_the_csv(store):
+    result = store.append([(3, 3, DAY + 1, 2.0), (3, 3, DAY, 1.0)])
+    assert set(result['changed_pairs']) == {(3, 3)}
+    assert series(store, (3, 3)) == ([1, 2], [DAY, DAY + 1])
+    assert compact_journal(store.store_dir) == 2
+    assert series(PriceStore(store.store_dir, check_interval=0, compact_rows=0), (3, 3)) == ([1, 2], [DAY, DAY + 1])
+
+
+def test_new_bases_replace_old_ones_without_disturbing_readers(store):
+    old = store.snapshot()
+    expected = series(store, (1, 1))
+    store.append([(1, 1, DAY + 9, 900.0)])
+    compact_journal(store.store_dir)
+    bases = [name for name in os.listdir(store.store_dir) if name.startswith('base-')]
+    assert len(bases) == 1
+    # The old snapshot's arrays stay mapped after its directory is removed
+    assert (np.asarray(old.series((1, 1))[0]).tolist(), np.asarray(old.series((1, 1))[1]).tolist()) == expected
+    assert series(store, (1, 1))[1][-1] == DAY + 9
+
+
+def test_reads_and_migrates_stores_without_base_directories(store):
+    store.append([(1, 1, DAY + 9, 900.0)])
+    compact_journal(store.store_dir)
+    expected = {pair: series(store, pair) for pair in store.pairs()}
+    # Lay the base out the way stores were written before base directories
+    meta_path = os.path.join(store.store_dir, 'meta.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+    base = os.path.join(store.store_dir, meta.pop('base'))
+    for name in os.listdir(base):
+        os.replace(os.path.join(base, name), os.path.join(store.store_dir, name))
+    os.rmdir(base)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    legacy = PriceStore(store.store_dir, check_interval=0, compact_rows=0)
+    assert {pair: series(legacy, pair) for pair in legacy.pairs()} == expected
+    legacy.append([(2, 7, DAY + 9, 90.0)])
+    compact_journal(store.store_dir)
+    assert not os.path.exists(os.path.join(store.store_dir, 'prices.npy'))
+    assert series(legacy, (2, 7))[1][-1] == DAY + 9
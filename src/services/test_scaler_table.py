@@ -0,0 +1,85 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from scaler_table import FLOAT_DTYPES, MinMaxParams, ScalerTable, inverse_transform_many, transform_many
+
+
+class StubManifest:
+    """The part of ModelManifest ScalerTable reads."""
+
+    def __init__(self, models_dir, scaler_paths):
+        self.models_dir = models_dir
+        self.scaler_paths = scaler_paths
+
+    def pairs(self):
+        return sorted(self.scaler_paths)
+
+    def get(self, district_id, commodity_id):
+        path = self.scaler_paths[(district_id, commodity_id)]
+        stat = os.stat(path)
+        return {'scaler_path': path, 'scaler_mtime_ns': stat.st_mtime_ns, 'scaler_size': stat.st_size}
+
+
+def fitted(seed, **kwargs):
+    rng = np.random.default_rng(seed)
+    return MinMaxScaler(**kwargs).fit(rng.uniform(500, 9000, (200, 1)))
+
+
+@pytest.fixture
+def scalers():
+    return [fitted(0), fitted(1, feature_range=(-1, 1)), fitted(2, clip=True)]
+
+
+def test_params_match_sklearn_bit_for_bit(scalers):
+    rng = np.random.default_rng(3)
+    prices = rng.uniform(0, 20000, (64, 1))
+    for scaler in scalers:
+        params = MinMaxParams.from_scaler(scaler)
+        expected = scaler.transform(prices)
+        assert params.transform(prices).dtype == expected.dtype
+        assert np.array_equal(params.transform(prices), expected)
+        for dtype in FLOAT_DTYPES:
+            scaled = rng.random((64, 1)).astype(dtype)
+            with np.errstate(over='ignore'):
+                expected, actual = scaler.inverse_transform(scaled), params.inverse_transform(scaled)
+            assert actual.dtype == expected.dtype
+            assert np.array_equal(actual, expected, equal_nan=True)
+
+
+def test_many_matches_one_scaler_per_row(scalers):
+    rng = np.random.default_rng(4)
+    windows = rng.uniform(0, 20000, (len(scalers), 30))
+    params = [MinMaxParams.from_scaler(scaler) for scaler in scalers]
+    scaled = transform_many(windows, params)
+    for i, scaler in enumerate(scalers):
+        assert np.array_equal(scaled[i], scaler.transform(windows[i].reshape(-1, 1)).reshape(-1))
+    restored = inverse_transform_many(scaled[:2], params[:2])
+    for i, scaler in enumerate(scalers[:2]):
+        assert np.array_equal(restored[i], scaler.inverse_transform(scaled[i].reshape(-1, 1)).reshape(-1))
+
+
+def test_table_round_trips_and_rereads_only_changed_scalers(tmp_path, scalers):
+    paths = {}
+    for i, scaler in enumerate(scalers):
+        paths[(1, i)] = str(tmp_path / f'district_1_commodity_{i}.joblib')
+        joblib.dump(scaler, paths[(1, i)])
+    manifest = StubManifest(str(tmp_path), paths)
+
+    table = ScalerTable.load(manifest)
+    assert (len(table), table.reloaded) == (3, 3)
+    assert ScalerTable.load(manifest).reloaded == 0
+
+    joblib.dump(fitted(9), paths[(1, 0)])
+    os.utime(paths[(1, 0)], ns=(0, os.stat(paths[(1, 0)]).st_mtime_ns + 10**9))
+    table = ScalerTable.load(manifest)
+    assert table.reloaded == 1
+
+    prices = np.linspace(0, 20000, 50).reshape(-1, 1)
+    for pair, path in paths.items():
+        params = table.get(*pair)
+        assert np.array_equal(params.transform(prices), joblib.load(path).transform(prices))
+    assert table.get(9, 9) is None